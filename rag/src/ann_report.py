@@ -0,0 +1,56 @@
+import os
+import json
+import logging
+
+import faiss
+import numpy as np
+
+from utils.config import load_config
+from retriever.ann import ann_params, ann_report
+
+from logging import getLogger
+logger = getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def main():
+    """
+    load_path의 Flat 인덱스에 저장된 문서 벡터로 ANN 설정별 recall@k / 지연 시간을 측정합니다.
+    문서 벡터 중 ann_report_queries개를 쿼리로 빼고, 나머지를 각 인덱스에 색인해 Flat 결과와 비교합니다.
+    결과는 {load_path}/ann_report.json에 저장됩니다.
+    """
+    cfg = load_config("../configs/config.yaml")
+    logger.info(f"Config Successfully Loaded")
+
+    index = faiss.read_index(os.path.join(cfg['load_path'], "index.faiss"))
+    vectors = index.reconstruct_n(0, index.ntotal)
+    logger.info(f"Loaded {index.ntotal} vectors (dim={index.d}) from {cfg['load_path']}")
+
+    rng = np.random.default_rng(0)
+    order = rng.permutation(len(vectors))
+    n_queries = min(cfg.get('ann_report_queries', 1000), len(vectors) // 10)
+    queries, vectors = vectors[order[:n_queries]], vectors[order[n_queries:]]
+
+    report = ann_report(
+        vectors,
+        queries,
+        cfg.get('ann_report_candidates', []),
+        k=cfg['topk'],
+        metric=ann_params(cfg.get('ann_params'))['metric'],
+    )
+
+    logger.info(f"{'index':<8} {'params':<40} {'recall':>8} {'p50(ms)':>9} {'p95(ms)':>9} {'size(MB)':>9}")
+    for row in report:
+        knobs = {key: row['params'][key] for key in ("nlist", "pq_m", "hnsw_m", "nprobe", "ef_search") if key in row['params']}
+        logger.info(
+            f"{row['index_type']:<8} {json.dumps(knobs):<40} {row['recall']:>8.4f} "
+            f"{row['latency_ms_p50']:>9.3f} {row['latency_ms_p95']:>9.3f} {row['size_mb']:>9.1f}"
+        )
+
+    report_path = os.path.join(cfg['load_path'], "ann_report.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({"k": cfg['topk'], "n_vectors": len(vectors), "n_queries": n_queries, "results": report}, f, ensure_ascii=False, indent=4)
+    logger.info(f"ANN report saved to {report_path}")
+
+if __name__ == "__main__":
+    main()
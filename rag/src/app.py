@@ -15,6 +15,7 @@ from parser.pdf_text_extract import extract_text_with_pymupdf, pdf_text_alignmen
 from retriever.keyword import BM25Retriever
 from retriever.semantic import SemanticRetriever
 from retriever.ensemble import EnsembleRetriever, EnsembleMethod
+from retriever.reranker import CrossEncoderReranker
 
 # 환경 변수 로드
 load_dotenv("../keys.env")
@@ -77,15 +78,25 @@ def main():
                 tokenizer_method=cfg['tokenizer'],
                 save_path=cfg['save_path'],
                 load_path=cfg.get('load_path'),
-                k=cfg.get('k', 20)
+                k=cfg.get('k', 20),
+                method=cfg.get('bm25_method', "exhaustive"),
+                score_normalizer=cfg.get('bm25_score_normalizer', "softmax"),
+                token_cache_path=cfg.get('token_cache_path')
             )
             logger.info("검색기 초기화 완료")
 
             dense = semantic_retriever.vector_db.as_retriever(search_type="mmr", search_kwargs={"k": cfg['topk']})
+            # 결합 후 상위 후보를 cross-encoder로 재순위화해 LLM에 넘길 문서 수를 줄임 (reranker_model_name이 없으면 사용 안 함)
+            reranker = CrossEncoderReranker.from_config(cfg)
+
             ensemble_retriever = EnsembleRetriever(
                 retrievers=[keyword_retriever, dense],
                 weights=[0.4, 0.6],
-                method=EnsembleMethod.CC
+                method=EnsembleMethod.CC,
+                reranker=reranker,
+                rerank_top_k=cfg.get('rerank_top_k'),
+                timeout=cfg.get('ensemble_timeout'),
+                max_workers=cfg.get('ensemble_max_workers'),
             )
 
             # 키워드 검색 결과
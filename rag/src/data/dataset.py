@@ -1,14 +1,15 @@
 import logging
 
-import mysql.connector
-from mysql.connector import Error
-
 from uuid import uuid4
+from typing import Iterator, List
 from langchain.docstore.document import Document
 
 logger = logging.getLogger(__name__)
 
 def connect_to_db(host="localhost", user="root", password="", database_name="test", port=8888):
+    # 로컬 SQLite 사본만 쓰는 경우(retrieval_benchmark.py)에는 MySQL 드라이버가 없어도 되도록 여기서 import
+    import mysql.connector
+
     try:
         connection = mysql.connector.connect(
             host=host,
@@ -17,7 +18,7 @@ def connect_to_db(host="localhost", user="root", password="", database_name="tes
             database=database_name,
             port=port
         )
-    except Error as e:
+    except mysql.connector.Error as e:
         print(f"Error connecting to database: {e}")
         return None
     
@@ -38,36 +39,82 @@ def get_dataset(connection, query):
     return dataset
 
 
-def get_documents(dataset, page_fields, metadata_fields):
-    documents = []
-    for data in dataset:
-        page_content = ""
-        for field in page_fields:
-            # page_content += f"{field}\n{data[field]}\n\n"
-            page_content += f"{data[field]}\n\n"
-
-        metadata = {}
-        for field in metadata_fields:
-            metadata[field] = data[field]
-            
-        documents.append(Document(page_content=page_content, metadata=metadata, id=uuid4()))
+def iter_dataset(connection, query, batch_size=1000) -> Iterator[List[dict]]:
+    """
+    unbuffered cursor로 결과를 batch_size행씩 가져오는 generator.
+    fetchall()과 달리 전체 결과를 클라이언트 메모리에 올리지 않고 서버에서 스트리밍으로 읽습니다.
+    """
+    if connection is None:
+        print("Database connection not established")
+        return
+
+    cursor = connection.cursor(dictionary=True, buffered=False)
+    try:
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        # 중간에 소비를 멈춘 경우 남은 결과를 비워야 cursor를 닫을 수 있음
+        if connection.unread_result:
+            connection.consume_results()
+        cursor.close()
+        connection.close()
+
+
+def build_document(data, page_fields, metadata_fields):
+    page_content = ""
+    for field in page_fields:
+        # page_content += f"{field}\n{data[field]}\n\n"
+        page_content += f"{data[field]}\n\n"
+
+    metadata = {}
+    for field in metadata_fields:
+        metadata[field] = data[field]
 
+    return Document(page_content=page_content, metadata=metadata, id=str(uuid4()))
+
+
+def get_documents(dataset, page_fields, metadata_fields):
+    documents = [build_document(data, page_fields, metadata_fields) for data in dataset]
     logger.info(f"Documents Successfully Loaded: {len(documents)}")
 
     return documents
 
 
-def load_documents(cfg, db_info):
-    connection = connect_to_db(db_info['host'], db_info['user'], db_info['password'], db_info['database'], db_info['port'])
-    logger.info(f"DB Connection Successfully Established")
-    
-    db_query = """
-        SELECT * 
+def build_recruit_query(fields):
+    """page_content/metadata에 필요한 컬럼만 조회하는 쿼리 (SELECT * 대신)"""
+    columns = ", ".join(f"`{field}`" for field in dict.fromkeys(fields))
+    return f"""
+        SELECT {columns}
         FROM recruit
         WHERE platform_type IN ('WANTED');
     """
-    dataset = get_dataset(connection, db_query)
-    documents = get_documents(dataset, cfg['page_content_fields'], cfg['metadata_fields'])
-    logger.info(f"Dataset Successfully Loaded")
 
-    return documents
\ No newline at end of file
+
+def iter_documents(cfg, db_info, batch_size=None) -> Iterator[List[Document]]:
+    """
+    recruit 테이블을 스트리밍으로 읽어 Document 배치를 yield합니다.
+    배치 단위로 토큰화/임베딩 단계에 바로 넘길 수 있어 전체 테이블을 메모리에 올리지 않습니다.
+    """
+    batch_size = batch_size or cfg.get('db_batch_size', 1000)
+    connection = connect_to_db(db_info['host'], db_info['user'], db_info['password'], db_info['database'], db_info['port'])
+    logger.info(f"DB Connection Successfully Established")
+
+    db_query = build_recruit_query(cfg['page_content_fields'] + cfg['metadata_fields'])
+    n_documents = 0
+    for rows in iter_dataset(connection, db_query, batch_size=batch_size):
+        documents = [build_document(data, cfg['page_content_fields'], cfg['metadata_fields']) for data in rows]
+        n_documents += len(documents)
+        yield documents
+
+    logger.info(f"Documents Successfully Streamed: {n_documents}")
+
+
+def load_documents(cfg, db_info):
+    documents = [document for batch in iter_documents(cfg, db_info) for document in batch]
+    logger.info(f"Dataset Successfully Loaded: {len(documents)}")
+
+    return documents
@@ -0,0 +1,153 @@
+import json
+import time
+import logging
+from collections import defaultdict
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from retriever.ensemble import EnsembleRetriever, EnsembleMethod
+from retriever.fusion import ensure_doc_ids, fuse
+
+from logging import getLogger
+logger = getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+CANDIDATES = (10, 100, 1000)
+N_REPEATS = 50
+CONTENT_SIZE = 2000  # 청크 하나의 page_content 길이 (문자)
+TOP_K = 20
+
+
+def legacy_rrf(doc_lists, weights, c=60):
+    """dict + page_content 키로 결합하던 이전 reciprocal_rank_fusion"""
+    rrf_score = defaultdict(float)
+    doc_map = {}
+    for doc_list, weight in zip(doc_lists, weights):
+        for rank, doc in enumerate(doc_list, start=1):
+            rrf_score[doc.page_content] += weight / (rank + c)
+            doc_map[doc.page_content] = doc
+
+    sorted_docs = sorted(doc_map.keys(), key=lambda doc_id: rrf_score[doc_id], reverse=True)
+    for doc_id in sorted_docs:
+        doc_map[doc_id].metadata['score'] = rrf_score[doc_id]
+    return [doc_map[doc_id] for doc_id in sorted_docs]
+
+
+def legacy_cc(doc_lists, weights):
+    """dict + page_content 키로 결합하던 이전 convex_combination"""
+    cc_scores = defaultdict(float)
+    doc_map = {}
+    for doc_list, weight in zip(doc_lists, weights):
+        max_score = max((doc.metadata.get("score", 0) for doc in doc_list), default=1) or 1
+        for doc in doc_list:
+            cc_scores[doc.page_content] += weight * doc.metadata.get("score", 0) / max_score
+            doc_map[doc.page_content] = doc
+
+    sorted_docs = sorted(doc_map.keys(), key=lambda doc_id: cc_scores[doc_id], reverse=True)
+    for doc_id in sorted_docs:
+        doc_map[doc_id].metadata['score'] = cc_scores[doc_id]
+    return [doc_map[doc_id] for doc_id in sorted_docs]
+
+
+def make_doc_lists(rng, n_candidates):
+    """절반이 겹치는 두 retriever 결과 (BM25/dense처럼 점수 분포가 다름)"""
+    corpus = [
+        f"{i:08d} " + "".join(rng.choice(list("가나다라마바사아자차카타파하 "), CONTENT_SIZE))
+        for i in range(n_candidates * 2)
+    ]
+    keyword = rng.permutation(n_candidates + n_candidates // 2)[:n_candidates]
+    dense = rng.permutation(np.arange(n_candidates // 2, n_candidates * 2))[:n_candidates]
+
+    def leg(positions, scores):
+        return [
+            Document(page_content=corpus[i], metadata={"url": f"doc-{i}", "score": float(score)})
+            for i, score in zip(positions, np.sort(scores)[::-1])
+        ]
+
+    return [leg(keyword, rng.gamma(2.0, 3.0, n_candidates)), leg(dense, rng.uniform(0.5, 0.9, n_candidates))]
+
+
+def copy_lists(doc_lists):
+    # 이전 구현은 입력 metadata['score']를 덮어쓰므로 반복마다 새 입력을 사용
+    return [[Document(page_content=d.page_content, metadata=dict(d.metadata)) for d in doc_list] for doc_list in doc_lists]
+
+
+def measure(fn, doc_lists, copy=True):
+    inputs = [copy_lists(doc_lists) if copy else doc_lists for _ in range(N_REPEATS)]
+    latencies = []
+    for lists in inputs:
+        start = time.perf_counter()
+        result = fn(lists)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return result, float(np.median(latencies))
+
+
+def main():
+    """
+    EnsembleRetriever의 배열 기반 결합(RRF/CC)을 이전 dict 기반 구현과 retriever당 후보 수별로 비교합니다.
+
+    - legacy: 이전 구현 (입력 Document를 수정하며 전체 반환)
+    - array: ensemble_results (결과만 복사해 전체 반환)
+    - array_top_k: top_k=TOP_K일 때 ensemble_results
+    - kernel: 정수 id/점수 배열을 만든 뒤의 fuse 호출만 (Document 변환 제외)
+
+    두 구현의 결과 순서/점수가 같은지도 확인하며, 결과는 ../data/fusion_benchmark.json에 저장됩니다.
+    """
+    rng = np.random.default_rng(0)
+    weights = [0.5, 0.5]
+    no_op = RunnableLambda(lambda query: [])
+    ensembles = {
+        method: EnsembleRetriever(retrievers=[no_op, no_op], weights=weights, method=method)
+        for method in (EnsembleMethod.RRF, EnsembleMethod.CC)
+    }
+    top_k_ensembles = {
+        method: EnsembleRetriever(retrievers=[no_op, no_op], weights=weights, method=method, top_k=TOP_K)
+        for method in ensembles
+    }
+    legacy = {EnsembleMethod.RRF: lambda lists: legacy_rrf(lists, weights), EnsembleMethod.CC: lambda lists: legacy_cc(lists, weights)}
+
+    report = []
+    logger.info(
+        f"{'method':<6} {'candidates':>10} {'legacy(ms)':>11} {'array(ms)':>10} "
+        f"{f'top{TOP_K}(ms)':>10} {'kernel(ms)':>11} {'same':>5}"
+    )
+    for n_candidates in CANDIDATES:
+        doc_lists = make_doc_lists(rng, n_candidates)
+        for method, ensemble in ensembles.items():
+            expected, legacy_ms = measure(legacy[method], doc_lists)
+            fused, array_ms = measure(ensemble.ensemble_results, doc_lists)
+            top_k_fused, top_k_ms = measure(top_k_ensembles[method].ensemble_results, doc_lists)
+
+            ids, _ = ensure_doc_ids([[d.page_content for d in doc_list] for doc_list in doc_lists])
+            scores = [np.asarray([d.metadata['score'] for d in doc_list]) for doc_list in doc_lists]
+            _, kernel_ms = measure(lambda lists: fuse(ids, scores, weights, method=method.value), doc_lists, copy=False)
+
+            same = (
+                [d.page_content for d in expected] == [d.page_content for d in fused]
+                and [d.page_content for d in expected[:TOP_K]] == [d.page_content for d in top_k_fused]
+                and np.allclose([d.metadata['score'] for d in expected], [d.metadata['score'] for d in fused])
+            )
+            report.append({
+                "method": method.value,
+                "candidates_per_retriever": n_candidates,
+                "legacy_ms_p50": legacy_ms,
+                "array_ms_p50": array_ms,
+                "array_top_k_ms_p50": top_k_ms,
+                "kernel_ms_p50": kernel_ms,
+                "same_ranking": bool(same),
+            })
+            logger.info(
+                f"{method.value:<6} {n_candidates:>10} {legacy_ms:>11.3f} {array_ms:>10.3f} "
+                f"{top_k_ms:>10.3f} {kernel_ms:>11.3f} {str(same):>5}"
+            )
+
+    report_path = "../data/fusion_benchmark.json"
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({"repeats": N_REPEATS, "content_size": CONTENT_SIZE, "top_k": TOP_K, "results": report}, f, ensure_ascii=False, indent=4)
+    logger.info(f"Fusion benchmark saved to {report_path}")
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,8 @@ from parser.pdf_text_extract import extract_text_with_pymupdf, pdf_text_alignmen
 from retriever.keyword import BM25Retriever
 from retriever.semantic import SemanticRetriever
 from retriever.ensemble import EnsembleRetriever, EnsembleMethod
+from retriever.reranker import CrossEncoderReranker
+from retriever.pipeline import build_indexes
 
 from dotenv import load_dotenv
 load_dotenv("../keys.env")
@@ -38,22 +40,36 @@ def main():
         config_file_path = os.path.join(cfg['save_path'], 'config.yaml')
         save_config(cfg, config_file_path)
 
-    documents = load_documents(cfg, db_info)
-    semantic_retriever = SemanticRetriever(cfg, documents, OPENAI_API_KEY)
-    keyword_retriever = BM25Retriever.from_documents(
-        documents=documents,
-        bm25_params=cfg['bm25_params'],
-        tokenizer_method=cfg['tokenizer'],
-        save_path=cfg['save_path'],
-        load_path=cfg.get('load_path'),
-        k=cfg.get('k', 20)
-    )
+    if cfg.get('load_path') is None:
+        # DB 조회, 토큰화, 임베딩을 겹쳐서 실행하는 파이프라인으로 인덱스 빌드
+        semantic_retriever, keyword_retriever = build_indexes(cfg, db_info, OPENAI_API_KEY)
+    else:
+        documents = load_documents(cfg, db_info)
+        semantic_retriever = SemanticRetriever(cfg, documents, OPENAI_API_KEY)
+        keyword_retriever = BM25Retriever.from_documents(
+            documents=documents,
+            bm25_params=cfg['bm25_params'],
+            tokenizer_method=cfg['tokenizer'],
+            save_path=cfg['save_path'],
+            load_path=cfg.get('load_path'),
+            k=cfg.get('k', 20),
+            method=cfg.get('bm25_method', "exhaustive"),
+            score_normalizer=cfg.get('bm25_score_normalizer', "softmax"),
+            token_cache_path=cfg.get('token_cache_path')
+        )
 
     dense = semantic_retriever.vector_db.as_retriever(search_type="similarity_score_threshold", search_kwargs={"k": cfg['topk'], "score_threshold": 0.5})
+    # 결합 후 상위 후보를 cross-encoder로 재순위화해 LLM에 넘길 문서 수를 줄임 (reranker_model_name이 없으면 사용 안 함)
+    reranker = CrossEncoderReranker.from_config(cfg)
+
     ensemble_retriever = EnsembleRetriever(
         retrievers=[keyword_retriever, dense],
         weights=[0.5, 0.5],
-        method=EnsembleMethod.CC
+        method=EnsembleMethod.CC,
+        reranker=reranker,
+        rerank_top_k=cfg.get('rerank_top_k'),
+        timeout=cfg.get('ensemble_timeout'),
+        max_workers=cfg.get('ensemble_max_workers'),
     )
 
 
@@ -0,0 +1,336 @@
+import os
+import json
+import math
+import time
+import sqlite3
+import logging
+import argparse
+import tempfile
+import subprocess
+
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from utils.config import load_config
+from utils.db_config import get_db_info
+
+from data.dataset import build_document, build_recruit_query, load_documents
+from retriever.ann import ann_params, train_index
+from retriever.keyword import BM25Retriever
+from retriever.ensemble import EnsembleRetriever, EnsembleMethod
+from retriever.hybrid import HybridIndex
+
+from dotenv import load_dotenv
+load_dotenv("../keys.env")
+OPENAI_API_KEY = os.getenv("GRAVY_LAB_OPENAI")
+
+from logging import getLogger
+logger = getLogger(__name__)
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+
+def parse_args(cfg):
+    parser = argparse.ArgumentParser(description="retriever 변형별 빌드 시간/인덱스 크기/지연 시간/QPS/검색 품질 측정")
+    parser.add_argument("--corpus", default=None,
+                        help="*.jsonl({id, page_content, metadata}) 또는 recruit 테이블 사본 *.sqlite/*.db. 없으면 DB에서 load_documents")
+    parser.add_argument("--queries", default=None,
+                        help="*.jsonl({query, relevant_ids}). 없으면 문서 첫 줄(title)로 자기 자신을 찾는 질의를 생성")
+    parser.add_argument("--n-queries", type=int, default=200, help="--queries가 없을 때 생성할 질의 수")
+    parser.add_argument("--id-field", default=None,
+                        help="정답 id로 쓸 metadata 필드 (예: info_url). 없으면 Document.id")
+    parser.add_argument("--tokenizers", nargs="*", default=[cfg['tokenizer']], help="BM25 변형별 토크나이저")
+    parser.add_argument("--index-types", nargs="*", default=[cfg['index_type']], help="FAISS 변형별 index_type (값 없이 주면 FAISS 변형 생략)")
+    parser.add_argument("--methods", nargs="+", default=["rrf", "cc"], help="ensemble 결합 방식 (rrf, cc, dbsf)")
+    parser.add_argument("--hybrid", action="store_true", help="HybridIndex(첫 토크나이저/index_type)도 측정")
+    parser.add_argument("--k", type=int, default=cfg['topk'], help="recall@k, nDCG@k의 k (retriever별 검색 수)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="QPS를 측정할 동시 질의 수")
+    parser.add_argument("--output", default=None, help="리포트 경로 (기본값: ../data/retrieval_benchmark_{commit}.json)")
+    return parser.parse_args()
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_corpus(cfg, path):
+    """
+    벤치마크 문서를 불러옵니다.
+
+    - None: load_documents로 DB의 recruit 테이블을 읽음
+    - *.jsonl: 줄마다 {"id", "page_content", "metadata"}
+    - *.sqlite, *.db: recruit 테이블 사본을 DB와 같은 쿼리/build_document로 읽음
+    """
+    if path is None:
+        return load_documents(cfg, get_db_info())
+
+    if path.endswith(".jsonl"):
+        with open(path, 'r', encoding='utf-8') as f:
+            return [
+                Document(page_content=row['page_content'], metadata=row.get('metadata', {}), id=row.get('id'))
+                for row in map(json.loads, f) if row
+            ]
+
+    connection = sqlite3.connect(path)
+    connection.row_factory = sqlite3.Row
+    try:
+        rows = connection.execute(build_recruit_query(cfg['page_content_fields'] + cfg['metadata_fields'])).fetchall()
+    finally:
+        connection.close()
+    return [build_document(dict(row), cfg['page_content_fields'], cfg['metadata_fields']) for row in rows]
+
+
+def load_queries(path, documents, n_queries, doc_key):
+    """
+    {"query", "relevant_ids"} 목록을 반환합니다.
+    path가 없으면 문서 n_queries개를 뽑아 첫 줄(page_content_fields의 title)을 질의로, 그 문서를 정답으로 씁니다.
+    """
+    if path is not None:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(documents), min(n_queries, len(documents)), replace=False)
+    queries = []
+    for i in sample.tolist():
+        title = next((line for line in documents[i].page_content.splitlines() if line.strip()), "")
+        if title:
+            queries.append({"query": title.strip(), "relevant_ids": [doc_key(documents[i])]})
+    return queries
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+
+def retrieval_metrics(retrieved, relevant, k):
+    """이진 관련도 기준 (recall@k, reciprocal rank, nDCG@k)"""
+    relevant = set(relevant)
+    if not relevant:
+        return 0.0, 0.0, 0.0
+
+    hits = [rank for rank, key in enumerate(retrieved[:k], start=1) if key in relevant]
+    recall = len(hits) / len(relevant)
+    reciprocal_rank = 1.0 / hits[0] if hits else 0.0
+    dcg = sum(1.0 / math.log2(rank + 1) for rank in hits)
+    idcg = sum(1.0 / math.log2(rank + 1) for rank in range(1, min(len(relevant), k) + 1))
+    return recall, reciprocal_rank, dcg / idcg
+
+
+def measure(search, queries, doc_key, k, concurrency):
+    """
+    질의를 하나씩 실행해 지연 시간 분위수와 검색 품질을 구하고,
+    concurrency별로 전체 질의를 스레드 풀에서 동시에 실행해 QPS를 측정합니다.
+    """
+    search(queries[0]['query'])  # warm-up (lazy 로드, 캐시 등)
+
+    latencies, recalls, reciprocal_ranks, ndcgs = [], [], [], []
+    for query in queries:
+        start_time = time.perf_counter()
+        docs = search(query['query'])
+        latencies.append((time.perf_counter() - start_time) * 1000)
+
+        recall, reciprocal_rank, ndcg = retrieval_metrics([doc_key(doc) for doc in docs], query['relevant_ids'], k)
+        recalls.append(recall)
+        reciprocal_ranks.append(reciprocal_rank)
+        ndcgs.append(ndcg)
+
+    qps = {}
+    for n_workers in concurrency:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            start_time = time.perf_counter()
+            list(executor.map(lambda query: search(query['query']), queries))
+            qps[str(n_workers)] = len(queries) / (time.perf_counter() - start_time)
+
+    return {
+        "latency_ms_mean": float(np.mean(latencies)),
+        "latency_ms_p50": float(np.percentile(latencies, 50)),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "latency_ms_p99": float(np.percentile(latencies, 99)),
+        "qps": qps,
+        f"recall@{k}": float(np.mean(recalls)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        f"ndcg@{k}": float(np.mean(ndcgs)),
+    }
+
+
+def with_scores(results):
+    """(Document, 점수) 목록을 metadata['score']를 담은 복사본으로 바꿉니다. (CC/DBSF 결합 입력)"""
+    return [doc.model_copy(update={"metadata": {**doc.metadata, "score": score}}) for doc, score in results]
+
+
+def build_bm25(cfg, documents, tokenizer, k, work_dir):
+    start_time = time.time()
+    retriever = BM25Retriever.from_documents(
+        documents=documents,
+        bm25_params=cfg['bm25_params'],
+        tokenizer_method=tokenizer,
+        k=k,
+        method=cfg.get('bm25_method', "exhaustive"),
+        score_normalizer=cfg.get('bm25_score_normalizer', "softmax"),
+        token_cache_path=cfg.get('token_cache_path'),
+    )
+    build_seconds = time.time() - start_time
+
+    retriever.save(os.path.join(work_dir, f"bm25-{tokenizer}"))
+    search = lambda query: with_scores(retriever.batch_search([query], k)[0])
+    return search, build_seconds, directory_size(os.path.join(work_dir, f"bm25-{tokenizer}"))
+
+
+def build_faiss(semantic, documents, vectors, index_type, k, work_dir):
+    """
+    미리 계산한 문서 벡터(vectors)로 index_type의 FAISS 인덱스를 만듭니다. (build_seconds에 임베딩 시간은 제외)
+    L2 거리는 HybridIndex와 같이 1 - d / sqrt(2)로 유사도로 바꿔 CC/DBSF 결합에 씁니다.
+    """
+    start_time = time.time()
+    vector_db = semantic.create_vector_db(index_type)
+    train_index(vector_db.index, vectors, ann_params(semantic.cfg.get('ann_params'))['train_size'])
+    vector_db.add_embeddings(
+        zip([doc.page_content for doc in documents], vectors.tolist()),
+        metadatas=[doc.metadata for doc in documents],
+        ids=[doc.id for doc in documents],
+    )
+    build_seconds = time.time() - start_time
+
+    vector_db.save_local(os.path.join(work_dir, f"faiss-{index_type}"))
+    is_l2 = vector_db.index.metric_type == faiss.METRIC_L2
+
+    def search(query):
+        results = vector_db.similarity_search_with_score(query, k=k)
+        if is_l2:
+            results = [(doc, 1.0 - float(distance) / math.sqrt(2)) for doc, distance in results]
+        return with_scores(results)
+
+    return search, build_seconds, directory_size(os.path.join(work_dir, f"faiss-{index_type}"))
+
+
+def main():
+    """
+    retriever 변형별 빌드 시간, 인덱스 크기, 질의 지연 시간(p50/p95/p99), 동시 실행 QPS,
+    recall@k / MRR / nDCG@k를 측정해 커밋별로 비교할 수 있는 JSON 리포트로 저장합니다.
+
+    - bm25:{tokenizer}: --tokenizers마다 BM25Retriever
+    - faiss:{index_type}: --index-types마다 FAISS (문서 임베딩은 한 번만 계산해 공유)
+    - ensemble:{method}: 첫 BM25 + 첫 FAISS 변형을 EnsembleRetriever(--methods)로 결합 (크기는 두 인덱스의 합)
+    - hybrid:{method}: --hybrid이면 HybridIndex (build_seconds에 임베딩 시간 포함, 임베딩 캐시가 있으면 재사용)
+
+    인덱스 크기는 각 변형을 임시 디렉토리에 저장한 크기이며, 빌드에 실패한 변형(예: 문서 수 < nlist인 IVF)은
+    error만 기록하고 나머지를 계속 측정합니다.
+    """
+    cfg = load_config("../configs/config.yaml")
+    logger.info(f"Config Successfully Loaded")
+    args = parse_args(cfg)
+    k = args.k
+
+    documents = load_corpus(cfg, args.corpus)
+    doc_key = (lambda doc: doc.metadata.get(args.id_field)) if args.id_field else (lambda doc: doc.id)
+    queries = load_queries(args.queries, documents, args.n_queries, doc_key)
+    logger.info(f"Benchmark corpus: {len(documents)} documents, {len(queries)} queries (k={k})")
+
+    results, searches, sizes = [], {}, {}
+
+    def run(name, build):
+        try:
+            search, build_seconds, index_bytes = build()
+        except Exception as e:
+            logger.error(f"{name} build failed: {e}")
+            results.append({"variant": name, "error": str(e)})
+            return
+
+        searches[name], sizes[name] = search, index_bytes
+        metrics = measure(search, queries, doc_key, k, args.concurrency)
+        results.append({"variant": name, "build_seconds": build_seconds, "index_bytes": index_bytes, **metrics})
+        logger.info(
+            f"{name:<16} build={build_seconds:>8.2f}s size={index_bytes / 2**20:>8.1f}MB "
+            f"p50={metrics['latency_ms_p50']:>8.3f}ms p95={metrics['latency_ms_p95']:>8.3f}ms "
+            f"p99={metrics['latency_ms_p99']:>8.3f}ms recall@{k}={metrics[f'recall@{k}']:.4f} "
+            f"mrr={metrics['mrr']:.4f} ndcg@{k}={metrics[f'ndcg@{k}']:.4f}"
+        )
+
+    embed_seconds = None
+    with tempfile.TemporaryDirectory() as work_dir:
+        for tokenizer in args.tokenizers:
+            run(f"bm25:{tokenizer}", lambda: build_bm25(cfg, documents, tokenizer, k, work_dir))
+
+        semantic = None
+        if args.index_types or args.hybrid:
+            # FAISS 변형이 없으면 임베딩 모델(langchain_openai/huggingface)을 불러오지 않도록 여기서 import
+            from retriever.semantic import SemanticRetriever
+
+            index_type = (args.index_types or [cfg['index_type']])[0]
+            semantic = SemanticRetriever({**cfg, 'load_path': None, 'index_type': index_type}, None, OPENAI_API_KEY)
+            start_time = time.time()
+            vectors = np.asarray(semantic.embed_model.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+            embed_seconds = time.time() - start_time
+            logger.info(f"Embedded {len(documents)} documents in {embed_seconds:.2f} seconds")
+
+            for index_type in args.index_types:
+                run(f"faiss:{index_type}", lambda: build_faiss(semantic, documents, vectors, index_type, k, work_dir))
+
+        keyword = next((name for name in searches if name.startswith("bm25:")), None)
+        dense = next((name for name in searches if name.startswith("faiss:")), None)
+        if keyword and dense:
+            for method in args.methods:
+                ensemble = EnsembleRetriever(
+                    retrievers=[RunnableLambda(searches[keyword]), RunnableLambda(searches[dense])],
+                    weights=[0.5, 0.5],
+                    method=EnsembleMethod(method),
+                    top_k=k,
+                )
+                run(f"ensemble:{method}", lambda: (ensemble.invoke, 0.0, sizes[keyword] + sizes[dense]))
+
+        if args.hybrid and semantic is not None:
+            def build_hybrid():
+                start_time = time.time()
+                hybrid = HybridIndex.from_documents(
+                    documents,
+                    semantic.embed_model,
+                    tokenizer_method=(args.tokenizers or [cfg['tokenizer']])[0],
+                    index_type=(args.index_types or [cfg['index_type']])[0],
+                    index_params=cfg.get('ann_params'),
+                    bm25_params=cfg['bm25_params'],
+                    bm25_method=cfg.get('bm25_method', "exhaustive"),
+                    token_cache_path=cfg.get('token_cache_path'),
+                )
+                build_seconds = time.time() - start_time
+                hybrid.save(os.path.join(work_dir, "hybrid"))
+                return hybrid, build_seconds, directory_size(os.path.join(work_dir, "hybrid"))
+
+            try:
+                hybrid, build_seconds, index_bytes = build_hybrid()
+            except Exception as e:
+                logger.error(f"hybrid build failed: {e}")
+                results.append({"variant": "hybrid", "error": str(e)})
+            else:
+                for method in args.methods:
+                    run(f"hybrid:{method}", lambda: (lambda query: hybrid.search(query, k, method=method), build_seconds, index_bytes))
+
+    commit = git_commit()
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "corpus": args.corpus or "db",
+        "n_documents": len(documents),
+        "n_queries": len(queries),
+        "labels": args.queries or "self",
+        "k": k,
+        "concurrency": args.concurrency,
+        "embed_model": f"{cfg['embed_model_provider']}/{cfg['embed_model_name']}" if semantic is not None else None,
+        "embed_seconds": embed_seconds,
+        "results": results,
+    }
+
+    report_path = args.output or f"../data/retrieval_benchmark_{(commit or datetime.now().strftime('%Y-%m-%d-%H-%M-%S'))[:12]}.json"
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=4)
+    logger.info(f"Retrieval benchmark saved to {report_path}")
+
+if __name__ == "__main__":
+    main()
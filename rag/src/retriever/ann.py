@@ -0,0 +1,244 @@
+import time
+import logging
+import faiss
+import numpy as np
+
+from typing import Dict, List, Optional, Sequence
+
+
+logger = logging.getLogger(__name__)
+
+ANN_INDEX_TYPES = ("L2", "IP", "HNSW", "IVF", "IVFPQ", "OPQ")
+
+# ann_params 기본값 (config.yaml의 ann_params로 덮어씀)
+DEFAULT_ANN_PARAMS = {
+    "metric": "L2",          # IVF/IVFPQ/OPQ/HNSW의 거리 ("L2", "IP")
+    "nlist": 1024,           # IVF 클러스터 수 (학습 벡터는 최소 nlist개, 권장 39 * nlist개)
+    "pq_m": 64,              # PQ sub-quantizer 수 (차원의 약수)
+    "pq_nbits": 8,           # sub-quantizer당 비트 수
+    "hnsw_m": 32,            # HNSW 노드당 이웃 수
+    "ef_construction": 200,  # HNSW 구축 시 탐색 폭
+    "ef_search": 64,         # HNSW 검색 시 탐색 폭 (query-time)
+    "nprobe": 16,            # IVF 검색 시 방문할 클러스터 수 (query-time)
+    "train_size": 50000,     # 학습에 사용할 샘플 벡터 수
+}
+
+
+def ann_params(params: Optional[dict] = None) -> dict:
+    return {**DEFAULT_ANN_PARAMS, **(params or {})}
+
+
+def build_index(index_type: str, dim: int, params: Optional[dict] = None) -> faiss.Index:
+    """
+    index_type과 ann_params로 FAISS 인덱스를 생성합니다.
+
+    - "L2", "IP": Flat (전수 탐색, 학습 불필요)
+    - "HNSW": IndexHNSWFlat(M, efConstruction, efSearch)
+    - "IVF": IVF{nlist},Flat
+    - "IVFPQ": IVF{nlist},PQ{pq_m}x{pq_nbits}
+    - "OPQ": OPQ{pq_m},IVF{nlist},PQ{pq_m}x{pq_nbits} (회전 후 PQ로 양자화 오차 감소)
+
+    IVF 계열은 벡터를 추가하기 전에 train_index로 학습해야 합니다.
+    """
+    params = ann_params(params)
+    metric = faiss.METRIC_INNER_PRODUCT if params["metric"] == "IP" else faiss.METRIC_L2
+
+    if index_type == "L2": ## L2 Distance(Euclidean Distance)
+        return faiss.IndexFlatL2(dim)
+
+    elif index_type == "IP": ## Inner Product
+        return faiss.IndexFlatIP(dim)
+
+    elif index_type == "HNSW": ## ANN -> Hierarchical Navigable Small World
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"], metric)
+        index.hnsw.efConstruction = params["ef_construction"]
+        index.hnsw.efSearch = params["ef_search"]
+        return index
+
+    elif index_type == "IVF":
+        factory = f"IVF{params['nlist']},Flat"
+
+    elif index_type == "IVFPQ":
+        factory = f"IVF{params['nlist']},PQ{params['pq_m']}x{params['pq_nbits']}"
+
+    elif index_type == "OPQ":
+        factory = f"OPQ{params['pq_m']},IVF{params['nlist']},PQ{params['pq_m']}x{params['pq_nbits']}"
+
+    else:
+        raise ValueError(f"Unknown index_type: {index_type}. Available: {ANN_INDEX_TYPES}")
+
+    index = faiss.index_factory(dim, factory, metric)
+    set_search_params(index, params)
+    return index
+
+
+def set_search_params(index: faiss.Index, params: Optional[dict] = None) -> None:
+    """query-time 파라미터(IVF nprobe, HNSW efSearch)를 설정합니다. 해당 없는 인덱스는 무시합니다."""
+    params = ann_params(params)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = params["nprobe"]
+
+    hnsw = faiss.downcast_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        hnsw.hnsw.efSearch = params["ef_search"]
+
+
+def train_index(index: faiss.Index, vectors: np.ndarray, train_size: Optional[int] = None, seed: int = 0) -> None:
+    """학습이 필요한 인덱스를 vectors에서 무작위로 뽑은 train_size개 샘플로 학습합니다."""
+    if index.is_trained:
+        return
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    train_size = train_size or DEFAULT_ANN_PARAMS["train_size"]
+    if len(vectors) > train_size:
+        vectors = vectors[np.random.default_rng(seed).choice(len(vectors), train_size, replace=False)]
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and len(vectors) < ivf.nlist:
+        raise ValueError(f"IVF index needs at least nlist={ivf.nlist} training vectors, got {len(vectors)}")
+
+    start_time = time.time()
+    index.train(vectors)
+    logger.info(f"ANN Index Trained on {len(vectors)} vectors in {time.time() - start_time:.2f} seconds")
+
+
+def search_parameters(index: faiss.Index, selector: Optional[faiss.IDSelector]) -> Optional[faiss.SearchParameters]:
+    """
+    IDSelector를 적용한 검색 파라미터를 만듭니다. (selector가 None이면 None)
+    파라미터를 넘기면 인덱스에 설정된 nprobe/efSearch 대신 파라미터 값이 쓰이므로 현재 값을 그대로 옮깁니다.
+    """
+    if selector is None:
+        return None
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+
+    hnsw = faiss.downcast_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=hnsw.hnsw.efSearch)
+
+    return faiss.SearchParameters(sel=selector)
+
+
+def compact_index(index: faiss.Index, live: np.ndarray) -> faiss.Index:
+    """
+    순번(0..ntotal-1)을 id로 쓰는 인덱스에서 live(오름차순) 외의 벡터를 지우고,
+    남은 벡터의 id를 live 안의 위치(0..len(live)-1)로 다시 매깁니다. (BM25Index.compact와 같은 순서)
+
+    - Flat: remove_ids가 뒤 벡터를 앞으로 당기므로 그대로 새 순번이 됨
+    - IVF 계열: 역리스트에서 지운 뒤 저장된 id를 새 순번으로 덮어씀 (코드는 그대로이므로 손실 없음)
+    - HNSW: 삭제를 지원하지 않으므로 살아있는 벡터로 그래프를 다시 만듦
+    """
+    live = np.asarray(live, dtype=np.int64)
+    if len(live) == index.ntotal:
+        return index
+
+    removed = np.setdiff1d(np.arange(index.ntotal, dtype=np.int64), live)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.remove_ids(faiss.IDSelectorBatch(removed))
+        invlists = ivf.invlists
+        for list_no in range(ivf.nlist):
+            size = invlists.list_size(list_no)
+            if size == 0:
+                continue
+            ids_ptr, codes_ptr = invlists.get_ids(list_no), invlists.get_codes(list_no)
+            ids = np.searchsorted(live, faiss.rev_swig_ptr(ids_ptr, size)).astype(np.int64)
+            codes = faiss.rev_swig_ptr(codes_ptr, size * invlists.code_size).copy()
+            invlists.release_ids(list_no, ids_ptr)
+            invlists.release_codes(list_no, codes_ptr)
+            invlists.update_entries(list_no, 0, size, faiss.swig_ptr(ids), faiss.swig_ptr(codes))
+        index.ntotal = ivf.ntotal
+        return index
+
+    if isinstance(faiss.downcast_index(index), faiss.IndexHNSW):
+        vectors = index.reconstruct_n(0, index.ntotal)[live]
+        rebuilt = faiss.clone_index(index)
+        rebuilt.reset()
+        rebuilt.add(vectors)
+        return rebuilt
+
+    index.remove_ids(faiss.IDSelectorBatch(removed))
+    return index
+
+
+def index_size_bytes(index: faiss.Index) -> int:
+    return faiss.serialize_index(index).nbytes
+
+
+def ann_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    candidates: Sequence[Dict],
+    k: int = 10,
+    metric: str = "L2",
+) -> List[Dict]:
+    """
+    Flat 인덱스 결과를 정답으로 각 ANN 설정의 recall@k와 쿼리당 지연 시간을 측정합니다.
+
+    Args:
+        vectors: 색인할 문서 벡터
+        queries: 쿼리 벡터 (문서 벡터에서 제외한 샘플 등)
+        candidates: {"index_type": ..., "params": {...}, "sweep": {"nprobe": [...]} 또는 {"ef_search": [...]}} 목록
+        k: recall@k의 k
+        metric: Flat 기준 인덱스의 거리 ("L2", "IP")
+    Returns:
+        설정/query-time 파라미터 조합별 {"index_type", "params", "recall", "latency_ms_p50", "latency_ms_p95", "build_seconds", "size_mb"}
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    dim = vectors.shape[1]
+
+    def measure(index: faiss.Index, ground_truth: Optional[np.ndarray]) -> Dict:
+        latencies, found = [], []
+        for query in queries:
+            start_time = time.perf_counter()
+            _, indices = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            found.append(indices[0])
+        found = np.asarray(found)
+        recall = 1.0 if ground_truth is None else float(np.mean([
+            len(np.intersect1d(f[f >= 0], g)) / k for f, g in zip(found, ground_truth)
+        ]))
+        return {
+            "recall": recall,
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p95": float(np.percentile(latencies, 95)),
+        }, found
+
+    start_time = time.time()
+    baseline = build_index("IP" if metric == "IP" else "L2", dim)
+    baseline.add(vectors)
+    build_seconds = time.time() - start_time
+    baseline_metrics, ground_truth = measure(baseline, None)
+    report = [{
+        "index_type": "Flat", "params": {"metric": metric}, **baseline_metrics,
+        "build_seconds": build_seconds, "size_mb": index_size_bytes(baseline) / 2**20,
+    }]
+
+    for candidate in candidates:
+        params = ann_params({"metric": metric, **candidate.get("params", {})})
+        start_time = time.time()
+        index = build_index(candidate["index_type"], dim, params)
+        train_index(index, vectors, params["train_size"])
+        index.add(vectors)
+        build_seconds = time.time() - start_time
+        size_mb = index_size_bytes(index) / 2**20
+
+        (knob, values), = (candidate.get("sweep") or {"nprobe": [params["nprobe"]]}).items()
+        for value in values:
+            search_params = {**params, knob: value}
+            set_search_params(index, search_params)
+            metrics, _ = measure(index, ground_truth)
+            report.append({
+                "index_type": candidate["index_type"], "params": search_params, **metrics,
+                "build_seconds": build_seconds, "size_mb": size_mb,
+            })
+            logger.info(
+                f"{candidate['index_type']} {knob}={value}: recall@{k}={metrics['recall']:.4f}, "
+                f"p50={metrics['latency_ms_p50']:.3f}ms, p95={metrics['latency_ms_p95']:.3f}ms, size={size_mb:.1f}MB"
+            )
+
+    return report
@@ -0,0 +1,720 @@
+from __future__ import annotations
+
+import os
+import json
+import uuid
+import shutil
+import logging
+import numpy as np
+
+from collections import Counter
+from scipy.sparse import csr_matrix, hstack, vstack
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from retriever.storage import SortedStringTable
+
+
+logger = logging.getLogger(__name__)
+
+BM25_VARIANTS = ("okapi", "bm25l", "bm25plus")
+BM25_SEARCH_METHODS = ("exhaustive", "wand")
+BM25_FORMAT_VERSION = 1
+SCORE_NORMALIZERS = ("minmax", "zscore", "softmax")
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """np.argpartition으로 O(n)에 상위 k개를 고른 뒤 그 k개만 내림차순 정렬합니다."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def normalize_scores(scores: np.ndarray, method: str = "softmax") -> np.ndarray:
+    """
+    점수 배열을 정규화한 새 배열을 반환합니다.
+
+    Args:
+        scores: 정규화할 점수 (보통 top-k 후보의 점수)
+        method: "minmax"([0, 1], 모두 같으면 1), "zscore"(평균 0/표준편차 1, 모두 같으면 0), "softmax"(합 1)
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores) == 0:
+        return scores
+
+    if method == "minmax":
+        low, high = scores.min(), scores.max()
+        if high == low:
+            return np.ones_like(scores)
+        return (scores - low) / (high - low)
+    elif method == "zscore":
+        std = scores.std()
+        if std == 0:
+            return np.zeros_like(scores)
+        return (scores - scores.mean()) / std
+    elif method == "softmax":
+        e_x = np.exp(scores - scores.max())
+        return e_x / e_x.sum()
+    else:
+        raise ValueError(f"Unsupported score normalizer: {method}")
+
+
+def _kth_largest(scores: np.ndarray, k: int) -> float:
+    if len(scores) < k:
+        return 0.0
+    return float(np.partition(scores, len(scores) - k)[len(scores) - k])
+
+
+class BM25Index:
+    """
+    어휘 사전(vocabulary)과 CSR term-document 행렬 기반의 BM25 엔진.
+
+    행(term) x 열(document) 형태의 CSR 행렬에 문서별 term frequency와 saturation 값을 저장하고,
+    질의 벡터(질의 토큰 빈도 x idf)와의 sparse 행렬곱 한 번으로 전체 문서 점수를 계산합니다.
+    rank_bm25의 BM25Okapi / BM25L / BM25Plus와 같은 파라미터(k1, b, epsilon, delta)를 받습니다.
+
+    CSR 행렬의 각 행은 문서 id가 정렬된 posting list이며, term별 saturation 최댓값(upper bound)을 함께 보관해
+    top-k 검색 시 MaxScore 방식의 조기 종료(method="wand")에 사용합니다.
+
+    fit/compact로 만든 base segment는 그대로 두고, 이후 추가된 문서는 delta segment에, 삭제된 문서는 tombstone으로 기록합니다.
+    df, avgdl, idf는 변경 즉시 갱신하고 saturation의 문서 길이 정규화(avgdl)는 compact() 때 다시 계산합니다.
+    """
+
+    def __init__(
+        self,
+        variant: str = "okapi",
+        k1: float = 1.5,
+        b: float = 0.75,
+        epsilon: float = 0.25,
+        delta: Optional[float] = None,
+    ):
+        if variant not in BM25_VARIANTS:
+            raise ValueError(f"Unsupported BM25 variant: {variant}")
+
+        self.variant = variant
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+        # rank_bm25 기본값: BM25L은 0.5, BM25Plus는 1.0
+        self.delta = delta if delta is not None else (0.5 if variant == "bm25l" else 1.0)
+
+        # base segment: fit 직후에는 dict, load 후에는 mmap된 SortedStringTable
+        self.vocabulary: Mapping[str, int] = {}
+        self.term_freqs = csr_matrix((0, 0), dtype=np.float32)
+        self.saturation = csr_matrix((0, 0), dtype=np.float32)
+        self.max_saturation = np.zeros(0, dtype=np.float32)
+        # saturation 계산에 사용한 avgdl (delta segment도 같은 값으로 정규화)
+        self.saturation_avgdl = 0.0
+        # base segment 식별자: fit/compact마다 새로 부여되며 delta segment가 어떤 base에 대한 것인지 확인하는 데 사용
+        self.segment_id = ""
+
+        # base + delta 전체 문서/term 통계
+        self.doc_lengths = np.zeros(0, dtype=np.int32)
+        self.doc_freqs = np.zeros(0, dtype=np.int32)
+        self.avgdl = 0.0
+        self.idf = np.zeros(0, dtype=np.float32)
+        self._reset_delta()
+
+    def _reset_delta(self) -> None:
+        # delta segment: base 이후 추가된 term과 문서 (COO 누적 + CSR 캐시)
+        self.extra_vocabulary: Dict[str, int] = {}
+        self.delta_rows = np.zeros(0, dtype=np.int32)
+        self.delta_cols = np.zeros(0, dtype=np.int32)
+        self.delta_freqs = np.zeros(0, dtype=np.float32)
+        self.delta_term_freqs = csr_matrix((self.n_terms, 0), dtype=np.float32)
+        self.delta_saturation = csr_matrix((self.n_terms, 0), dtype=np.float32)
+        # tombstone: 삭제된 문서 위치
+        self.deleted = np.zeros(self.n_docs, dtype=bool)
+        self.n_deleted = 0
+
+    @classmethod
+    def from_corpus(cls, corpus: Iterable[Sequence[str]], **bm25_params) -> BM25Index:
+        """
+        토큰화된 코퍼스로부터 BM25Index를 생성합니다.
+
+        Args:
+            corpus: 문서별 토큰 목록
+            **bm25_params: variant, k1, b, epsilon, delta
+        """
+        index = cls(**bm25_params)
+        index.fit(corpus)
+        return index
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_lengths)
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.vocabulary) + len(self.extra_vocabulary)
+
+    @property
+    def n_base_docs(self) -> int:
+        return self.term_freqs.shape[1]
+
+    @property
+    def n_base_terms(self) -> int:
+        return self.term_freqs.shape[0]
+
+    @property
+    def n_delta_docs(self) -> int:
+        return self.n_docs - self.n_base_docs
+
+    @property
+    def has_pending_changes(self) -> bool:
+        return self.n_delta_docs > 0 or self.n_deleted > 0
+
+    def needs_compaction(self, ratio: float) -> bool:
+        """delta 문서 수와 tombstone 수의 합이 base 문서 수의 ratio 배를 넘으면 True"""
+        return self.n_delta_docs + self.n_deleted > ratio * max(self.n_base_docs, 1)
+
+    def term_id(self, token: str) -> Optional[int]:
+        term_id = self.vocabulary.get(token)
+        if term_id is None:
+            term_id = self.extra_vocabulary.get(token)
+        return term_id
+
+    def fit(self, corpus: Iterable[Sequence[str]]) -> BM25Index:
+        vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        freqs: List[int] = []
+        doc_lengths: List[int] = []
+
+        for doc_id, tokens in enumerate(corpus):
+            counts = Counter(tokens)
+            for term, tf in counts.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                freqs.append(tf)
+            doc_lengths.append(len(tokens))
+
+        self.vocabulary = vocabulary
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.int32)
+
+        # term 단위 행(posting list)마다 문서 id가 오름차순으로 정렬된 CSR 행렬
+        term_freqs = csr_matrix(
+            (np.asarray(freqs, dtype=np.float32), (np.asarray(term_ids, dtype=np.int32), np.asarray(doc_ids, dtype=np.int32))),
+            shape=(len(vocabulary), len(doc_lengths)),
+            dtype=np.float32,
+        )
+        term_freqs.sort_indices()
+        self.term_freqs = term_freqs
+        self.doc_freqs = np.diff(term_freqs.indptr).astype(np.int32)
+
+        self._refresh()
+        logger.info(f"BM25Index({self.variant}) fitted: {self.n_docs} docs, {self.n_terms} terms, {term_freqs.nnz} postings")
+        return self
+
+    def _refresh(self) -> None:
+        """base segment의 avgdl, idf, saturation 행렬을 다시 계산하고 delta segment와 tombstone을 비웁니다."""
+        self._reset_delta()
+        self._update_statistics()
+        self.saturation_avgdl = self.avgdl
+        self.segment_id = uuid.uuid4().hex
+
+        tf = self.term_freqs
+        data = self._compute_saturation(tf.data, self._doc_norm(self.doc_lengths)[tf.indices])
+        self.saturation = csr_matrix((data, tf.indices, tf.indptr), shape=tf.shape, copy=False)
+
+        # posting list(행)별 saturation 최댓값 -> 질의 가중치를 곱하면 term 점수의 upper bound
+        max_saturation = np.zeros(tf.shape[0], dtype=np.float32)
+        nonempty = np.diff(tf.indptr) > 0
+        if tf.nnz:
+            max_saturation[nonempty] = np.maximum.reduceat(data, tf.indptr[:-1][nonempty])
+        self.max_saturation = max_saturation
+
+    def _update_statistics(self) -> None:
+        """살아있는 문서 기준으로 avgdl과 idf를 갱신합니다."""
+        n_live = self.n_docs - self.n_deleted
+        total_length = int(self.doc_lengths.sum())
+        if self.n_deleted:
+            total_length -= int(self.doc_lengths[self.deleted].sum())
+        self.avgdl = total_length / n_live if n_live else 0.0
+        self.idf = self._compute_idf(self.doc_freqs, n_live)
+
+    def _doc_norm(self, doc_lengths: np.ndarray) -> np.ndarray:
+        if self.saturation_avgdl > 0:
+            return (1 - self.b + self.b * doc_lengths / self.saturation_avgdl).astype(np.float32)
+        return np.ones(len(doc_lengths), dtype=np.float32)
+
+    def add(self, corpus: Iterable[Sequence[str]]) -> np.ndarray:
+        """
+        토큰화된 문서를 delta segment에 추가하고, 추가된 문서의 위치를 반환합니다.
+        기존 문서는 다시 토큰화/색인하지 않고 df, avgdl, idf만 증분 갱신합니다.
+        """
+        n_delta = self.n_delta_docs
+        rows: List[int] = []
+        cols: List[int] = []
+        freqs: List[int] = []
+        doc_lengths: List[int] = []
+
+        for offset, tokens in enumerate(corpus):
+            for term, tf in Counter(tokens).items():
+                term_id = self.term_id(term)
+                if term_id is None:
+                    term_id = self.extra_vocabulary[term] = self.n_terms
+                rows.append(term_id)
+                cols.append(n_delta + offset)
+                freqs.append(tf)
+            doc_lengths.append(len(tokens))
+
+        start = self.n_docs
+        self._append_delta(
+            np.asarray(rows, dtype=np.int32),
+            np.asarray(cols, dtype=np.int32),
+            np.asarray(freqs, dtype=np.float32),
+            np.asarray(doc_lengths, dtype=np.int32),
+        )
+        return np.arange(start, self.n_docs)
+
+    def _append_delta(self, rows: np.ndarray, cols: np.ndarray, freqs: np.ndarray, doc_lengths: np.ndarray) -> None:
+        self.delta_rows = np.concatenate([self.delta_rows, rows])
+        self.delta_cols = np.concatenate([self.delta_cols, cols])
+        self.delta_freqs = np.concatenate([self.delta_freqs, freqs])
+        self.doc_lengths = np.concatenate([self.doc_lengths, doc_lengths])
+        self.deleted = np.concatenate([self.deleted, np.zeros(len(doc_lengths), dtype=bool)])
+
+        # 새 term만큼 df 배열을 늘리고 추가된 posting 수만큼 증가 (mmap된 base 배열은 새 배열로 교체됨)
+        doc_freqs = np.zeros(self.n_terms, dtype=np.int32)
+        doc_freqs[:len(self.doc_freqs)] = self.doc_freqs
+        self.doc_freqs = doc_freqs + np.bincount(rows, minlength=self.n_terms).astype(np.int32)
+
+        self._update_statistics()
+        self._build_delta()
+
+    def _build_delta(self) -> None:
+        delta_term_freqs = csr_matrix(
+            (self.delta_freqs, (self.delta_rows, self.delta_cols)),
+            shape=(self.n_terms, self.n_delta_docs),
+            dtype=np.float32,
+        )
+        delta_term_freqs.sort_indices()
+        doc_norm = self._doc_norm(self.doc_lengths[self.n_base_docs:])
+        data = self._compute_saturation(delta_term_freqs.data, doc_norm[delta_term_freqs.indices])
+        self.delta_term_freqs = delta_term_freqs
+        self.delta_saturation = csr_matrix((data, delta_term_freqs.indices, delta_term_freqs.indptr), shape=delta_term_freqs.shape)
+
+    def delete(self, positions: Iterable[int]) -> int:
+        """
+        문서 위치들을 tombstone으로 표시하고 df, avgdl, idf를 갱신합니다.
+        posting list에서 실제로 제거되는 것은 compact() 때이며, 새로 삭제된 문서 수를 반환합니다.
+        """
+        positions = np.unique(np.asarray(list(positions), dtype=np.int64))
+        positions = positions[(positions >= 0) & (positions < self.n_docs)]
+        positions = positions[~self.deleted[positions]]
+        if len(positions) == 0:
+            return 0
+
+        self.deleted[positions] = True
+        self.n_deleted += len(positions)
+
+        # 삭제된 문서가 등장하는 term별 개수만큼 df 감소
+        base = positions[positions < self.n_base_docs]
+        delta = positions[positions >= self.n_base_docs] - self.n_base_docs
+        removed = np.zeros(self.n_terms, dtype=np.int32)
+        if len(base):
+            removed[:self.n_base_terms] += np.diff(self.term_freqs[:, base].indptr).astype(np.int32)
+        if len(delta):
+            removed += np.diff(self.delta_term_freqs[:, delta].indptr).astype(np.int32)
+        self.doc_freqs = self.doc_freqs - removed
+
+        self._update_statistics()
+        return len(positions)
+
+    def compact(self) -> np.ndarray:
+        """
+        base와 delta segment를 tombstone을 제외하고 하나의 base segment로 합친 뒤 saturation을 다시 계산합니다.
+        새 위치 순서대로 이전 위치(살아있는 문서)를 반환하므로, 호출자는 문서 목록을 같은 순서로 재배치하면 됩니다.
+        """
+        live = np.flatnonzero(~self.deleted)
+        n_terms = self.n_terms
+
+        base = self.term_freqs
+        if n_terms > self.n_base_terms:
+            base = vstack([base, csr_matrix((n_terms - self.n_base_terms, self.n_base_docs), dtype=np.float32)])
+        term_freqs = hstack([base, self.delta_term_freqs], format="csr")[:, live]
+
+        # 살아있는 문서에 더 이상 등장하지 않는 term은 어휘 사전에서 제거
+        keep = np.flatnonzero(np.diff(term_freqs.indptr) > 0)
+        term_freqs = term_freqs[keep].astype(np.float32)
+        term_freqs.sort_indices()
+
+        # vocabulary(dict: 삽입 순서 = id 순서, SortedStringTable: 정렬 순서 = id 순서)와 extra_vocabulary 모두 id 순서로 순회됨
+        terms = list(self.vocabulary) + list(self.extra_vocabulary)
+        self.vocabulary = {terms[term_id]: new_id for new_id, term_id in enumerate(keep)}
+        self.term_freqs = term_freqs
+        self.doc_lengths = np.asarray(self.doc_lengths[live], dtype=np.int32)
+        self.doc_freqs = np.diff(term_freqs.indptr).astype(np.int32)
+        self._refresh()
+
+        logger.info(f"BM25Index compacted: {self.n_docs} docs, {self.n_terms} terms, {term_freqs.nnz} postings")
+        return live
+
+    def save(self, directory: str) -> None:
+        """
+        pickle 없이 디렉토리에 저장합니다.
+
+        posting list와 문서 길이 등은 평평한 .npy 배열로, 어휘 사전은 정렬된 문자열 테이블로 저장하고
+        term id는 정렬된 어휘 순서로 다시 매깁니다. meta.json을 마지막에 기록하므로 meta.json이 있으면 저장이 끝난 것입니다.
+        delta segment나 tombstone이 남아 있으면 먼저 compact()해야 하며, 디렉토리에 남아 있던 이전 delta segment는 지웁니다.
+        """
+        if self.has_pending_changes:
+            raise ValueError("BM25Index has pending delta segment or tombstones. Call compact() before save().")
+
+        os.makedirs(directory, exist_ok=True)
+        shutil.rmtree(os.path.join(directory, "delta"), ignore_errors=True)
+
+        terms = sorted(self.vocabulary)
+        order = np.fromiter((self.vocabulary[term] for term in terms), dtype=np.int64, count=len(terms))
+
+        # 정렬된 어휘 순서대로 CSR 행(posting list)을 재배치
+        tf = self.term_freqs
+        lengths = np.diff(tf.indptr)[order]
+        indptr = np.zeros(len(order) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        positions = np.repeat(tf.indptr[order] - indptr[:-1], lengths) + np.arange(tf.nnz)
+
+        index_dtype = np.int32 if max(tf.nnz, self.n_docs) < np.iinfo(np.int32).max else np.int64
+        arrays = {
+            "indptr": indptr.astype(index_dtype),
+            "indices": tf.indices[positions].astype(index_dtype),
+            "term_freqs": tf.data[positions],
+            "saturation": self.saturation.data[positions],
+            "max_saturation": self.max_saturation[order],
+            "doc_freqs": self.doc_freqs[order],
+            "idf": self.idf[order],
+            "doc_lengths": self.doc_lengths,
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(array))
+        SortedStringTable.write(terms, directory, "vocab")
+
+        meta = {
+            "format_version": BM25_FORMAT_VERSION,
+            "segment_id": self.segment_id,
+            "variant": self.variant,
+            "k1": self.k1,
+            "b": self.b,
+            "epsilon": self.epsilon,
+            "delta": self.delta,
+            "avgdl": self.avgdl,
+            "n_docs": self.n_docs,
+            "n_terms": len(terms),
+        }
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=4)
+
+        logger.info(f"BM25Index saved to {directory}")
+
+    def is_saved_base(self, directory: str) -> bool:
+        """directory에 저장된 base segment가 현재 base segment와 같으면 True (save_delta 가능 여부)"""
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return False
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("segment_id") == self.segment_id
+
+    def save_delta(self, directory: str) -> None:
+        """
+        delta segment(추가된 term, posting, 문서 길이)와 tombstone만 `{directory}/delta`에 저장합니다.
+        base 파일은 다시 쓰지 않으며, meta.json을 마지막에 기록합니다.
+        """
+        if not self.is_saved_base(directory):
+            raise ValueError(f"Base segment in {directory} differs from the current one. Call compact() and save() instead.")
+
+        delta_dir = os.path.join(directory, "delta")
+        os.makedirs(delta_dir, exist_ok=True)
+
+        arrays = {
+            "rows": self.delta_rows,
+            "cols": self.delta_cols,
+            "freqs": self.delta_freqs,
+            "doc_lengths": self.doc_lengths[self.n_base_docs:],
+            "deleted": np.flatnonzero(self.deleted),
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(delta_dir, f"{name}.npy"), np.ascontiguousarray(array))
+
+        meta = {
+            "format_version": BM25_FORMAT_VERSION,
+            "segment_id": self.segment_id,
+            "terms": list(self.extra_vocabulary),  # 삽입 순서 = term id 순서
+        }
+        with open(os.path.join(delta_dir, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        logger.info(f"BM25Index delta saved to {delta_dir} ({self.n_delta_docs} docs, {self.n_deleted} tombstones)")
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> BM25Index:
+        """
+        save()로 저장한 인덱스를 로드합니다. mmap=True이면 모든 배열을 np.load(mmap_mode="r")로 열어
+        여러 worker 프로세스가 page cache에 올라간 하나의 사본을 공유합니다.
+        save_delta()로 저장한 `{directory}/delta`가 있으면 이어서 적용합니다.
+        """
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"File not found: {meta_path}")
+
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != BM25_FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index format version: {meta.get('format_version')}")
+
+        index = cls(variant=meta["variant"], k1=meta["k1"], b=meta["b"], epsilon=meta["epsilon"], delta=meta["delta"])
+
+        def load_array(name: str) -> np.ndarray:
+            return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+
+        shape = (meta["n_terms"], meta["n_docs"])
+        indptr, indices = load_array("indptr"), load_array("indices")
+        index.vocabulary = SortedStringTable.load(directory, "vocab", mmap=mmap)
+        index.term_freqs = csr_matrix((load_array("term_freqs"), indices, indptr), shape=shape, copy=False)
+        index.saturation = csr_matrix((load_array("saturation"), indices, indptr), shape=shape, copy=False)
+        index.max_saturation = load_array("max_saturation")
+        index.doc_freqs = load_array("doc_freqs")
+        index.idf = load_array("idf")
+        index.doc_lengths = load_array("doc_lengths")
+        index.avgdl = index.saturation_avgdl = meta["avgdl"]
+        index.segment_id = meta.get("segment_id", "")
+        index._reset_delta()
+
+        delta_dir = os.path.join(directory, "delta")
+        if os.path.exists(os.path.join(delta_dir, "meta.json")):
+            index._load_delta(delta_dir)
+
+        logger.info(f"BM25Index loaded from {directory} (mmap={mmap})")
+        return index
+
+    def _load_delta(self, delta_dir: str) -> None:
+        with open(os.path.join(delta_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format_version") != BM25_FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 delta format version: {meta.get('format_version')}")
+        if meta.get("segment_id") != self.segment_id:
+            raise ValueError(f"BM25 delta segment does not match the base index: {delta_dir}")
+
+        def load_array(name: str) -> np.ndarray:
+            return np.load(os.path.join(delta_dir, f"{name}.npy"))
+
+        self.extra_vocabulary = {term: self.n_base_terms + i for i, term in enumerate(meta["terms"])}
+        self._append_delta(load_array("rows"), load_array("cols"), load_array("freqs"), load_array("doc_lengths"))
+        self.delete(load_array("deleted"))
+        logger.info(f"BM25Index delta loaded from {delta_dir} ({self.n_delta_docs} docs, {self.n_deleted} tombstones)")
+
+    def _compute_idf(self, doc_freqs: np.ndarray, n_docs: int) -> np.ndarray:
+        df = doc_freqs.astype(np.float64)
+        if self.variant == "okapi":
+            idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+            # rank_bm25와 동일하게 음수 idf는 epsilon * 평균 idf로 대체
+            if len(idf):
+                idf[idf < 0] = self.epsilon * idf.mean()
+        elif self.variant == "bm25l":
+            idf = np.log(n_docs + 1) - np.log(df + 0.5)
+        else:
+            idf = np.log(n_docs + 1) - np.log(np.maximum(df, 1))
+        return idf.astype(np.float32)
+
+    def _compute_saturation(self, tf: np.ndarray, doc_norm: np.ndarray) -> np.ndarray:
+        # BM25L/BM25+의 delta는 원 논문 정의대로 해당 term이 등장한 문서(posting)에만 더합니다.
+        k1, delta = self.k1, self.delta
+        if self.variant == "okapi":
+            sat = tf * (k1 + 1) / (tf + k1 * doc_norm)
+        elif self.variant == "bm25l":
+            ctd = tf / doc_norm
+            sat = (k1 + 1) * (ctd + delta) / (k1 + ctd + delta)
+        else:
+            sat = delta + tf * (k1 + 1) / (k1 * doc_norm + tf)
+        return sat.astype(np.float32)
+
+    def query_weights(self, query_tokens: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        질의 토큰을 (term id, 질의 빈도 x idf) 배열로 변환합니다. 사전에 없는 토큰은 무시합니다.
+        """
+        term_ids, freqs = [], []
+        for token, count in Counter(query_tokens).items():
+            term_id = self.term_id(token)
+            if term_id is not None:
+                term_ids.append(term_id)
+                freqs.append(count)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        return term_ids, np.asarray(freqs, dtype=np.float32) * self.idf[term_ids]
+
+    def _query_vector(self, term_ids: np.ndarray, weights: np.ndarray, n_terms: int) -> csr_matrix:
+        return csr_matrix(
+            (weights, (np.zeros(len(term_ids), dtype=np.int32), term_ids)),
+            shape=(1, n_terms),
+        )
+
+    def _base_scores(self, term_ids: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        base = term_ids < self.n_base_terms
+        query_vector = self._query_vector(term_ids[base], weights[base], self.n_base_terms)
+        return (query_vector @ self.saturation).toarray().ravel()
+
+    def _delta_scores(self, term_ids: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        return (self._query_vector(term_ids, weights, self.n_terms) @ self.delta_saturation).toarray().ravel()
+
+    def get_scores(self, query_tokens: Sequence[str]) -> np.ndarray:
+        """
+        질의에 대한 전체 문서의 BM25 점수를 (1 x V) 질의 벡터와 (V x D) saturation 행렬의 곱으로 계산합니다.
+        delta segment 점수는 base 점수 뒤에 이어 붙이고, 삭제된 문서의 점수는 0입니다.
+        """
+        term_ids, weights = self.query_weights(query_tokens)
+        if len(term_ids) == 0:
+            return np.zeros(self.n_docs, dtype=np.float32)
+
+        scores = self._base_scores(term_ids, weights)
+        if self.n_delta_docs:
+            scores = np.concatenate([scores, self._delta_scores(term_ids, weights)])
+        if self.n_deleted:
+            scores[self.deleted] = 0
+        return scores
+
+    def get_top_k_batch(
+        self,
+        queries_tokens: Sequence[Sequence[str]],
+        k: int,
+        batch_size: int = 64,
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        여러 질의의 상위 k개 (문서 위치, 점수)를 질의별로 반환합니다. 삭제된 문서는 제외합니다.
+
+        batch_size개 질의씩 (Q x V) sparse 질의 행렬을 만들어 saturation 행렬과 한 번에 곱하고,
+        행 단위 np.argpartition으로 top-k를 고릅니다. (Q x D) dense 점수 블록의 메모리는 batch_size로 조절합니다.
+        """
+        results: List[Tuple[np.ndarray, np.ndarray]] = []
+        for start in range(0, len(queries_tokens), batch_size):
+            rows, term_ids, weights = [], [], []
+            for row, query_tokens in enumerate(queries_tokens[start:start + batch_size]):
+                query_term_ids, query_weights = self.query_weights(query_tokens)
+                rows.append(np.full(len(query_term_ids), row, dtype=np.int32))
+                term_ids.append(query_term_ids)
+                weights.append(query_weights)
+            n_queries = len(rows)
+            rows, term_ids, weights = np.concatenate(rows), np.concatenate(term_ids), np.concatenate(weights)
+
+            base = term_ids < self.n_base_terms
+            query_matrix = csr_matrix((weights[base], (rows[base], term_ids[base])), shape=(n_queries, self.n_base_terms))
+            scores = (query_matrix @ self.saturation).toarray()
+            if self.n_delta_docs:
+                query_matrix = csr_matrix((weights, (rows, term_ids)), shape=(n_queries, self.n_terms))
+                scores = np.hstack([scores, (query_matrix @ self.delta_saturation).toarray()])
+            if self.n_deleted:
+                scores[:, self.deleted] = -np.inf
+
+            top_k = min(k, self.n_docs)
+            if top_k <= 0:
+                results.extend((np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in range(n_queries))
+                continue
+            top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+            top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+            for doc_ids, doc_scores in zip(top, top_scores):
+                finite = np.isfinite(doc_scores)
+                results.append((doc_ids[finite].astype(np.int64), doc_scores[finite]))
+        return results
+
+    def get_top_n(self, query_tokens: Sequence[str], documents: Sequence, n: int = 5) -> List:
+        doc_ids, _ = self.get_top_k(query_tokens, n)
+        return [documents[i] for i in doc_ids]
+
+    def get_top_k(self, query_tokens: Sequence[str], k: int, method: str = "exhaustive") -> Tuple[np.ndarray, np.ndarray]:
+        """
+        질의에 대한 상위 k개 문서의 (문서 위치, 점수)를 점수 내림차순으로 반환합니다. 삭제된 문서는 제외합니다.
+
+        Args:
+            query_tokens: 토큰화된 질의
+            k: 반환할 문서 수
+            method: "exhaustive"(전체 문서 점수 계산) 또는 "wand"(posting list upper bound 기반 조기 종료).
+                "wand"는 질의 term이 하나도 없는 문서(점수 0)는 반환하지 않습니다.
+        """
+        if method not in BM25_SEARCH_METHODS:
+            raise ValueError(f"Unsupported BM25 search method: {method}")
+
+        term_ids, weights = self.query_weights(query_tokens)
+        # 음수 가중치가 있으면 upper bound가 성립하지 않으므로 전체 계산으로 대체
+        if method == "exhaustive" or (weights < 0).any():
+            scores = self.get_scores(query_tokens)
+            if self.n_deleted:
+                scores[self.deleted] = -np.inf
+            top = top_k_indices(scores, k)
+            top = top[np.isfinite(scores[top])]
+            return top, scores[top]
+
+        if len(term_ids) == 0 or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        doc_ids, scores = self._top_k_maxscore(term_ids, weights, k)
+        if self.n_delta_docs:
+            # delta segment는 작으므로 전체 점수를 계산해 base 후보와 병합
+            delta_scores = self._delta_scores(term_ids, weights)
+            hits = np.flatnonzero((delta_scores > 0) & ~self.deleted[self.n_base_docs:])
+            doc_ids = np.concatenate([doc_ids, hits + self.n_base_docs])
+            scores = np.concatenate([scores, delta_scores[hits]])
+
+        top = top_k_indices(scores, k)
+        return doc_ids[top].astype(np.int64), scores[top].astype(np.float32)
+
+    def _top_k_maxscore(self, term_ids: np.ndarray, weights: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        base segment에 대한 MaxScore 방식의 top-k 검색.
+
+        term을 upper bound 내림차순으로 처리하면서 현재 k번째 점수(threshold)를 유지합니다.
+        남은 term들의 upper bound 합이 threshold 이하가 되면 새 문서는 더 이상 top-k에 들어올 수 없으므로,
+        이후 term은 posting list 전체를 순회하지 않고 살아남은 후보 문서만 이진 탐색으로 점수를 보충합니다.
+        """
+        base = term_ids < self.n_base_terms
+        term_ids, weights = term_ids[base], weights[base]
+
+        upper_bounds = weights * self.max_saturation[term_ids]
+        order = np.argsort(-upper_bounds, kind="stable")
+        term_ids, weights = term_ids[order], weights[order]
+        # remaining[i]: i번째 이후 term들의 upper bound 합
+        remaining = np.cumsum(upper_bounds[order][::-1])[::-1]
+
+        # essential term: 아직 후보가 아닌 문서도 top-k에 들어올 수 있으므로 posting list 전체를 sparse 행렬곱으로 누적.
+        # 1, 2, 4, ... 개씩 묶어서 누적하고 묶음마다 threshold(현재 k번째 점수)를 갱신합니다.
+        partial = csr_matrix((1, self.n_base_docs), dtype=np.float32)
+        threshold = 0.0
+        i, batch = 0, 1
+        while i < len(term_ids) and (partial.nnz < k or remaining[i] > threshold):
+            terms = slice(i, min(i + batch, len(term_ids)))
+            partial = partial + self._query_vector(term_ids[terms], weights[terms], self.n_base_terms) @ self.saturation
+            if self.n_deleted:
+                # tombstone 문서는 후보와 threshold 계산에서 제외
+                partial.data[self.deleted[partial.indices]] = 0
+                partial.eliminate_zeros()
+            threshold = _kth_largest(partial.data, k)
+            i, batch = terms.stop, batch * 2
+
+        partial.sort_indices()
+        cand_ids, cand_scores = partial.indices, partial.data.astype(np.float64)
+        indptr, indices, data = self.saturation.indptr, self.saturation.indices, self.saturation.data
+
+        # non-essential term: 후보 중 upper bound로 threshold에 닿을 수 있는 문서만 남기고,
+        # 후보 목록과 posting list 중 짧은 쪽을 긴 쪽에서 이진 탐색해 점수를 보충합니다.
+        for j in range(i, len(term_ids)):
+            alive = cand_scores + remaining[j] >= threshold
+            cand_ids, cand_scores = cand_ids[alive], cand_scores[alive]
+
+            start, end = indptr[term_ids[j]], indptr[term_ids[j] + 1]
+            if start == end or len(cand_ids) == 0:
+                continue
+            postings, contrib = indices[start:end], data[start:end]
+            if len(cand_ids) <= len(postings):
+                pos = np.minimum(np.searchsorted(postings, cand_ids), len(postings) - 1)
+                hit = postings[pos] == cand_ids
+                cand_scores[hit] += contrib[pos[hit]] * weights[j]
+            else:
+                pos = np.minimum(np.searchsorted(cand_ids, postings), len(cand_ids) - 1)
+                hit = cand_ids[pos] == postings
+                cand_scores[pos[hit]] += contrib[hit] * weights[j]
+            threshold = _kth_largest(cand_scores, k)
+
+        top = top_k_indices(cand_scores, k)
+        return cand_ids[top].astype(np.int64), cand_scores[top]
@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import time
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken이 없으면 글자 수로 토큰 수를 근사
+    tiktoken = None
+
+
+logger = logging.getLogger(__name__)
+
+# rate limit 에러 이후 모든 요청을 멈추는 시간 (api_request_parallel_processor.py와 동일)
+SECONDS_TO_PAUSE_AFTER_RATE_LIMIT_ERROR = 15
+
+
+class TokenCounter:
+    """요청 packing에 쓰는 토큰 수 계산기. tiktoken이 없으면 글자 수를 상한 근사값으로 사용합니다."""
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        self.encoding = tiktoken.get_encoding(encoding_name) if tiktoken is not None else None
+
+    def __call__(self, texts: Sequence[str]) -> List[int]:
+        if self.encoding is None:
+            return [max(1, len(text)) for text in texts]
+        return [max(1, len(ids)) for ids in self.encoding.encode_batch(list(texts), disallowed_special=())]
+
+
+class RateLimiter:
+    """
+    분당 요청 수/토큰 수 제한. (api_request_parallel_processor.py의 capacity 방식)
+    남은 capacity는 경과 시간에 비례해 분당 한도까지 다시 채워지고, 부족하면 채워질 때까지 기다립니다.
+    한도가 None인 항목은 제한하지 않습니다.
+    """
+
+    def __init__(self, max_requests_per_minute: Optional[float], max_tokens_per_minute: Optional[float]):
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.available_requests = max_requests_per_minute
+        self.available_tokens = max_tokens_per_minute
+        self.last_update = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _refilled(available: Optional[float], limit: Optional[float], elapsed: float) -> Optional[float]:
+        if limit is None or elapsed <= 0:
+            return available
+        return min(available + limit * elapsed / 60.0, limit)
+
+    @staticmethod
+    def _wait_seconds(needed: float, available: Optional[float], limit: Optional[float]) -> float:
+        if limit is None:
+            return 0.0
+        return (needed - available) * 60.0 / limit
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.last_update
+        self.available_requests = self._refilled(self.available_requests, self.max_requests_per_minute, elapsed)
+        self.available_tokens = self._refilled(self.available_tokens, self.max_tokens_per_minute, elapsed)
+        self.last_update = now
+
+    def acquire(self, n_tokens: int) -> None:
+        """요청 1개와 n_tokens만큼의 capacity를 확보할 때까지 대기합니다."""
+        # 한 요청이 분당 토큰 한도보다 크면 영원히 기다리게 되므로 한도로 자름
+        if self.max_tokens_per_minute is not None:
+            n_tokens = min(n_tokens, self.max_tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                requests_ok = self.max_requests_per_minute is None or self.available_requests >= 1
+                tokens_ok = self.max_tokens_per_minute is None or self.available_tokens >= n_tokens
+                if now >= self.paused_until and requests_ok and tokens_ok:
+                    if self.max_requests_per_minute is not None:
+                        self.available_requests -= 1
+                    if self.max_tokens_per_minute is not None:
+                        self.available_tokens -= n_tokens
+                    return
+
+                wait_seconds = max(
+                    self.paused_until - now,
+                    self._wait_seconds(1, self.available_requests, self.max_requests_per_minute),
+                    self._wait_seconds(n_tokens, self.available_tokens, self.max_tokens_per_minute),
+                )
+            time.sleep(min(max(wait_seconds, 0.001), 1.0))
+
+    def pause(self, seconds: float) -> None:
+        """rate limit 에러가 나면 모든 요청을 잠시 멈춥니다."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def pack_requests(token_counts: Sequence[int], max_tokens_per_request: int, max_texts_per_request: int) -> List[List[int]]:
+    """
+    텍스트 인덱스를 요청 단위로 묶습니다.
+    입력 순서대로 채우다가 토큰 합이 max_tokens_per_request 또는 개수가 max_texts_per_request를 넘으면 새 요청을 시작합니다.
+    """
+    requests, current, current_tokens = [], [], 0
+    for i, n_tokens in enumerate(token_counts):
+        if current and (current_tokens + n_tokens > max_tokens_per_request or len(current) >= max_texts_per_request):
+            requests.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n_tokens
+    if current:
+        requests.append(current)
+    return requests
+
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    return type(error).__name__ == "RateLimitError" or "rate limit" in str(error).lower()
+
+
+class EmbeddingExecutor(Embeddings):
+    """
+    embed_documents 호출을 토큰 예산 단위 요청으로 나눠 동시에 실행하는 Embeddings 래퍼.
+
+    - 요청은 max_tokens_per_request / max_texts_per_request 안에서 순서대로 packing
+    - max_concurrency개의 요청을 동시에 실행하고, RateLimiter로 분당 요청/토큰 수를 제한
+    - 실패한 요청(sub-batch)만 지수 backoff 후 재시도하며, rate limit 에러면 전체 요청을 잠시 멈춤
+    - tune_batch_size=True면 첫 호출에서 HuggingFace encode batch_size를 처리량 기준으로 선택 (CPU용)
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_concurrency: int = 4,
+        max_tokens_per_request: int = 100_000,
+        max_texts_per_request: int = 2048,
+        max_requests_per_minute: Optional[float] = None,
+        max_tokens_per_minute: Optional[float] = None,
+        max_attempts: int = 5,
+        tune_batch_size: bool = False,
+        batch_size_candidates: Sequence[int] = (8, 16, 32, 64, 128),
+    ):
+        """
+        Args:
+            embeddings: 실제 임베딩 모델
+            max_concurrency: 동시에 실행할 요청 수 (로컬 모델이면 1)
+            max_tokens_per_request: 요청 하나의 토큰 합 상한
+            max_texts_per_request: 요청 하나의 텍스트 수 상한
+            max_requests_per_minute: 분당 요청 수 한도 (None이면 제한 없음)
+            max_tokens_per_minute: 분당 토큰 수 한도 (None이면 제한 없음)
+            max_attempts: 요청별 최대 시도 횟수
+            tune_batch_size: HuggingFace 모델의 encode batch_size 자동 선택 여부
+            batch_size_candidates: 자동 선택 시 측정할 batch_size 후보
+        """
+        self.embeddings = embeddings
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_tokens_per_request = max_tokens_per_request
+        self.max_texts_per_request = max_texts_per_request
+        self.max_attempts = max_attempts
+        self.count_tokens = TokenCounter()
+        self.rate_limiter = (
+            RateLimiter(max_requests_per_minute or None, max_tokens_per_minute or None)
+            if max_requests_per_minute or max_tokens_per_minute
+            else None
+        )
+        self.tune_batch_size = tune_batch_size and hasattr(embeddings, "encode_kwargs")
+        self.batch_size_candidates = batch_size_candidates
+        self.texts_per_second = 0.0
+
+    def _call(self, texts: List[str], n_tokens: int, delay: float) -> List[List[float]]:
+        if delay:
+            time.sleep(delay)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(n_tokens)
+        return self.embeddings.embed_documents(texts)
+
+    def _select_batch_size(self, texts: List[str]) -> List[List[float]]:
+        """후보 batch_size별로 샘플 텍스트를 임베딩해 texts/sec가 가장 높은 값을 encode_kwargs에 설정합니다."""
+        best_batch_size, best_throughput, vectors = None, 0.0, None
+        for batch_size in self.batch_size_candidates:
+            self.embeddings.encode_kwargs["batch_size"] = batch_size
+            start = time.perf_counter()
+            vectors = self.embeddings.embed_documents(texts)
+            throughput = len(texts) / max(time.perf_counter() - start, 1e-9)
+            logger.info(f"Embedding batch_size={batch_size}: {throughput:.1f} texts/sec")
+            if throughput > best_throughput:
+                best_batch_size, best_throughput = batch_size, throughput
+
+        self.embeddings.encode_kwargs["batch_size"] = best_batch_size
+        self.tune_batch_size = False
+        logger.info(f"Embedding batch_size tuned to {best_batch_size}")
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+
+        start = time.perf_counter()
+        results: List[Optional[List[float]]] = [None] * len(texts)
+
+        offset = 0
+        if self.tune_batch_size:
+            # 튜닝에 쓴 샘플의 임베딩은 그대로 결과로 사용
+            offset = min(len(texts), 2 * max(self.batch_size_candidates))
+            results[:offset] = self._select_batch_size(texts[:offset])
+
+        token_counts = self.count_tokens(texts[offset:])
+        requests = [
+            [offset + i for i in request]
+            for request in pack_requests(token_counts, self.max_tokens_per_request, self.max_texts_per_request)
+        ]
+
+        n_retries = 0
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, max(len(requests), 1))) as pool:
+            def submit(request, attempt, delay=0.0):
+                n_tokens = sum(token_counts[i - offset] for i in request)
+                future = pool.submit(self._call, [texts[i] for i in request], n_tokens, delay)
+                pending[future] = (request, attempt)
+
+            pending = {}
+            for request in requests:
+                submit(request, 1)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    request, attempt = pending.pop(future)
+                    try:
+                        vectors = future.result()
+                    except Exception as e:
+                        if attempt >= self.max_attempts:
+                            logger.error(f"Embedding request failed after {attempt} attempts: {e}")
+                            raise
+                        if _is_rate_limit_error(e) and self.rate_limiter is not None:
+                            self.rate_limiter.pause(SECONDS_TO_PAUSE_AFTER_RATE_LIMIT_ERROR)
+                        delay = min(2 ** attempt, 60)
+                        logger.warning(f"Embedding request of {len(request)} texts failed ({e}), retrying in {delay}s")
+                        n_retries += 1
+                        submit(request, attempt + 1, delay)
+                        continue
+
+                    for i, vector in zip(request, vectors):
+                        results[i] = vector
+
+        elapsed = time.perf_counter() - start
+        self.texts_per_second = len(texts) / max(elapsed, 1e-9)
+        logger.info(
+            f"Embedded {len(texts)} texts in {elapsed:.2f}s ({self.texts_per_second:.1f} texts/sec, "
+            f"{len(requests)} requests, {n_retries} retries)"
+        )
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
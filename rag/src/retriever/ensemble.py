@@ -3,8 +3,9 @@ Ensemble retriever that ensemble the results of
 multiple retrievers by using weighted  Reciprocal Rank Fusion
 """
 
+import time
 import asyncio
-from collections import defaultdict
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from collections.abc import Hashable
 from itertools import chain
 from typing import (
@@ -15,6 +16,7 @@ from typing import (
     Iterator,
     List,
     Optional,
+    Tuple,
     TypeVar,
     cast,
 )
@@ -26,7 +28,7 @@ from langchain_core.callbacks import (
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever, RetrieverLike
 from langchain_core.runnables import RunnableConfig
-from langchain_core.runnables.config import ensure_config, patch_config
+from langchain_core.runnables.config import ContextThreadPoolExecutor, ensure_config, patch_config, run_in_executor
 from langchain_core.runnables.utils import (
     ConfigurableFieldSpec,
     get_unique_config_specs,
@@ -34,6 +36,11 @@ from langchain_core.runnables.utils import (
 from pydantic import model_validator
 from enum import Enum
 
+from retriever.fusion import SMALL_FUSION_SIZE, ensure_doc_ids, fuse, fuse_keys
+from retriever.reranker import CrossEncoderReranker
+
+import numpy as np
+
 import logging
 logger = logging.getLogger(__name__)
 T = TypeVar("T")
@@ -43,6 +50,7 @@ H = TypeVar("H", bound=Hashable)
 class EnsembleMethod(str, Enum):
     RRF = "rrf"
     CC = "cc"
+    DBSF = "dbsf"
 
 
 def unique_by_key(iterable: Iterable[T], key: Callable[[T], H]) -> Iterator[T]:
@@ -62,22 +70,37 @@ def unique_by_key(iterable: Iterable[T], key: Callable[[T], H]) -> Iterator[T]:
 
 class EnsembleRetriever(BaseRetriever):
     """Retriever that ensembles the multiple retrievers.
-    It uses either Reciprocal Rank Fusion (RRF) or Convex Combination (CC) method.
+    It uses Reciprocal Rank Fusion (RRF), Convex Combination (CC)
+    or Distribution-Based Score Fusion (DBSF) method.
     Args:
         retrievers: A list of retrievers to ensemble.
         weights: A list of weights corresponding to the retrievers.
-                 Must sum to 1 for CC method.
-        method: The ensemble method to use. Either "rrf" or "cc".
+                 Must sum to 1 for CC and DBSF methods.
+        method: The ensemble method to use. One of "rrf", "cc" or "dbsf".
         c: A constant for RRF method. Default is 60.
+        normalization: CC에서 retriever별 점수(metadata['score']) 정규화 방식.
+            "max"(기본값, 최댓값으로 나눔), "minmax", "zscore", "rank"
+        top_k: 결합 후 상위 top_k개 문서만 반환. None이면 전부 반환
         id_key: The key in the document's metadata used to determine unique documents.
             If not specified, page_content is used.
+        max_workers: 동기 검색(rank_fusion) 한 번에 retriever를 동시에 실행할 스레드 수. 기본값은 retriever 수
+        timeout: retriever별 제한 시간(초). 시간 안에 끝난 retriever 결과만으로 결합하고,
+            모두 실패하면 예외를 발생시킵니다. None이면 제한 없음
+        reranker: 결합 후 상위 후보를 다시 점수화할 CrossEncoderReranker (None이면 재순위화 안 함)
+        rerank_top_k: 재순위화 후 반환할 문서 수 (None이면 전부)
     """
 
     retrievers: List[RetrieverLike]
     weights: List[float]
     method: EnsembleMethod = EnsembleMethod.RRF
     c: int = 60
+    normalization: str = "max"
+    top_k: Optional[int] = None
     id_key: Optional[str] = None
+    max_workers: Optional[int] = None
+    timeout: Optional[float] = None
+    reranker: Optional[CrossEncoderReranker] = None
+    rerank_top_k: Optional[int] = None
 
     @model_validator(mode="before")
     @classmethod
@@ -88,8 +111,8 @@ class EnsembleRetriever(BaseRetriever):
         if not weights:
             n_retrievers = len(values["retrievers"])
             values["weights"] = [1 / n_retrievers] * n_retrievers
-        elif method == EnsembleMethod.CC and abs(sum(weights) - 1.0) > 1e-6:
-            raise ValueError("Weights must sum to 1.0 for CC method")
+        elif method in (EnsembleMethod.CC, EnsembleMethod.DBSF) and abs(sum(weights) - 1.0) > 1e-6:
+            raise ValueError("Weights must sum to 1.0 for CC and DBSF methods")
 
         return values
 
@@ -206,87 +229,176 @@ class EnsembleRetriever(BaseRetriever):
 
         return fused_documents
 
-    def ensemble_results(self, doc_lists: List[List[Document]]) -> List[Document]:
+    def ensemble_results(
+        self, doc_lists: List[List[Document]], weights: Optional[List[float]] = None
+    ) -> List[Document]:
         """
-        Ensemble the results using either RRF or CC method.
+        Ensemble the results using RRF, CC or DBSF method.
         Args:
             doc_lists: A list of rank lists, where each rank list contains unique items.
+            weights: doc_lists에 대응하는 가중치. 기본값은 self.weights
+                (일부 retriever가 빠진 경우 남은 retriever의 가중치만 넘김)
         Returns:
             list: The final aggregated list of items sorted by their scores in descending order.
         """
-        if len(doc_lists) != len(self.weights):
+        weights = self.weights if weights is None else weights
+        if len(doc_lists) != len(weights):
             raise ValueError(
                 "Number of rank lists must be equal to the number of weights."
             )
 
         if self.method == EnsembleMethod.RRF:
-            return self.reciprocal_rank_fusion(doc_lists)
+            return self.reciprocal_rank_fusion(doc_lists, weights)
         elif self.method == EnsembleMethod.CC:
-            return self.convex_combination(doc_lists)
+            return self.convex_combination(doc_lists, weights)
+        elif self.method == EnsembleMethod.DBSF:
+            return self.distribution_based_fusion(doc_lists, weights)
         else:
             raise ValueError("Invalid ensemble method")
 
-    def reciprocal_rank_fusion(self, doc_lists: List[List[Document]]) -> List[Document]:
+    def _fuse_documents(
+        self,
+        doc_lists: List[List[Document]],
+        weights: Optional[List[float]],
+        method: str,
+        normalization: str = "max",
+    ) -> List[Document]:
+        """
+        문서를 정수 id로 한 번 매핑한 뒤 retriever.fusion.fuse로 결합합니다.
+        후보가 SMALL_FUSION_SIZE 이하이면 NumPy 호출 비용이 더 크므로 fuse_keys로 문서 키를 바로 결합합니다. (결과 동일)
+        입력 Document는 수정하지 않고, 반환하는 문서(top_k가 있으면 상위 top_k개)만 metadata['score']에 결합 점수를 담아 복사합니다.
+        (Document 복사는 문서당 수 µs로 결합 자체보다 비싸므로 버려지는 후보는 복사하지 않음)
+        같은 문서가 여러 retriever에 있으면 마지막 retriever의 Document를 사용합니다.
+        """
+        id_key = self.id_key
+        keyed_lists = [
+            [doc.page_content for doc in doc_list] if id_key is None else [doc.metadata[id_key] for doc in doc_list]
+            for doc_list in doc_lists
+        ]
+        scores = [None] * len(doc_lists) if method == "rrf" else [
+            [float(doc.metadata.get("score", 0)) for doc in doc_list] for doc_list in doc_lists
+        ]
+        weights = self.weights if weights is None else weights
+
+        if sum(len(doc_list) for doc_list in doc_lists) <= SMALL_FUSION_SIZE:
+            doc_of: Dict[Hashable, Document] = {}
+            for keys, doc_list in zip(keyed_lists, doc_lists):
+                doc_of.update(zip(keys, doc_list))
+            ranked = fuse_keys(keyed_lists, scores, weights, method=method, normalization=normalization, c=self.c, top_k=self.top_k)
+            fused_documents = [doc_of[key] for key, _ in ranked]
+            fused_scores = [score for _, score in ranked]
+        else:
+            ids, n_docs = ensure_doc_ids(keyed_lists)
+            docs: List[Optional[Document]] = [None] * n_docs
+            for doc_list, leg_ids in zip(doc_lists, ids):
+                for doc, doc_id in zip(doc_list, leg_ids.tolist()):
+                    docs[doc_id] = doc
+
+            fused_ids, fused_scores = fuse(
+                ids,
+                [None if leg_scores is None else np.asarray(leg_scores, dtype=np.float64) for leg_scores in scores],
+                weights,
+                method=method,
+                normalization=normalization,
+                c=self.c,
+                top_k=self.top_k,
+                n_docs=n_docs,
+            )
+            fused_documents = [docs[doc_id] for doc_id in fused_ids.tolist()]
+            fused_scores = fused_scores.tolist()
+
+        return [
+            doc.model_copy(update={"metadata": {**doc.metadata, "score": score}})
+            for doc, score in zip(fused_documents, fused_scores)
+        ]
+
+    def reciprocal_rank_fusion(
+        self, doc_lists: List[List[Document]], weights: Optional[List[float]] = None
+    ) -> List[Document]:
         """
         Perform Reciprocal Rank Fusion on multiple rank lists.
         params
             - doc_lists : 각각의 retriever가 반환한 문서 리스트의 리스트
+            - weights : doc_lists별 가중치 (기본값: self.weights)
         """
-        rrf_score: Dict[str, float] = defaultdict(float)
-        doc_map: Dict[str, Document] = {}
-        for doc_list, weight in zip(doc_lists, self.weights):
-            for rank, doc in enumerate(doc_list, start=1):
-                doc_id = (
-                    doc.page_content
-                    if self.id_key is None
-                    else doc.metadata[self.id_key]
-                )
-                rrf_score[doc_id] += weight / (rank + self.c)
-                doc_map[doc_id] = doc
-
-        sorted_docs = sorted(
-            doc_map.keys(),
-            key=lambda doc_id: rrf_score[doc_id],
-            reverse=True,
-        )
-        # 점수를 메타데이터에 추가
-        for doc_id in sorted_docs:
-            doc_map[doc_id].metadata['score'] = rrf_score[doc_id]
-        return [doc_map[doc_id] for doc_id in sorted_docs]
+        return self._fuse_documents(doc_lists, weights, "rrf")
 
-    def convex_combination(self, doc_lists: List[List[Document]]) -> List[Document]:
+    def convex_combination(
+        self, doc_lists: List[List[Document]], weights: Optional[List[float]] = None
+    ) -> List[Document]:
         """
         Perform Convex Combination on multiple rank lists.
+        retriever별 metadata['score']를 self.normalization으로 정규화한 뒤 가중합합니다.
         """
-        cc_scores: Dict[str, float] = defaultdict(float)
-        doc_map: Dict[str, Document] = {}
-
-        for doc_list, weight in zip(doc_lists, self.weights):
-            max_score = max((doc.metadata.get("score", 0) for doc in doc_list), default=1)
-            if max_score == 0:
-                logger.warning("All scores are 0. Setting max_score to 1.")
-                max_score = 1
-            for doc in doc_list:
-                doc_id = (
-                    doc.page_content
-                    if self.id_key is None
-                    else doc.metadata[self.id_key]
-                )
-                normalized_score = doc.metadata.get("score", 0) / max_score
-                cc_scores[doc_id] += weight * normalized_score
-                doc_map[doc_id] = doc
-                logger.debug(f"Doc ID: {doc_id}, Score: {doc.metadata.get('score', 0)}, Normalized Score: {normalized_score}")
-
-        sorted_docs = sorted(
-            doc_map.keys(),
-            key=lambda doc_id: cc_scores[doc_id],
-            reverse=True,
-        )
+        return self._fuse_documents(doc_lists, weights, "cc", self.normalization)
 
-        for doc_id in sorted_docs:
-            doc_map[doc_id].metadata['score'] = cc_scores[doc_id]
-            logger.debug(f"Final Score for Doc ID {doc_id}: {cc_scores[doc_id]}")
-        return [doc_map[doc_id] for doc_id in sorted_docs]
+    def distribution_based_fusion(
+        self, doc_lists: List[List[Document]], weights: Optional[List[float]] = None
+    ) -> List[Document]:
+        """
+        Perform Distribution-Based Score Fusion on multiple rank lists.
+        retriever별 점수를 평균 ± 3σ 구간 기준으로 [0, 1]에 맞춘 뒤 가중합합니다.
+        """
+        return self._fuse_documents(doc_lists, weights, "dbsf")
+
+    @staticmethod
+    def _timed_invoke(
+        retriever: RetrieverLike, query: str, config: RunnableConfig
+    ) -> Tuple[List[Document], float]:
+        start_time = time.perf_counter()
+        docs = retriever.invoke(query, config)
+        return docs, (time.perf_counter() - start_time) * 1000
+
+    @staticmethod
+    async def _atimed_invoke(
+        retriever: RetrieverLike, query: str, config: RunnableConfig
+    ) -> Tuple[List[Document], float]:
+        start_time = time.perf_counter()
+        docs = await retriever.ainvoke(query, config)
+        return docs, (time.perf_counter() - start_time) * 1000
+
+    def _fuse_available(
+        self, results: List[Tuple[Optional[List[Document]], Optional[float], Optional[BaseException]]]
+    ) -> List[Document]:
+        """
+        retriever별 (문서, 지연 시간(ms), 예외) 중 성공한 결과만 가중치를 다시 정규화해 결합합니다.
+        결합 결과(입력과 별개인 복사본)의 metadata에 이번 검색의 retriever별 지연 시간(retriever_latency_ms)과
+        빠진 retriever(missing_retrievers)를 문서마다 따로 기록합니다.
+        """
+        doc_lists, weights, latencies, missing = [], [], {}, []
+        for i, (docs, latency_ms, error) in enumerate(results):
+            name = f"retriever_{i+1}"
+            if error is not None:
+                missing.append(name)
+                if isinstance(error, (FutureTimeoutError, asyncio.TimeoutError)):
+                    logger.warning(f"{name} timed out after {self.timeout}s, fusing the remaining retrievers")
+                else:
+                    logger.warning(f"{name} failed ({error!r}), fusing the remaining retrievers")
+                continue
+
+            latencies[name] = latency_ms
+            weights.append(self.weights[i])
+            # Enforce that retrieved docs are Documents
+            doc_lists.append([
+                Document(page_content=cast(str, doc)) if not isinstance(doc, Document) else doc
+                for doc in docs
+            ])
+
+        if not doc_lists:
+            raise next(error for _, _, error in results if error is not None)
+
+        # 빠진 retriever가 있으면 남은 가중치 합이 1이 되도록 조정 (CC는 합이 1이어야 함)
+        if missing:
+            weights = [weight / sum(weights) for weight in weights]
+        logger.debug(f"Retriever latency (ms): {latencies}, missing: {missing}")
+
+        # apply ensemble method
+        fused_documents = self.ensemble_results(doc_lists, weights)
+        for doc in fused_documents:
+            doc.metadata["retriever_latency_ms"] = dict(latencies)
+            if missing:
+                doc.metadata["missing_retrievers"] = list(missing)
+        return fused_documents
 
     def rank_fusion(
         self,
@@ -295,28 +407,48 @@ class EnsembleRetriever(BaseRetriever):
         *,
         config: Optional[RunnableConfig] = None,
     ) -> List[Document]:
+        """
+        retriever들을 스레드 풀에서 동시에 실행해 결과를 결합합니다.
+        지연 시간은 retriever 지연 시간의 합이 아니라 최댓값(또는 timeout)이 됩니다.
+        풀은 호출마다 새로 만들므로(LangChain batch와 같은 방식) 동시에 들어온 검색끼리 스레드를 기다리지 않고,
+        timeout된 retriever는 이 호출의 스레드에서만 끝까지 실행됩니다.
+        """
         # Get the results of all retrievers.
-        retriever_docs = [
-            retriever.invoke(
-                query,
-                patch_config(
-                    config, callbacks=run_manager.get_child(tag=f"retriever_{i+1}")
-                ),
-            )
-            for i, retriever in enumerate(self.retrievers)
-        ]
-
-        # Enforce that retrieved docs are Documents for each list in retriever_docs
-        for i in range(len(retriever_docs)):
-            retriever_docs[i] = [
-                Document(page_content=cast(str, doc)) if isinstance(doc, str) else doc
-                for doc in retriever_docs[i]
+        executor = ContextThreadPoolExecutor(
+            max_workers=min(self.max_workers or len(self.retrievers), len(self.retrievers)),
+            thread_name_prefix="ensemble-retriever",
+        )
+        try:
+            futures = [
+                executor.submit(
+                    self._timed_invoke,
+                    retriever,
+                    query,
+                    patch_config(
+                        config, callbacks=run_manager.get_child(tag=f"retriever_{i+1}")
+                    ),
+                )
+                for i, retriever in enumerate(self.retrievers)
             ]
 
-        # apply ensemble method
-        fused_documents = self.ensemble_results(retriever_docs)
-
-        return fused_documents
+            # 모든 retriever가 동시에 시작하므로 전체 마감 시각 하나로 retriever별 timeout을 적용
+            deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+            results = []
+            for future in futures:
+                try:
+                    remaining = None if deadline is None else max(deadline - time.perf_counter(), 0)
+                    docs, latency_ms = future.result(timeout=remaining)
+                    results.append((docs, latency_ms, None))
+                except Exception as e:
+                    results.append((None, None, e))
+        finally:
+            # 실행 중인 retriever를 기다리지 않고 반환 (아직 시작하지 않은 retriever는 취소)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        fused_documents = self._fuse_available(results)
+        if self.reranker is None:
+            return fused_documents
+        return self.reranker.rerank(query, fused_documents, top_k=self.rerank_top_k)
 
     async def arank_fusion(
         self,
@@ -326,24 +458,28 @@ class EnsembleRetriever(BaseRetriever):
         config: Optional[RunnableConfig] = None,
     ) -> List[Document]:
         # Get the results of all retrievers.
-        retriever_docs = await asyncio.gather(
+        outcomes = await asyncio.gather(
             *[
-                retriever.ainvoke(
-                    query,
-                    patch_config(
-                        config, callbacks=run_manager.get_child(tag=f"retriever_{i+1}")
+                asyncio.wait_for(
+                    self._atimed_invoke(
+                        retriever,
+                        query,
+                        patch_config(
+                            config, callbacks=run_manager.get_child(tag=f"retriever_{i+1}")
+                        ),
                     ),
+                    timeout=self.timeout,
                 )
                 for i, retriever in enumerate(self.retrievers)
-            ]
+            ],
+            return_exceptions=True,
         )
 
-        # Enforce that retrieved docs are Documents for each list in retriever_docs
-        for i in range(len(retriever_docs)):
-            retriever_docs[i] = [
-                Document(page_content=doc) if not isinstance(doc, Document) else doc  # type: ignore[arg-type]
-                for doc in retriever_docs[i]
-            ]
-
-        # apply ensemble method
-        fused_documents = self.ensemble_results(retriever_docs)
+        fused_documents = self._fuse_available([
+            (None, None, outcome) if isinstance(outcome, BaseException) else (*outcome, None)
+            for outcome in outcomes
+        ])
+        if self.reranker is None:
+            return fused_documents
+        # cross-encoder forward는 CPU 연산이므로 이벤트 루프를 막지 않도록 스레드에서 실행
+        return await run_in_executor(config, self.reranker.rerank, query, fused_documents, self.rerank_top_k)
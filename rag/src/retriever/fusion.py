@@ -0,0 +1,179 @@
+from operator import itemgetter
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from retriever.bm25 import normalize_scores
+
+
+FUSION_METHODS = ("rrf", "cc", "dbsf")
+NORMALIZATIONS = ("max", "minmax", "zscore", "rank")
+# 전체 후보 수가 이 이하이면 fuse_keys(순수 Python)로 결합 (NumPy 호출 고정 비용이 결합 자체보다 큼)
+SMALL_FUSION_SIZE = 256
+
+
+def normalize_leg(scores: np.ndarray, normalization: str = "max") -> np.ndarray:
+    """
+    한 retriever 결과(순위 순)의 점수를 CC 결합용으로 정규화합니다.
+
+    Args:
+        scores: retriever가 반환한 순서대로의 점수
+        normalization: "max"(최댓값으로 나눔, 최댓값이 0이면 그대로), "minmax", "zscore",
+            "rank"(점수 대신 순위 사용, 1위 1.0에서 1/n씩 감소)
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores) == 0:
+        return scores
+
+    if normalization == "max":
+        max_score = scores.max()
+        return scores / max_score if max_score != 0 else scores
+    elif normalization == "rank":
+        return 1.0 - np.arange(len(scores), dtype=np.float64) / len(scores)
+    elif normalization in ("minmax", "zscore"):
+        return normalize_scores(scores, normalization)
+    else:
+        raise ValueError(f"Unsupported normalization: {normalization}")
+
+
+def distribution_normalize(scores: np.ndarray) -> np.ndarray:
+    """
+    Distribution-Based Score Fusion(DBSF) 정규화.
+    평균 ± 3σ 구간을 [0, 1]로 옮기고 구간 밖 점수는 잘라냅니다. (모두 같으면 0.5)
+    min/max 대신 분포를 쓰므로 후보 하나가 튀어도 나머지 점수가 눌리지 않습니다.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    if len(scores) == 0:
+        return scores
+
+    std = scores.std()
+    if std == 0:
+        return np.full_like(scores, 0.5)
+    low = scores.mean() - 3 * std
+    return np.clip((scores - low) / (6 * std), 0.0, 1.0)
+
+
+def fuse(
+    ids: Sequence[np.ndarray],
+    scores: Sequence[Optional[np.ndarray]],
+    weights: Sequence[float],
+    method: str = "rrf",
+    normalization: str = "max",
+    c: int = 60,
+    top_k: Optional[int] = None,
+    n_docs: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    여러 retriever의 (정수 문서 id, 점수) 결과를 하나의 순위로 결합합니다.
+
+    retriever별 기여도를 배열로 계산한 뒤 np.unique + np.bincount로 문서별로 합산하므로
+    문서 수만큼 dict/문서 객체를 다루지 않습니다. 입력 배열은 수정하지 않습니다.
+
+    Args:
+        ids: retriever별 문서 id 배열 (순위 순, 한 retriever 안에서는 중복 없음)
+        scores: retriever별 점수 배열 (rrf는 사용하지 않으므로 None 가능)
+        weights: retriever별 가중치
+        method: "rrf"(weight / (rank + c)), "cc"(정규화 점수의 가중합), "dbsf"(분포 기반 정규화 점수의 가중합)
+        normalization: method="cc"일 때 점수 정규화 방식 (normalize_leg 참고)
+        c: RRF 상수
+        top_k: 상위 top_k개만 반환 (None이면 전부)
+        n_docs: id가 0..n_docs-1을 빠짐없이 쓰면(ensure_doc_ids 결과) 지정. np.unique 없이 바로 합산
+    Returns:
+        (문서 id, 결합 점수) 배열. 점수 내림차순이며 동점이면 id 오름차순
+    """
+    if not len(ids) == len(scores) == len(weights):
+        raise ValueError("Number of rank lists must be equal to the number of weights.")
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unsupported fusion method: {method}")
+
+    contributions = []
+    for leg_ids, leg_scores, weight in zip(ids, scores, weights):
+        if method == "rrf":
+            contributions.append(weight / (np.arange(1, len(leg_ids) + 1, dtype=np.float64) + c))
+        elif method == "cc":
+            contributions.append(weight * normalize_leg(leg_scores, normalization))
+        else:
+            contributions.append(weight * distribution_normalize(leg_scores))
+
+    all_ids = np.concatenate([np.asarray(leg_ids, dtype=np.int64) for leg_ids in ids]) if ids else np.zeros(0, dtype=np.int64)
+    if len(all_ids) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+    if n_docs is None:
+        unique_ids, inverse = np.unique(all_ids, return_inverse=True)
+    else:
+        unique_ids, inverse = np.arange(n_docs, dtype=np.int64), all_ids
+    fused = np.bincount(inverse, weights=np.concatenate(contributions), minlength=len(unique_ids))
+
+    # 안정 정렬이므로 동점이면 id가 작은 문서가 앞 (ensure_doc_ids로 만든 id는 처음 나온 순서)
+    order = np.argsort(-fused, kind="stable")
+    if top_k is not None:
+        order = order[:top_k]
+    return unique_ids[order], fused[order]
+
+
+def ensure_doc_ids(keyed_lists: Sequence[Sequence[Hashable]]) -> Tuple[List[np.ndarray], int]:
+    """
+    retriever별 문서 키 목록을 처음 나온 순서대로 0부터 시작하는 정수 id 배열로 바꿉니다.
+    키마다 dict 조회 한 번이며, 이후 결합은 정수 배열로만 처리합니다.
+
+    Returns:
+        (retriever별 id 배열, 고유 문서 수)
+    """
+    positions: Dict[Hashable, int] = {}
+    ids = [
+        np.fromiter((positions.setdefault(key, len(positions)) for key in keys), dtype=np.int64, count=len(keys))
+        for keys in keyed_lists
+    ]
+    return ids, len(positions)
+
+
+def fuse_keys(
+    keyed_lists: Sequence[Sequence[Hashable]],
+    scores: Sequence[Optional[Sequence[float]]],
+    weights: Sequence[float],
+    method: str = "rrf",
+    normalization: str = "max",
+    c: int = 60,
+    top_k: Optional[int] = None,
+) -> List[Tuple[Hashable, float]]:
+    """
+    후보가 적을 때(SMALL_FUSION_SIZE 이하) 쓰는 fuse의 순수 Python 버전. 문서 키를 그대로 dict로 합산합니다.
+    합산 순서와 동점 처리(처음 나온 문서가 앞)가 ensure_doc_ids + fuse와 같아 결과가 같습니다.
+
+    Returns:
+        (문서 키, 결합 점수) 목록. 점수 내림차순
+    """
+    if not len(keyed_lists) == len(scores) == len(weights):
+        raise ValueError("Number of rank lists must be equal to the number of weights.")
+    if method not in FUSION_METHODS:
+        raise ValueError(f"Unsupported fusion method: {method}")
+
+    fused: Dict[Hashable, float] = {}
+    get = fused.get
+    for keys, leg_scores, weight in zip(keyed_lists, scores, weights):
+        if method == "rrf":
+            for rank, key in enumerate(keys, start=c + 1):
+                fused[key] = get(key, 0.0) + weight / rank
+            continue
+
+        if method == "cc" and normalization == "max":
+            max_score = max(leg_scores, default=0)
+            if max_score != 0:
+                for key, score in zip(keys, leg_scores):
+                    fused[key] = get(key, 0.0) + weight * (score / max_score)
+            else:
+                for key, score in zip(keys, leg_scores):
+                    fused[key] = get(key, 0.0) + weight * score
+            continue
+
+        if method == "cc":
+            normalized = normalize_leg(np.asarray(leg_scores, dtype=np.float64), normalization)
+        else:
+            normalized = distribution_normalize(leg_scores)
+        for key, score in zip(keys, normalized.tolist()):
+            fused[key] = get(key, 0.0) + weight * score
+
+    # sorted는 안정 정렬이므로 동점이면 처음 나온 문서가 앞
+    ranked = sorted(fused.items(), key=itemgetter(1), reverse=True)
+    return ranked if top_k is None else ranked[:top_k]
@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import os
+import json
+import math
+import time
+import uuid
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from retriever.ann import ann_params, build_index, compact_index, search_parameters, set_search_params, train_index
+from retriever.bm25 import BM25Index, BM25_FORMAT_VERSION
+from retriever.fusion import fuse
+from retriever.keyword import KoreanTokenizer, open_token_cache, parallel_tokenize
+from retriever.storage import DocumentColumns
+
+
+logger = logging.getLogger(__name__)
+
+HYBRID_FORMAT_VERSION = 1
+
+
+class HybridIndex:
+    """
+    BM25와 FAISS가 하나의 문서 id 체계를 공유하는 하이브리드 인덱스.
+
+    - store: 텍스트/메타데이터 열 저장소 (DocumentColumns)
+    - bm25: BM25Index (문서 위치 = id)
+    - index: FAISS 인덱스 (추가 순번 = id)
+
+    세 구조 모두 같은 순서로 문서를 추가하므로 위치 i가 곧 문서 id이며, 결합은 page_content가 아니라 정수 id로 합니다.
+    삭제는 BM25Index의 tombstone 하나로 표시하고 FAISS 검색에서는 IDSelector로 제외하며,
+    compact() 때 세 구조를 같은 순서로 함께 정리해 id를 다시 매깁니다.
+
+    Args:
+        store: 문서 저장소
+        bm25: BM25 인덱스
+        index: FAISS 인덱스 (학습된 상태)
+        embed_model: 질의/문서 임베딩 모델
+        tokenizer: 질의/문서 토큰화에 사용할 KoreanTokenizer
+        normalize_L2: 벡터를 L2 정규화한 뒤 추가/검색할지 여부
+        bm25_method: BM25 top-k 방식 ("exhaustive", "wand")
+        compaction_ratio: 추가/삭제 문서가 base 문서 수의 이 비율을 넘으면 자동으로 compact
+    """
+
+    def __init__(
+        self,
+        store: DocumentColumns,
+        bm25: BM25Index,
+        index: faiss.Index,
+        embed_model: Embeddings,
+        tokenizer: KoreanTokenizer,
+        normalize_L2: bool = False,
+        bm25_method: str = "exhaustive",
+        compaction_ratio: float = 0.1,
+    ):
+        if not len(store) == bm25.n_docs == index.ntotal:
+            raise ValueError(
+                f"Document store ({len(store)}), BM25 index ({bm25.n_docs}) and FAISS index ({index.ntotal}) sizes differ"
+            )
+
+        self.store = store
+        self.bm25 = bm25
+        self.index = index
+        self.embed_model = embed_model
+        self.tokenizer = tokenizer
+        self.normalize_L2 = normalize_L2
+        self.bm25_method = bm25_method
+        self.compaction_ratio = compaction_ratio
+        # dense 검색(질의 임베딩 + FAISS)을 BM25 검색과 동시에 실행
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="hybrid-dense")
+
+    @classmethod
+    def from_documents(
+        cls,
+        documents: Iterable[Document],
+        embed_model: Embeddings,
+        tokenizer_method: str = "kiwi",
+        index_type: str = "L2",
+        index_params: Optional[dict] = None,
+        bm25_params: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> HybridIndex:
+        """
+        문서를 한 번 토큰화/임베딩해 세 구조를 같은 순서로 만듭니다.
+
+        Args:
+            documents: Document 목록 (id가 없으면 uuid4를 부여)
+            embed_model: 임베딩 모델 (SemanticRetriever.load_embed_model 결과 등)
+            tokenizer_method: 토크나이저 방식 (기본값: "kiwi")
+            index_type: FAISS 인덱스 종류 (ann.build_index 참고)
+            index_params: config.yaml의 ann_params
+            bm25_params: BM25 파라미터 (variant, k1, b, epsilon, delta)
+            **kwargs: 추가 파라미터 (normalize_L2, bm25_method, compaction_ratio, max_workers,
+                tokenize_chunk_size, token_cache_path)
+        """
+        documents = [
+            d if d.id else Document(page_content=d.page_content, metadata=d.metadata, id=str(uuid.uuid4()))
+            for d in documents
+        ]
+        texts = [d.page_content for d in documents]
+
+        tokenizer = KoreanTokenizer(method=tokenizer_method)
+        token_cache = open_token_cache(tokenizer, kwargs['token_cache_path']) if kwargs.get('token_cache_path') else None
+        try:
+            tokens = parallel_tokenize(
+                texts,
+                tokenizer,
+                max_workers=kwargs.get('max_workers', 4),
+                chunk_size=kwargs.get('tokenize_chunk_size', 1000),
+                cache=token_cache,
+            )
+        finally:
+            if token_cache is not None:
+                token_cache.close()
+        bm25 = BM25Index.from_corpus(tokens, **(bm25_params or {}))
+
+        vectors = np.asarray(embed_model.embed_documents(texts), dtype=np.float32)
+        normalize_L2 = kwargs.get('normalize_L2', False)
+        if normalize_L2:
+            faiss.normalize_L2(vectors)
+        params = ann_params(index_params)
+        index = build_index(index_type, vectors.shape[1], params)
+        train_index(index, vectors, params['train_size'])
+        index.add(vectors)
+
+        logger.info(f"HybridIndex({index_type}) built with {len(documents)} documents")
+        return cls(
+            DocumentColumns.from_documents(documents),
+            bm25,
+            index,
+            embed_model,
+            tokenizer,
+            normalize_L2=normalize_L2,
+            bm25_method=kwargs.get('bm25_method', "exhaustive"),
+            compaction_ratio=kwargs.get('compaction_ratio', 0.1),
+        )
+
+    def __len__(self) -> int:
+        """삭제되지 않은 문서 수"""
+        return self.bm25.n_docs - self.bm25.n_deleted
+
+    def _keyword_search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self.bm25.get_top_k(self.tokenizer.tokenize(query), k, method=self.bm25_method)
+
+    def _dense_search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(문서 id, 유사도) 반환. L2 거리는 langchain FAISS와 같은 방식(1 - d / sqrt(2))으로 유사도로 바꿉니다."""
+        vector = np.asarray([self.embed_model.embed_query(query)], dtype=np.float32)
+        if self.normalize_L2:
+            faiss.normalize_L2(vector)
+
+        selector = None
+        if self.bm25.n_deleted:
+            selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(np.flatnonzero(self.bm25.deleted)))
+        distances, ids = self.index.search(vector, k, params=search_parameters(self.index, selector))
+
+        found = ids[0] >= 0
+        ids, distances = ids[0][found], distances[0][found]
+        if self.index.metric_type == faiss.METRIC_L2:
+            return ids, 1.0 - distances / math.sqrt(2)
+        return ids, distances
+
+    def search_ids(
+        self,
+        query: str,
+        k: int = 10,
+        weights: Optional[Sequence[float]] = None,
+        method: str = "rrf",
+        fetch_k: Optional[int] = None,
+        normalization: str = "max",
+        c: int = 60,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25와 dense 검색을 동시에 실행하고 정수 id로 결합해 (문서 id, 결합 점수)를 반환합니다.
+
+        Args:
+            query: 검색 질의
+            k: 반환할 문서 수
+            weights: (BM25, dense) 가중치 (기본값: 0.5, 0.5)
+            method: "rrf", "cc", "dbsf" (retriever.fusion.fuse 참고)
+            fetch_k: 각 검색에서 가져올 후보 수 (기본값: max(k * 4, 20))
+            normalization: method="cc"일 때 점수 정규화 방식
+            c: RRF 상수
+        """
+        weights = [0.5, 0.5] if weights is None else list(weights)
+        fetch_k = fetch_k or max(k * 4, 20)
+
+        start_time = time.perf_counter()
+        dense = self._executor.submit(self._dense_search, query, fetch_k)
+        keyword_ids, keyword_scores = self._keyword_search(query, fetch_k)
+        keyword_ms = (time.perf_counter() - start_time) * 1000
+        dense_ids, dense_scores = dense.result()
+        logger.debug(
+            f"Hybrid search: keyword {keyword_ms:.1f}ms, keyword+dense {(time.perf_counter() - start_time) * 1000:.1f}ms"
+        )
+
+        return fuse(
+            [keyword_ids, dense_ids],
+            [keyword_scores, dense_scores],
+            weights,
+            method=method,
+            normalization=normalization,
+            c=c,
+            top_k=k,
+        )
+
+    def search(
+        self,
+        query: str,
+        k: int = 10,
+        weights: Optional[Sequence[float]] = None,
+        method: str = "rrf",
+        **kwargs: Any,
+    ) -> List[Document]:
+        """
+        search_ids 결과를 Document로 반환합니다. 결합 점수는 metadata['score']에 담깁니다.
+        kwargs는 search_ids로 전달합니다. (fetch_k, normalization, c)
+        """
+        ids, scores = self.search_ids(query, k, weights, method, **kwargs)
+        return [
+            Document(page_content=self.store.text(i), metadata={**self.store.metadata(i), 'score': score}, id=self.store.doc_id(i))
+            for i, score in zip(ids.tolist(), scores.tolist())
+        ]
+
+    def add_documents(self, documents: Iterable[Document]) -> List[str]:
+        """
+        문서를 세 구조 끝에 같은 순서로 추가합니다. 이미 있는 id의 문서는 기존 문서를 삭제한 뒤 다시 추가합니다.
+
+        Returns:
+            추가된 문서 id 목록
+        """
+        documents = [
+            Document(page_content=d.page_content, metadata=d.metadata, id=d.id or str(uuid.uuid4()))
+            for d in documents
+        ]
+        if not documents:
+            return []
+
+        texts = [d.page_content for d in documents]
+        vectors = np.asarray(self.embed_model.embed_documents(texts), dtype=np.float32)
+        if self.normalize_L2:
+            faiss.normalize_L2(vectors)
+
+        existing = [self.store.position(d.id) for d in documents]
+        self.bm25.delete(p for p in existing if p is not None)
+        self.bm25.add(self.tokenizer.tokenize_batch(texts))
+        self.index.add(vectors)
+        self.store.extend(documents)
+        logger.info(f"HybridIndex added {len(documents)} documents")
+
+        self._maybe_compact()
+        return [d.id for d in documents]
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """
+        id에 해당하는 문서를 tombstone으로 표시합니다. (BM25와 FAISS 검색 모두에서 제외)
+
+        Returns:
+            삭제된 문서 수
+        """
+        positions = [p for p in (self.store.position(i) for i in ids) if p is not None]
+        n_deleted = self.bm25.delete(positions)
+        logger.info(f"HybridIndex deleted {n_deleted} documents")
+
+        self._maybe_compact()
+        return n_deleted
+
+    def compact(self) -> None:
+        """tombstone을 제거하고 세 구조의 id를 같은 순서(살아있는 문서의 기존 순서)로 다시 매깁니다."""
+        live = self.bm25.compact()
+        self.index = compact_index(self.index, live)
+        self.store = self.store.select(live)
+
+    def _maybe_compact(self) -> None:
+        if self.bm25.needs_compaction(self.compaction_ratio):
+            logger.info(
+                f"HybridIndex compaction triggered: {self.bm25.n_delta_docs} added docs, {self.bm25.n_deleted} tombstones"
+            )
+            self.compact()
+
+    def save(self, directory: str) -> None:
+        """
+        `{directory}/bm25`(BM25Index), `index.faiss`, 문서 열 파일, hybrid.json 순서로 저장합니다.
+        hybrid.json을 마지막에 기록하므로 파일이 있으면 저장이 끝난 인덱스입니다.
+        """
+        if self.bm25.has_pending_changes:
+            self.compact()
+
+        os.makedirs(directory, exist_ok=True)
+        self.bm25.save(os.path.join(directory, "bm25"))
+        faiss.write_index(self.index, os.path.join(directory, "index.faiss"))
+        self.store.write(directory)
+
+        save_dict = {
+            'format_version': HYBRID_FORMAT_VERSION,
+            'bm25_format_version': BM25_FORMAT_VERSION,
+            'n_docs': len(self.store),
+            'tokenizer_method': self.tokenizer.method,
+            'normalize_L2': self.normalize_L2,
+            'bm25_method': self.bm25_method,
+            'compaction_ratio': self.compaction_ratio,
+        }
+        with open(os.path.join(directory, "hybrid.json"), 'w', encoding='utf-8') as f:
+            json.dump(save_dict, f, indent=4)
+
+        logger.info(f"HybridIndex saved to {directory}")
+
+    @classmethod
+    def load(
+        cls,
+        directory: str,
+        embed_model: Embeddings,
+        mmap: bool = True,
+        index_params: Optional[dict] = None,
+    ) -> HybridIndex:
+        """
+        save()로 저장한 디렉토리에서 HybridIndex를 로드합니다.
+        mmap=True이면 BM25 posting과 문서 열을 메모리 매핑으로 엽니다. (FAISS 인덱스는 메모리로 읽음)
+        """
+        config_path = os.path.join(directory, "hybrid.json")
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(f"File not found: {config_path}")
+
+        with open(config_path, 'r', encoding='utf-8') as f:
+            save_dict = json.load(f)
+        if save_dict.get('format_version') != HYBRID_FORMAT_VERSION:
+            raise ValueError(f"Unsupported hybrid index format version: {save_dict.get('format_version')}")
+
+        index = faiss.read_index(os.path.join(directory, "index.faiss"))
+        set_search_params(index, index_params)
+
+        instance = cls(
+            DocumentColumns.load(directory, mmap=mmap),
+            BM25Index.load(os.path.join(directory, "bm25"), mmap=mmap),
+            index,
+            embed_model,
+            KoreanTokenizer(method=save_dict['tokenizer_method']),
+            normalize_L2=save_dict.get('normalize_L2', False),
+            bm25_method=save_dict.get('bm25_method', "exhaustive"),
+            compaction_ratio=save_dict.get('compaction_ratio', 0.1),
+        )
+
+        logger.info(f"HybridIndex loaded from {directory}")
+        return instance
@@ -1,36 +1,127 @@
 from __future__ import annotations
 
 import os
+import json
 import time
-import pickle
+import uuid
+import shutil
 import logging
-import numpy as np
+import multiprocessing
+import importlib.metadata
 
 from pathlib import Path
-from pydantic import Field
-from rank_bm25 import BM25Okapi
-from typing import Any, Callable, Dict, Iterable, List, Optional
+from pydantic import Field, SkipValidation
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 from langchain_core.documents import Document
 from langchain_core.retrievers import BaseRetriever
 from langchain_core.callbacks import CallbackManagerForRetrieverRun
 
+from retriever.bm25 import BM25Index, BM25_FORMAT_VERSION, normalize_scores
+from retriever.storage import DocumentBlob, DocumentSegments
+from retriever.token_cache import TokenCache
+
 from kiwipiepy import Kiwi
 from konlpy.tag import Okt, Mecab, Kkma
 
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
 
 
 logger = logging.getLogger(__name__)
 
-
-def parallel_tokenize(texts: List[str], tokenizer: KoreanTokenizer, max_workers: int = 4) -> List[List[str]]:
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        return list(executor.map(tokenizer.tokenize, texts))
+# 프로세스 풀 worker마다 한 번만 생성하는 토크나이저
+_worker_tokenizer: Optional[KoreanTokenizer] = None
+
+
+def _init_tokenize_worker(method: str) -> None:
+    global _worker_tokenizer
+    _worker_tokenizer = KoreanTokenizer(method=method)
+
+
+def _tokenize_chunk(texts: List[str]) -> List[List[str]]:
+    return _worker_tokenizer.tokenize_batch(texts)
+
+
+def create_tokenize_pool(tokenizer: KoreanTokenizer, max_workers: int = 4) -> Optional[ProcessPoolExecutor]:
+    """
+    worker마다 KoreanTokenizer를 한 번만 생성하는 토큰화용 프로세스 풀을 만듭니다.
+    JVM(Okt, Kkma)을 fork하지 않도록 spawn 방식으로 생성하며, CPU 코어 수로 제한한 worker 수가 1 이하이면 None을 반환합니다.
+    """
+    n_workers = min(max_workers, os.cpu_count() or 1)
+    if n_workers <= 1:
+        return None
+    return ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_tokenize_worker,
+        initargs=(tokenizer.method,),
+    )
+
+
+def open_token_cache(tokenizer: KoreanTokenizer, path: str, max_bytes: int = 1 << 30) -> TokenCache:
+    """토크나이저 방식과 버전을 키에 포함하는 토큰 캐시를 엽니다."""
+    return TokenCache(path, namespace=f"{tokenizer.method}:{tokenizer.version}", max_bytes=max_bytes)
+
+
+def parallel_tokenize(
+    texts: Iterable[str],
+    tokenizer: KoreanTokenizer,
+    max_workers: int = 4,
+    chunk_size: int = 1000,
+    cache: Optional[TokenCache] = None,
+    pool: Optional[ProcessPoolExecutor] = None,
+) -> List[List[str]]:
+    """
+    텍스트를 chunk_size 단위로 나누어 프로세스 풀에서 토큰화합니다. 결과는 입력 순서를 유지합니다.
+    cache가 주어지면 캐시에 없는 텍스트만 토큰화하고 그 결과를 캐시에 저장합니다.
+    pool이 주어지면 (create_tokenize_pool) 호출마다 worker를 새로 띄우지 않고 해당 풀을 재사용합니다.
+
+    Kiwi의 호출 오버헤드와 Okt/Kkma의 JVM 브리지는 GIL(또는 하나의 JVM)에 묶여 스레드로는 거의 빨라지지 않으므로
+    worker 프로세스마다 KoreanTokenizer를 한 번만 생성해 chunk 단위로 tokenize_batch를 호출합니다.
+    JVM을 fork하지 않도록 worker는 spawn 방식으로 생성하며, worker 수는 CPU 코어 수를 넘지 않고
+    worker가 하나뿐이면(max_workers <= 1, chunk 1개, 단일 코어) 현재 프로세스에서 처리합니다.
+    """
+    texts = list(texts)
+    if cache is not None:
+        tokenized = cache.get_many(texts)
+        misses = [i for i, tokens in enumerate(tokenized) if tokens is None]
+        logger.info(f"Token cache: {len(texts) - len(misses)} hits, {len(misses)} misses ({cache.path})")
+        if misses:
+            miss_texts = [texts[i] for i in misses]
+            miss_tokenized = parallel_tokenize(miss_texts, tokenizer, max_workers=max_workers, chunk_size=chunk_size, pool=pool)
+            cache.put_many(miss_texts, miss_tokenized)
+            for i, tokens in zip(misses, miss_tokenized):
+                tokenized[i] = tokens
+        return tokenized
+
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+    start_time = time.time()
+    owns_pool = False
+    if pool is None and min(max_workers, len(chunks)) > 1:
+        pool = create_tokenize_pool(tokenizer, min(max_workers, len(chunks)))
+        owns_pool = pool is not None
+
+    if pool is None:
+        tokenized = tokenizer.tokenize_batch(texts)
+    else:
+        try:
+            tokenized = [tokens for chunk in pool.map(_tokenize_chunk, chunks) for tokens in chunk]
+        finally:
+            if owns_pool:
+                pool.shutdown()
+    elapsed_time = time.time() - start_time
+
+    logger.info(
+        f"Tokenizing completed in {elapsed_time:.2f} seconds "
+        f"({len(texts) / max(elapsed_time, 1e-9):.1f} docs/sec, {'process pool' if pool else 'in-process'}, chunk_size={chunk_size})"
+    )
+    return tokenized
 
 
 class KoreanTokenizer:
     def __init__(self, method: str = "kiwi"):
+        self.method = method
         if method == "kiwi":
             self.tokenizer = Kiwi()
             self.tokenize = self.kiwi_tokenize
@@ -46,6 +137,21 @@ class KoreanTokenizer:
         else:
             raise ValueError(f"Unsupported tokenizer method: {method}")
 
+    @property
+    def version(self) -> str:
+        """형태소 분석기 패키지 버전 (토큰 캐시 키에 사용)"""
+        package = "kiwipiepy" if self.method == "kiwi" else "konlpy"
+        try:
+            return importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            return "unknown"
+
+    def tokenize_batch(self, texts: Iterable[str]) -> List[List[str]]:
+        """여러 텍스트를 순서대로 토큰화합니다. Kiwi는 여러 텍스트를 한 번에 처리하는 배치 API를 사용합니다."""
+        if self.method == "kiwi":
+            return [[token.form for token in tokens] for tokens in self.tokenizer.tokenize(texts)]
+        return [self.tokenize(text) for text in texts]
+
     def kiwi_tokenize(self, text: str) -> List[str]:
         return [token.form for token in self.tokenizer.tokenize(text)]
 
@@ -61,8 +167,13 @@ class KoreanTokenizer:
 
 class BM25Retriever(BaseRetriever):
     vectorizer: Any
-    docs: List[Document] = Field(repr=False)
+    # 메모리의 List[Document] 또는 mmap된 DocumentBlob
+    docs: SkipValidation[Sequence[Document]] = Field(repr=False)
     k: int = 4
+    method: str = "exhaustive"  ## "exhaustive", "wand"
+    # delta 문서 + tombstone이 base 문서 수의 이 비율을 넘으면 자동으로 compact
+    compaction_ratio: float = 0.1
+    score_normalizer: str = "softmax"  ## "minmax", "zscore", "softmax"
     preprocess_func: Callable[[str], List[str]]
 
     @classmethod
@@ -74,6 +185,7 @@ class BM25Retriever(BaseRetriever):
         tokenizer_method: str = "kiwi",
         save_path: Optional[str] = None,
         load_path: Optional[str] = None,
+        ids: Optional[Iterable[Optional[str]]] = None,
         **kwargs: Any,
     ) -> BM25Retriever:
         """
@@ -82,43 +194,96 @@ class BM25Retriever(BaseRetriever):
         Args:
             texts: 텍스트 목록
             metadatas: 메타데이터 목록 (옵션)
-            bm25_params: BM25 파라미터 (옵션)
+            bm25_params: BM25 파라미터 (옵션). variant("okapi", "bm25l", "bm25plus"), k1, b, epsilon, delta
             tokenizer_method: 토크나이저 방식 (기본값: "kiwi")
-            save_path: 저장할 파일 경로 (옵션)
-            load_path: 로드할 파일 경로 (옵션)
-            **kwargs: 추가 파라미터
+            save_path: 저장할 디렉토리 경로 (옵션)
+            load_path: 로드할 디렉토리 경로 (옵션)
+            ids: 문서 id 목록 (옵션). 없으면 uuid4를 부여하며 add_documents/delete에서 사용합니다.
+            **kwargs: 추가 파라미터 (k, method, compaction_ratio, score_normalizer, max_workers, tokenize_chunk_size,
+                token_cache_path, token_cache_max_bytes, mmap)
         """
         # load_path가 제공되면 저장된 모델을 로드
         if load_path:
-            load_path = f"{load_path}/{tokenizer_method}.pkl"
+            load_path = f"{load_path}/{tokenizer_method}"
             logger.info(f"Loading BM25Retriever from {load_path}")
-            return cls.load(load_path)
+            return cls.load(load_path, mmap=kwargs.get('mmap', True))
 
         # 새로운 모델 생성
         tokenizer = KoreanTokenizer(method=tokenizer_method)
         logger.info(f"tokenizer: {tokenizer_method}")
+
+        # 토큰 캐시: 변경되지 않은 문서는 형태소 분석을 건너뜀
+        token_cache = None
+        if kwargs.get('token_cache_path'):
+            token_cache = open_token_cache(tokenizer, kwargs['token_cache_path'], kwargs.get('token_cache_max_bytes', 1 << 30))
         
-        start_time = time.time()
-        # 병렬 처리로 토크나이징
-        texts_processed = parallel_tokenize(texts, tokenizer, max_workers=kwargs.get('max_workers', 4))
-        elapsed_time = time.time() - start_time
-        logger.info(f"Tokenizing completed in {elapsed_time:.2f} seconds")
+        # 프로세스 풀로 병렬 토크나이징
+        texts_processed = parallel_tokenize(
+            texts,
+            tokenizer,
+            max_workers=kwargs.get('max_workers', 4),
+            chunk_size=kwargs.get('tokenize_chunk_size', 1000),
+            cache=token_cache,
+        )
+        if token_cache is not None:
+            token_cache.close()
 
-        bm25_params = bm25_params or {}
-        vectorizer = BM25Okapi(texts_processed, **bm25_params)
         metadatas = metadatas or ({} for _ in texts)
-        docs = [Document(page_content=t, metadata=m) for t, m in zip(texts, metadatas)]
-        
+        ids = ids or (None for _ in texts)
+        docs = [
+            Document(page_content=t, metadata=m, id=i or str(uuid.uuid4()))
+            for t, m, i in zip(texts, metadatas, ids)
+        ]
+        return cls.from_tokenized(
+            texts_processed,
+            docs,
+            tokenizer,
+            bm25_params=bm25_params,
+            save_path=save_path,
+            **kwargs,
+        )
+
+    @classmethod
+    def from_tokenized(
+        cls,
+        texts_processed: Sequence[Sequence[str]],
+        documents: Sequence[Document],
+        tokenizer: KoreanTokenizer,
+        bm25_params: Optional[Dict[str, Any]] = None,
+        save_path: Optional[str] = None,
+        **kwargs: Any,
+    ) -> BM25Retriever:
+        """
+        이미 토큰화된 문서로부터 BM25Retriever를 생성합니다. (인덱스 빌드 파이프라인에서 사용)
+
+        Args:
+            texts_processed: documents와 같은 순서의 문서별 토큰 목록
+            documents: Document 목록 (id가 없으면 uuid4를 부여)
+            tokenizer: 질의 토큰화에 사용할 KoreanTokenizer
+            bm25_params: BM25 파라미터 (옵션)
+            save_path: 저장할 디렉토리 경로 (옵션)
+            **kwargs: 추가 파라미터 (k, method, compaction_ratio, score_normalizer)
+        """
+        bm25_params = bm25_params or {}
+        vectorizer = BM25Index.from_corpus(texts_processed, **bm25_params)
+        docs = [
+            d if d.id else Document(page_content=d.page_content, metadata=d.metadata, id=str(uuid.uuid4()))
+            for d in documents
+        ]
+
         instance = cls(
             vectorizer=vectorizer,
-            docs=docs,
+            docs=DocumentSegments(docs),
             k=kwargs.get('k', 4),
+            method=kwargs.get('method', "exhaustive"),
+            compaction_ratio=kwargs.get('compaction_ratio', 0.1),
+            score_normalizer=kwargs.get('score_normalizer', "softmax"),
             preprocess_func=tokenizer.tokenize
         )
 
         # save_path가 제공되면 모델 저장
         if save_path:
-            save_path = f"{save_path}/{tokenizer_method}.pkl"
+            save_path = f"{save_path}/{tokenizer.method}"
             instance.save(save_path)
             logger.info(f"Saved BM25Retriever to {save_path}")
 
@@ -142,15 +307,16 @@ class BM25Retriever(BaseRetriever):
             documents: Document 객체 목록
             bm25_params: BM25 파라미터 (옵션)
             tokenizer_method: 토크나이저 방식 (기본값: "kiwi")
-            save_path: 저장할 파일 경로 (옵션)
-            load_path: 로드할 파일 경로 (옵션)
+            save_path: 저장할 디렉토리 경로 (옵션)
+            load_path: 로드할 디렉토리 경로 (옵션)
             **kwargs: 추가 파라미터
         """
-        texts, metadatas = zip(*((d.page_content, d.metadata) for d in documents))
+        texts, metadatas, ids = zip(*((d.page_content, d.metadata, d.id) for d in documents))
         return cls.from_texts(
             texts=texts,
             bm25_params=bm25_params,
             metadatas=metadatas,
+            ids=ids,
             tokenizer_method=tokenizer_method,
             save_path=save_path,
             load_path=load_path,
@@ -161,43 +327,117 @@ class BM25Retriever(BaseRetriever):
         self, query: str, *, run_manager: CallbackManagerForRetrieverRun
     ) -> List[Document]:
         processed_query = self.preprocess_func(query)
-        return_docs = self.vectorizer.get_top_n(processed_query, self.docs, n=self.k)
-        return return_docs
+        doc_ids, _ = self.vectorizer.get_top_k(processed_query, self.k, method=self.method)
+        return [self.docs[i] for i in doc_ids]
 
-    @staticmethod
-    def softmax(x):
-        """Compute softmax values for each sets of scores in x."""
-        e_x = np.exp(x - np.max(x))
-        return e_x / e_x.sum(axis=0)
+    def _tokenize_batch(self, texts: List[str]) -> List[List[str]]:
+        tokenizer = getattr(self.preprocess_func, '__self__', None)
+        if isinstance(tokenizer, KoreanTokenizer):
+            return tokenizer.tokenize_batch(texts)
+        return [self.preprocess_func(text) for text in texts]
 
-    @staticmethod
-    def argsort(seq, reverse):
-        # http://stackoverflow.com/questions/3071415/efficient-method-to-calculate-the-rank-vector-of-a-list-in-python
-        return sorted(range(len(seq)), key=seq.__getitem__, reverse=reverse)
+    def batch_search(self, queries: Sequence[str], k: Optional[int] = None) -> List[List[Tuple[Document, float]]]:
+        """
+        여러 질의를 한 번에 검색해 질의별 (Document, BM25 점수) 목록을 반환합니다.
+        질의를 배치로 토큰화한 뒤 (Q x V) sparse 질의 행렬과 term-document 행렬의 곱으로 점수를 계산합니다.
+        """
+        k = k or self.k
+        results = self.vectorizer.get_top_k_batch(self._tokenize_batch(list(queries)), k)
+        return [
+            [(self.docs[i], float(score)) for i, score in zip(doc_ids, scores)]
+            for doc_ids, scores in results
+        ]
+
+    def add_documents(self, documents: Iterable[Document]) -> List[str]:
+        """
+        문서를 delta segment에 추가합니다. 새 문서만 토큰화하며 기존 인덱스는 다시 만들지 않습니다.
+        이미 있는 id의 문서는 기존 문서를 삭제한 뒤 다시 추가합니다.
+
+        Returns:
+            추가된 문서 id 목록
+        """
+        documents = [
+            Document(page_content=d.page_content, metadata=d.metadata, id=d.id or str(uuid.uuid4()))
+            for d in documents
+        ]
+        if not documents:
+            return []
+
+        existing = [self.docs.position(d.id) for d in documents]
+        self.vectorizer.delete(p for p in existing if p is not None)
+        self.vectorizer.add(self._tokenize_batch([d.page_content for d in documents]))
+        self.docs.extend(documents)
+        logger.info(f"BM25Retriever added {len(documents)} documents")
+
+        self._maybe_compact()
+        return [d.id for d in documents]
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """
+        id에 해당하는 문서를 tombstone으로 표시합니다. 실제 제거는 compact() 때 이루어집니다.
+
+        Returns:
+            삭제된 문서 수
+        """
+        positions = [p for p in (self.docs.position(i) for i in ids) if p is not None]
+        n_deleted = self.vectorizer.delete(positions)
+        logger.info(f"BM25Retriever deleted {n_deleted} documents")
+
+        self._maybe_compact()
+        return n_deleted
+
+    def compact(self) -> None:
+        """delta segment와 tombstone을 base segment로 병합하고 문서 목록을 같은 순서로 재배치합니다."""
+        live = self.vectorizer.compact()
+        self.docs = DocumentSegments([self.docs[i] for i in live])
+
+    def _maybe_compact(self) -> None:
+        if self.vectorizer.needs_compaction(self.compaction_ratio):
+            logger.info(
+                f"BM25Retriever compaction triggered: {self.vectorizer.n_delta_docs} delta docs, "
+                f"{self.vectorizer.n_deleted} tombstones"
+            )
+            self.compact()
 
     # BM25Retriever에서 점수 계산 후 메타데이터에 추가
-    def search_with_score(self, query: str, top_k=None, score_threshold=None):
-        normalized_score = BM25Retriever.softmax(self.vectorizer.get_scores(self.preprocess_func(query)))
+    def search_with_score(
+        self,
+        query: str,
+        top_k: Optional[int] = None,
+        score_threshold: Optional[float] = None,
+        normalizer: Optional[str] = None,
+    ) -> List[Tuple[str, dict, float]]:
+        """
+        상위 top_k개 후보를 np.argpartition으로 고른 뒤 후보 점수만 정규화해 (page_content, metadata, score)로 반환합니다.
+        metadata는 score가 추가된 복사본이며 self.docs의 문서는 변경하지 않습니다.
 
+        Args:
+            query: 검색 질의
+            top_k: 후보 수 (기본값: self.k)
+            score_threshold: 정규화 점수 하한 (기본값: 0.5)
+            normalizer: "minmax", "zscore", "softmax" (기본값: self.score_normalizer)
+        """
         if top_k is None:
             top_k = self.k
 
         if score_threshold is None:
             score_threshold = 0.5
 
-        score_indexes = BM25Retriever.argsort(normalized_score, True)
+        doc_ids, scores = self.vectorizer.get_top_k(self.preprocess_func(query), top_k, method=self.method)
+        normalized_scores = normalize_scores(scores, normalizer or self.score_normalizer)
 
-        docs_with_scores = []   
-        for i in score_indexes[:top_k]:
-            doc = self.docs[i]
-            score = normalized_score[i]
+        docs_with_scores = []
+        for i, score in zip(doc_ids, normalized_scores):
             if score >= score_threshold:
-                doc.metadata['score'] = score  # 점수를 메타데이터에 추가
-                docs_with_scores.append((doc.page_content, doc.metadata, score))
+                doc = self.docs[i]
+                docs_with_scores.append((doc.page_content, {**doc.metadata, 'score': float(score)}, float(score)))
 
         return docs_with_scores
     
-    def save(self, file_path: str) -> None:
+    def save(self, directory: str) -> None:
+        """
+        pickle 없이 디렉토리 단위로 저장합니다. (BM25Index 배열 + 문서 blob + retriever.json)
+        """
         # tokenizer 메서드 이름 추출
         tokenizer_method = None
         if hasattr(self.preprocess_func, '__self__'):
@@ -216,35 +456,78 @@ class BM25Retriever(BaseRetriever):
         if tokenizer_method is None:
             raise ValueError("Could not determine tokenizer method")
 
+        # 전체 저장 시에는 delta segment와 tombstone을 먼저 병합
+        if self.vectorizer.has_pending_changes:
+            self.compact()
+
+        os.makedirs(directory, exist_ok=True)
+        self.vectorizer.save(directory)
+        DocumentBlob.write(self.docs, directory)
+
+        # retriever.json을 마지막에 기록 -> 파일이 있으면 저장이 끝난 인덱스
         save_dict = {
-            'vectorizer': self.vectorizer,
-            'docs': self.docs,
+            'format_version': BM25_FORMAT_VERSION,
             'k': self.k,
+            'method': self.method,
+            'compaction_ratio': self.compaction_ratio,
+            'score_normalizer': self.score_normalizer,
             'tokenizer_method': tokenizer_method  # tokenizer 대신 메서드 이름만 저장
         }
+        with open(os.path.join(directory, "retriever.json"), 'w', encoding='utf-8') as f:
+            json.dump(save_dict, f, indent=4)
         
-        with open(file_path, 'wb') as f:
-            pickle.dump(save_dict, f)
-        
-        logger.info(f"BM25Retriever saved to {file_path}")
+        logger.info(f"BM25Retriever saved to {directory}")
+
+    def save_delta(self, directory: str) -> None:
+        """
+        save()로 저장한 디렉토리에 delta segment(추가된 문서)와 tombstone만 `{directory}/delta`로 저장합니다.
+        base 인덱스와 문서 blob은 다시 쓰지 않으며, load() 시 자동으로 적용됩니다.
+        저장 이후 compact된 경우(base segment가 바뀐 경우)에는 save()로 전체를 다시 저장합니다.
+        """
+        if not self.vectorizer.is_saved_base(directory):
+            logger.info(f"Base segment changed since last save. Saving full BM25Retriever to {directory}")
+            self.save(directory)
+            return
+
+        delta_dir = os.path.join(directory, "delta")
+        # 이전 delta를 지우고 문서 blob -> BM25 delta(meta.json 마지막) 순서로 기록
+        shutil.rmtree(delta_dir, ignore_errors=True)
+        os.makedirs(delta_dir, exist_ok=True)
+        DocumentBlob.write(self.docs.delta, delta_dir)
+        self.vectorizer.save_delta(directory)
+
+        logger.info(f"BM25Retriever delta saved to {delta_dir}")
 
     @classmethod
-    def load(cls, file_path: str) -> 'BM25Retriever':
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(f"File not found: {file_path}")
+    def load(cls, directory: str, mmap: bool = True) -> 'BM25Retriever':
+        """
+        save()로 저장한 디렉토리에서 BM25Retriever를 로드합니다. save_delta()로 저장한 delta segment가 있으면 함께 적용합니다.
+        mmap=True이면 posting, 어휘 사전, 문서 blob을 메모리 매핑으로 열어 worker 간에 page cache를 공유합니다.
+        """
+        config_path = os.path.join(directory, "retriever.json")
+        if not os.path.exists(config_path):
+            raise FileNotFoundError(f"File not found: {config_path}")
 
-        with open(file_path, 'rb') as f:
-            save_dict = pickle.load(f)
+        with open(config_path, 'r', encoding='utf-8') as f:
+            save_dict = json.load(f)
         
         # 토크나이저 재생성
         tokenizer = KoreanTokenizer(method=save_dict['tokenizer_method'])
         
+        vectorizer = BM25Index.load(directory, mmap=mmap)
+        docs = DocumentSegments(DocumentBlob.load(directory, mmap=mmap))
+        if vectorizer.n_delta_docs:
+            docs.extend(DocumentBlob.load(os.path.join(directory, "delta"), mmap=False))
+
         instance = cls(
-            vectorizer=save_dict['vectorizer'],
-            docs=save_dict['docs'],
+            vectorizer=vectorizer,
+            docs=docs,
             k=save_dict['k'],
+            method=save_dict.get('method', "exhaustive"),
+            compaction_ratio=save_dict.get('compaction_ratio', 0.1),
+            score_normalizer=save_dict.get('score_normalizer', "softmax"),
             preprocess_func=tokenizer.tokenize
         )
         
-        logger.info(f"BM25Retriever loaded from {file_path}")
-        return instance
\ No newline at end of file
+        logger.info(f"BM25Retriever loaded from {directory}")
+        return instance
@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import os
+import math
+import time
+import queue
+import logging
+import threading
+
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from data.dataset import iter_documents
+from retriever.keyword import BM25Retriever, KoreanTokenizer, create_tokenize_pool, open_token_cache, parallel_tokenize
+from retriever.semantic import SemanticRetriever
+
+
+logger = logging.getLogger(__name__)
+
+# 각 단계가 끝났음을 다음 단계에 알리는 표식
+_DONE = object()
+
+
+class PipelineStopped(Exception):
+    """다른 단계에서 오류가 발생해 파이프라인이 중단됨"""
+
+
+@dataclass
+class StageMetrics:
+    """단계별 처리량과 입력 큐 깊이"""
+    name: str
+    batches: int = 0
+    docs: int = 0
+    busy_time: float = 0.0
+    queue_depth_max: int = 0
+    queue_depth_sum: int = 0
+    queue_depth_samples: int = 0
+
+    def record(self, n_docs: int, elapsed: float) -> None:
+        self.batches += 1
+        self.docs += n_docs
+        self.busy_time += elapsed
+
+    def sample_queue(self, depth: int) -> None:
+        self.queue_depth_max = max(self.queue_depth_max, depth)
+        self.queue_depth_sum += depth
+        self.queue_depth_samples += 1
+
+    @property
+    def docs_per_sec(self) -> float:
+        return self.docs / self.busy_time if self.busy_time > 0 else 0.0
+
+    @property
+    def queue_depth_mean(self) -> float:
+        return self.queue_depth_sum / self.queue_depth_samples if self.queue_depth_samples else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"[{self.name}] {self.docs} docs / {self.batches} batches, busy {self.busy_time:.2f}s "
+            f"({self.docs_per_sec:.1f} docs/sec), input queue depth mean {self.queue_depth_mean:.1f} / max {self.queue_depth_max}"
+        )
+
+
+@dataclass
+class _Batch:
+    batch_id: int
+    documents: List[Document]
+    payload: Any = None
+
+
+class IndexBuildPipeline:
+    """
+    DB 조회 -> 청크 -> {토큰화, 임베딩} -> 저장 단계를 bounded queue로 연결한 인덱스 빌드 파이프라인.
+
+    단계마다 스레드 하나가 동작하며 CPU 위주의 토큰화(프로세스 풀)와 I/O 위주의 임베딩 호출이 동시에 진행되므로,
+    전체 빌드 시간은 단계별 시간의 합이 아니라 가장 느린 단계에 가까워집니다.
+    큐 크기(queue_size)가 단계 간 배치 수를 제한하므로 메모리 사용량은 테이블 크기와 무관하게 일정합니다.
+
+    Args:
+        cfg: config.yaml 설정
+        db_info: DB 접속 정보
+        openai_api_key: OpenAI 임베딩 사용 시 API 키
+        chunk_size: 토큰화/임베딩 단계에 넘길 배치의 문서 수
+        queue_size: 단계 사이 큐에 쌓일 수 있는 최대 배치 수
+        log_interval: 큐 깊이/진행 상황 로그 주기(초)
+    """
+
+    def __init__(self, cfg, db_info, openai_api_key=None, chunk_size=256, queue_size=8, log_interval=10.0):
+        self.cfg = cfg
+        self.db_info = db_info
+        self.openai_api_key = openai_api_key
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.log_interval = log_interval
+        self.metrics: Dict[str, StageMetrics] = {}
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def _put(self, q: queue.Queue, item: Any) -> None:
+        # 하위 단계가 실패했을 때 상위 단계가 가득 찬 큐에서 영원히 막히지 않도록 timeout으로 확인
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise PipelineStopped()
+
+    def _get(self, q: queue.Queue, metrics: StageMetrics) -> Any:
+        metrics.sample_queue(q.qsize())
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise PipelineStopped()
+
+    def _run_stage(self, name: str, target: Callable[[], None]) -> threading.Thread:
+        def run():
+            try:
+                target()
+            except PipelineStopped:
+                pass
+            except BaseException as e:
+                logger.error(f"Index build stage '{name}' failed: {e}")
+                self._errors.append(e)
+                self._stop.set()
+
+        thread = threading.Thread(target=run, name=f"index-build-{name}", daemon=True)
+        thread.start()
+        return thread
+
+    def _fetch(self, documents: Iterable[List[Document]], out_q: queue.Queue) -> None:
+        metrics = self.metrics["fetch"]
+        batches = iter(documents)
+        while True:
+            start_time = time.time()
+            batch = next(batches, None)
+            if batch is None:
+                break
+            metrics.record(len(batch), time.time() - start_time)
+            self._put(out_q, batch)
+        self._put(out_q, _DONE)
+
+    def _chunk(self, in_q: queue.Queue, out_qs: List[queue.Queue]) -> None:
+        # DB 조회 배치를 토큰화/임베딩 배치 크기로 다시 묶고 두 단계에 같은 배치를 전달 (fan-out)
+        metrics = self.metrics["chunk"]
+        pending: List[Document] = []
+        batch_id = 0
+
+        def emit(documents: List[Document]) -> None:
+            nonlocal batch_id
+            for out_q in out_qs:
+                self._put(out_q, _Batch(batch_id, documents))
+            batch_id += 1
+
+        while True:
+            item = self._get(in_q, metrics)
+            if item is _DONE:
+                break
+            start_time = time.time()
+            pending.extend(item)
+            ready = []
+            while len(pending) >= self.chunk_size:
+                ready.append(pending[:self.chunk_size])
+                pending = pending[self.chunk_size:]
+            metrics.record(len(item), time.time() - start_time)
+            for documents in ready:
+                emit(documents)
+
+        if pending:
+            emit(pending)
+        for out_q in out_qs:
+            self._put(out_q, _DONE)
+
+    def _tokenize(self, in_q: queue.Queue, out_q: queue.Queue, tokenizer: KoreanTokenizer) -> None:
+        metrics = self.metrics["tokenize"]
+        token_cache = None
+        if self.cfg.get('token_cache_path'):
+            token_cache = open_token_cache(tokenizer, self.cfg['token_cache_path'])
+        n_workers = self.cfg.get('max_workers', os.cpu_count() or 1)
+        pool = create_tokenize_pool(tokenizer, n_workers)
+        try:
+            while True:
+                item = self._get(in_q, metrics)
+                if item is _DONE:
+                    break
+                start_time = time.time()
+                item.payload = parallel_tokenize(
+                    [doc.page_content for doc in item.documents],
+                    tokenizer,
+                    chunk_size=max(1, math.ceil(len(item.documents) / n_workers)),  # 배치를 worker 수만큼 분할
+                    cache=token_cache,
+                    pool=pool,
+                )
+                metrics.record(len(item.documents), time.time() - start_time)
+                self._put(out_q, ("tokens", item))
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            if token_cache is not None:
+                token_cache.close()
+        self._put(out_q, _DONE)
+
+    def _embed(self, in_q: queue.Queue, out_q: queue.Queue, semantic_retriever: SemanticRetriever) -> None:
+        metrics = self.metrics["embed"]
+        while True:
+            item = self._get(in_q, metrics)
+            if item is _DONE:
+                break
+            start_time = time.time()
+            item.payload = semantic_retriever.embed_model.embed_documents([doc.page_content for doc in item.documents])
+            metrics.record(len(item.documents), time.time() - start_time)
+            self._put(out_q, ("embeddings", item))
+        self._put(out_q, _DONE)
+
+    def _write(self, in_q: queue.Queue, semantic_retriever: SemanticRetriever, tokenized: Dict[int, _Batch], n_producers: int) -> None:
+        # 임베딩은 도착하는 대로 FAISS에 추가하고, BM25는 전역 통계(df, avgdl)가 필요하므로 토큰만 모아 둠
+        metrics = self.metrics["write"]
+        n_done = 0
+        while n_done < n_producers:
+            item = self._get(in_q, metrics)
+            if item is _DONE:
+                n_done += 1
+                continue
+            kind, batch = item
+            start_time = time.time()
+            if kind == "embeddings":
+                semantic_retriever.add_embeddings(
+                    [doc.page_content for doc in batch.documents],
+                    batch.payload,
+                    metadatas=[doc.metadata for doc in batch.documents],
+                    ids=[doc.id for doc in batch.documents],
+                )
+            else:
+                tokenized[batch.batch_id] = batch
+            metrics.record(len(batch.documents), time.time() - start_time)
+
+    def _monitor(self, queues: Dict[str, queue.Queue], threads: List[threading.Thread]) -> None:
+        while any(thread.is_alive() for thread in threads) and not self._stop.wait(self.log_interval):
+            depths = ", ".join(f"{name}={q.qsize()}" for name, q in queues.items())
+            progress = ", ".join(f"{m.name}={m.docs}" for m in self.metrics.values())
+            logger.info(f"Index build progress: docs [{progress}] queue depth [{depths}]")
+
+    def run(self, documents: Optional[Iterable[List[Document]]] = None) -> Tuple[SemanticRetriever, BM25Retriever]:
+        """
+        파이프라인을 실행해 SemanticRetriever와 BM25Retriever를 만들고 cfg['save_path']에 저장합니다.
+
+        Args:
+            documents: Document 배치 iterator (기본값: iter_documents로 recruit 테이블을 스트리밍)
+        """
+        cfg = self.cfg
+        self.metrics = {name: StageMetrics(name) for name in ("fetch", "chunk", "tokenize", "embed", "write")}
+        self._stop.clear()
+        self._errors.clear()
+
+        if documents is None:
+            documents = iter_documents(cfg, self.db_info)
+        semantic_retriever = SemanticRetriever(cfg, None, self.openai_api_key)
+        tokenizer = KoreanTokenizer(method=cfg['tokenizer'])
+
+        queues = {
+            "chunk": queue.Queue(self.queue_size),
+            "tokenize": queue.Queue(self.queue_size),
+            "embed": queue.Queue(self.queue_size),
+            "write": queue.Queue(self.queue_size * 2),
+        }
+        tokenized: Dict[int, _Batch] = {}
+
+        start_time = time.time()
+        threads = [
+            self._run_stage("fetch", lambda: self._fetch(documents, queues["chunk"])),
+            self._run_stage("chunk", lambda: self._chunk(queues["chunk"], [queues["tokenize"], queues["embed"]])),
+            self._run_stage("tokenize", lambda: self._tokenize(queues["tokenize"], queues["write"], tokenizer)),
+            self._run_stage("embed", lambda: self._embed(queues["embed"], queues["write"], semantic_retriever)),
+            self._run_stage("write", lambda: self._write(queues["write"], semantic_retriever, tokenized, n_producers=2)),
+        ]
+        monitor = threading.Thread(target=self._monitor, args=(queues, threads), name="index-build-monitor", daemon=True)
+        monitor.start()
+        for thread in threads:
+            thread.join()
+        self._stop.set()
+        monitor.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+        # BM25는 모든 토큰이 모인 뒤 문서 순서대로 한 번에 색인
+        batches = [tokenized[batch_id] for batch_id in sorted(tokenized)]
+        stages_elapsed_time = time.time() - start_time
+        keyword_retriever = BM25Retriever.from_tokenized(
+            [tokens for batch in batches for tokens in batch.payload],
+            [doc for batch in batches for doc in batch.documents],
+            tokenizer,
+            bm25_params=cfg['bm25_params'],
+            save_path=cfg['save_path'],
+            k=cfg.get('k', 20),
+            method=cfg.get('bm25_method', "exhaustive"),
+            score_normalizer=cfg.get('bm25_score_normalizer', "softmax"),
+        )
+        semantic_retriever.flush()
+        semantic_retriever.save_vector_db(cfg['save_path'])
+
+        elapsed_time = time.time() - start_time
+        for metrics in self.metrics.values():
+            logger.info(metrics.summary())
+        slowest = max(self.metrics.values(), key=lambda m: m.busy_time)
+        logger.info(
+            f"Index build completed in {elapsed_time:.2f} seconds: pipeline {stages_elapsed_time:.2f}s "
+            f"(sum of stages {sum(m.busy_time for m in self.metrics.values()):.2f}s, slowest stage '{slowest.name}' {slowest.busy_time:.2f}s), "
+            f"BM25 fit + save {elapsed_time - stages_elapsed_time:.2f}s"
+        )
+        return semantic_retriever, keyword_retriever
+
+
+def build_indexes(cfg, db_info, openai_api_key=None) -> Tuple[SemanticRetriever, BM25Retriever]:
+    """recruit 테이블로부터 Semantic/BM25 인덱스를 파이프라인으로 빌드하고 저장합니다."""
+    pipeline = IndexBuildPipeline(
+        cfg,
+        db_info,
+        openai_api_key,
+        chunk_size=cfg.get('build_chunk_size', 256),
+        queue_size=cfg.get('build_queue_size', 8),
+    )
+    return pipeline.run()
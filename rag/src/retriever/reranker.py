@@ -0,0 +1,194 @@
+import time
+import logging
+import threading
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from langchain_core.documents import Document
+
+
+logger = logging.getLogger(__name__)
+
+
+class CrossEncoderReranker:
+    """
+    결합된 검색 결과의 상위 후보를 로컬 cross-encoder(HuggingFace, 기본 CPU)로 다시 점수화해 재정렬합니다.
+
+    - 후보 예산(top_n): 결합 결과 중 앞의 top_n개만 점수화하고 나머지는 결합 순서대로 뒤에 둠
+    - micro-batch: batch_size개씩 묶어 점수화하고 (예산이 없으면 길이순으로 묶어 padding을 줄임), (질의, 문서) 쌍이 max_length 토큰을 넘으면 긴 쪽부터 자름
+    - 캐시: (질의, 문서 id) -> 점수 LRU 캐시 (같은 질의의 재검색, 페이지 이동 등)
+    - 지연 예산(budget_ms): 다음 batch까지 돌리면 예산을 넘을 것 같으면 중단하고,
+      점수화하지 못한 후보는 결합 순서 그대로 점수화한 후보 뒤에 둠
+
+    Args:
+        model_name: HuggingFace cross-encoder 모델 (예: "BAAI/bge-reranker-v2-m3")
+        device: "cpu", "cuda" 등
+        top_n: 재순위화할 후보 수
+        batch_size: micro-batch 크기
+        max_length: (질의, 문서) 쌍의 최대 토큰 수
+        budget_ms: 재순위화 지연 예산(ms). None이면 제한 없음
+        cache_size: 캐시에 보관할 (질의, 문서) 점수 수. 0이면 사용 안 함
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        device: str = "cpu",
+        top_n: int = 20,
+        batch_size: int = 16,
+        max_length: int = 512,
+        budget_ms: Optional[float] = None,
+        cache_size: int = 10000,
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.top_n = top_n
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # 모델 forward는 스레드 간에 공유하지 않음 (CPU에서는 torch가 이미 코어를 모두 사용)
+        self._model_lock = threading.Lock()
+        self.tokenizer, self.model = self.load_model(model_name, device)
+
+    @classmethod
+    def from_config(cls, cfg: dict) -> Optional["CrossEncoderReranker"]:
+        """config.yaml의 reranker_* 값으로 생성합니다. reranker_model_name이 없으면 None (재순위화 사용 안 함)"""
+        if not cfg.get('reranker_model_name'):
+            return None
+
+        return cls(
+            cfg['reranker_model_name'],
+            device=cfg.get('reranker_device', "cpu"),
+            top_n=cfg.get('reranker_top_n', 20),
+            batch_size=cfg.get('reranker_batch_size', 16),
+            max_length=cfg.get('reranker_max_length', 512),
+            budget_ms=cfg.get('reranker_budget_ms'),
+            cache_size=cfg.get('reranker_cache_size', 10000),
+        )
+
+    @staticmethod
+    def load_model(model_name: str, device: str):
+        # 재순위화를 쓰지 않으면 torch/transformers를 불러오지 않도록 여기서 import
+        from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+        try:
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            model = AutoModelForSequenceClassification.from_pretrained(model_name).to(device)
+            model.eval()
+            logger.info(f"Cross-encoder {model_name} Successfully Loaded on {device}")
+            return tokenizer, model
+
+        except Exception as e:
+            logger.error(f"Cross-encoder Load Error: {e}")
+            raise e
+
+    def score(self, query: str, texts: Sequence[str]) -> np.ndarray:
+        """(query, text) 쌍들을 한 번의 forward로 점수화합니다. (batch 하나, 점수가 클수록 관련 있음)"""
+        import torch
+
+        inputs = self.tokenizer(
+            [query] * len(texts),
+            list(texts),
+            padding=True,
+            # 질의(이력서 전체)만으로 max_length를 넘을 수 있으므로 긴 쪽부터 잘라 쌍을 맞춤
+            truncation="longest_first",
+            max_length=self.max_length,
+            return_tensors="pt",
+        ).to(self.device)
+        with self._model_lock, torch.inference_mode():
+            logits = self.model(**inputs).logits
+        if logits.shape[1] == 1:
+            # 출력이 하나면 그 logit이 관련도 점수
+            scores = logits[:, 0]
+        elif logits.shape[1] == 2:
+            # (관련 없음, 관련 있음) 분류 모델은 두 logit의 차이(= 관련 있음 확률의 logit)를 점수로 사용
+            scores = logits[:, 1] - logits[:, 0]
+        else:
+            raise ValueError(f"Cross-encoder must output 1 or 2 logits per pair, got {logits.shape[1]}")
+        return scores.float().cpu().numpy()
+
+    @staticmethod
+    def _doc_key(doc: Document) -> str:
+        return str(doc.id) if doc.id is not None else doc.page_content
+
+    def _cache_get(self, keys: List[Tuple[str, str]]) -> Dict[int, float]:
+        hits = {}
+        if not self.cache_size:
+            return hits
+        with self._cache_lock:
+            for i, key in enumerate(keys):
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                    hits[i] = score
+        return hits
+
+    def _cache_put(self, items: List[Tuple[Tuple[str, str], float]]) -> None:
+        if not self.cache_size:
+            return
+        with self._cache_lock:
+            for key, score in items:
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def rerank(self, query: str, documents: Sequence[Document], top_k: Optional[int] = None) -> List[Document]:
+        """
+        documents(결합 순서)의 상위 top_n개를 cross-encoder 점수 내림차순으로 재정렬합니다.
+        점수화된 문서의 metadata['rerank_score']에 점수를 담은 복사본을 반환하며 입력 문서는 수정하지 않습니다.
+        지연 예산을 넘겨 중단한 경우 점수화하지 못한 후보는 결합 순서대로 점수화된 후보 뒤에 둡니다.
+
+        Args:
+            query: 검색 질의
+            documents: 결합된 검색 결과 (점수 내림차순)
+            top_k: 반환할 문서 수 (기본값: 전부)
+        """
+        start_time = time.perf_counter()
+        candidates, rest = list(documents[:self.top_n]), list(documents[self.top_n:])
+        keys = [(query, self._doc_key(doc)) for doc in candidates]
+        scores = self._cache_get(keys)
+        n_cached = len(scores)
+
+        misses = [i for i in range(len(candidates)) if i not in scores]
+        if self.budget_ms is None:
+            # 길이가 비슷한 후보끼리 묶어 batch 안의 padding을 줄임
+            # (예산이 있으면 중단될 때 결합 순위가 높은 후보부터 점수화되도록 결합 순서 유지)
+            misses.sort(key=lambda i: len(candidates[i].page_content))
+        batch_ms = 0.0
+        for batch_start in range(0, len(misses), self.batch_size):
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            # 직전 batch 시간으로 다음 batch 종료 시각을 추정
+            if self.budget_ms is not None and elapsed_ms + batch_ms > self.budget_ms:
+                logger.warning(
+                    f"Rerank budget {self.budget_ms}ms exceeded after {len(scores)}/{len(candidates)} candidates; "
+                    f"keeping fused order for the rest"
+                )
+                break
+
+            batch = misses[batch_start:batch_start + self.batch_size]
+            batch_start_time = time.perf_counter()
+            batch_scores = self.score(query, [candidates[i].page_content for i in batch])
+            batch_ms = (time.perf_counter() - batch_start_time) * 1000
+            scores.update(zip(batch, batch_scores.tolist()))
+            self._cache_put([(keys[i], score) for i, score in zip(batch, batch_scores.tolist())])
+
+        scored = sorted(scores, key=lambda i: scores[i], reverse=True)
+        unscored = [i for i in range(len(candidates)) if i not in scores]
+        reranked = [
+            candidates[i].model_copy(update={"metadata": {**candidates[i].metadata, "rerank_score": scores[i]}})
+            for i in scored
+        ] + [candidates[i] for i in unscored] + rest
+
+        logger.debug(
+            f"Reranked {len(scores)}/{len(candidates)} candidates ({n_cached} cached) "
+            f"in {(time.perf_counter() - start_time) * 1000:.1f}ms"
+        )
+        return reranked if top_k is None else reranked[:top_k]
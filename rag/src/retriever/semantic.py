@@ -1,6 +1,7 @@
 import os
 import json
 import logging
+import numpy as np
 
 from datetime import datetime
 
@@ -13,6 +14,10 @@ from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_openai import OpenAIEmbeddings
 from langchain_huggingface.embeddings import HuggingFaceEmbeddings
 
+from retriever.ann import ann_params, build_index, set_search_params, train_index
+from retriever.embedding_cache import CachedEmbeddings, EmbeddingCache, embedding_namespace
+from retriever.embedding_executor import EmbeddingExecutor
+
 logging.getLogger("httpx").setLevel(logging.WARNING) # HTTPX 로그 비활성화
 logger = logging.getLogger(__name__)
 
@@ -22,12 +27,15 @@ class SemanticRetriever:
         self.cfg = cfg
         self.openai_api_key = openai_api_key
         self.documents = documents
+        self._pending = []
         self.embed_model = self.load_embed_model(cfg['embed_model_provider'], cfg['embed_model_name'], cfg['model_kwargs'], cfg['encode_kwargs'])
 
         if self.cfg['load_path'] is None:
             self.vector_db = self.create_vector_db(cfg['index_type'])
-            self.vector_db.add_documents(self.documents)
-            self.save_vector_db(self.cfg['save_path'])
+            # documents=None이면 빈 인덱스만 생성 (빌드 파이프라인이 임베딩을 추가한 뒤 저장)
+            if self.documents is not None:
+                self.add_documents(self.documents)
+                self.save_vector_db(self.cfg['save_path'])
         else:
             self.vector_db = self.load_vector_db(self.cfg['load_path'], self.embed_model)
         
@@ -40,6 +48,32 @@ class SemanticRetriever:
                 embed_model =  HuggingFaceEmbeddings(model_name=embed_model_name, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs)
 
             logger.info(f"{embed_model_provider}/{embed_model_name} Successfully Loaded.")
+
+            # 요청 packing/동시 실행/재시도를 담당하는 executor (로컬 HuggingFace 모델은 순차 실행 + batch_size 튜닝)
+            is_local = embed_model_provider == "huggingface"
+            embed_model = EmbeddingExecutor(
+                embed_model,
+                max_concurrency=1 if is_local else self.cfg.get('embed_max_concurrency', 4),
+                max_tokens_per_request=self.cfg.get('embed_max_tokens_per_request', 100_000),
+                max_texts_per_request=self.cfg.get('embed_max_texts_per_request', 2048),
+                max_requests_per_minute=None if is_local else self.cfg.get('embed_requests_per_minute'),
+                max_tokens_per_minute=None if is_local else self.cfg.get('embed_tokens_per_minute'),
+                max_attempts=self.cfg.get('embed_max_attempts', 5),
+                tune_batch_size=is_local and (model_kwargs or {}).get('device', "cpu") == "cpu",
+            )
+
+            # 같은 텍스트를 다시 임베딩하지 않도록 디스크 캐시를 앞에 둠 (재빌드/부분 갱신 시 API 호출 절감)
+            cache_path = self.cfg.get('embedding_cache_path')
+            if cache_path:
+                cache = EmbeddingCache(
+                    cache_path,
+                    embedding_namespace(embed_model_provider, embed_model_name, encode_kwargs),
+                    dtype=self.cfg.get('embedding_cache_dtype', "float32"),
+                    max_bytes=self.cfg.get('embedding_cache_max_bytes', 4 << 30),
+                )
+                embed_model = CachedEmbeddings(embed_model, cache)
+                logger.info(f"Embedding Cache Enabled: {cache.directory}")
+
             return embed_model
 
         except Exception as e:
@@ -49,14 +83,8 @@ class SemanticRetriever:
     
     def create_vector_db(self, index_type):
         sample_query = "Hello World!!"
-        if index_type == "L2": ## L2 Distance(Euclidean Distance)
-            index = faiss.IndexFlatL2(len(self.embed_model.embed_query(sample_query)))
-
-        elif index_type == "IP": ## Inner Product
-            index = faiss.IndexFlatIP(len(self.embed_model.embed_query(sample_query)))
-
-        elif index_type == "HNSW":## ANN -> Hierarchical Navigable Small World
-            index = faiss.IndexHNSWFlat(len(self.embed_model.embed_query(sample_query)))
+        # IVF/IVFPQ/OPQ는 학습이 필요하므로 add_embeddings에서 train_size만큼 모은 뒤 학습하고 추가
+        index = build_index(index_type, len(self.embed_model.embed_query(sample_query)), self.cfg.get('ann_params'))
 
         vector_db = FAISS(
             embedding_function=self.embed_model,
@@ -67,6 +95,46 @@ class SemanticRetriever:
     
         logger.info(f"Vector DB({index_type}) Successfully Created")
         return vector_db
+
+
+    def add_embeddings(self, texts, embeddings, metadatas=None, ids=None):
+        """
+        임베딩을 인덱스에 추가합니다.
+        인덱스가 아직 학습되지 않았으면 train_size개가 모일 때까지 버퍼에 두었다가 학습 후 한 번에 추가합니다.
+        """
+        if self.vector_db.index.is_trained:
+            self.vector_db.add_embeddings(zip(texts, embeddings), metadatas=metadatas, ids=ids)
+            return
+
+        self._pending.append((list(texts), list(embeddings), metadatas, ids))
+        if sum(len(batch[0]) for batch in self._pending) >= ann_params(self.cfg.get('ann_params'))['train_size']:
+            self.flush()
+
+
+    def flush(self):
+        """버퍼에 남은 임베딩으로 인덱스를 학습하고 추가합니다. (저장 전에 호출)"""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, []
+        train_index(
+            self.vector_db.index,
+            np.asarray([vector for batch in pending for vector in batch[1]], dtype=np.float32),
+            ann_params(self.cfg.get('ann_params'))['train_size'],
+        )
+        for texts, embeddings, metadatas, ids in pending:
+            self.vector_db.add_embeddings(zip(texts, embeddings), metadatas=metadatas, ids=ids)
+
+
+    def add_documents(self, documents):
+        embeddings = self.embed_model.embed_documents([doc.page_content for doc in documents])
+        self.add_embeddings(
+            [doc.page_content for doc in documents],
+            embeddings,
+            metadatas=[doc.metadata for doc in documents],
+            ids=[doc.id for doc in documents],
+        )
+        self.flush()
     
 
     def save_vector_db(self, save_path):
@@ -77,6 +145,7 @@ class SemanticRetriever:
     def load_vector_db(self, index_path, embed_model):
         logger.debug(f"Attempting to load vector DB from path: {index_path}")
         vector_db = FAISS.load_local(index_path, embeddings=embed_model, allow_dangerous_deserialization=True)
+        set_search_params(vector_db.index, self.cfg.get('ann_params'))
 
         logger.info(f"Loading Semantic Retriever from {index_path}")
 
@@ -98,3 +167,33 @@ class SemanticRetriever:
             doc.metadata['score'] = score
         
         return results
+
+
+    def batch_search(self, queries, k=5):
+        """
+        Search multiple queries at once and return the top k results per query.
+
+        All queries are embedded with a single `embed_documents` call and searched with a single
+        `index.search` over the stacked query matrix.
+
+        :param queries: The query strings to search for.
+        :param k: The number of top results to return per query.
+        :return: A list (one per query) of lists of (document, score) tuples.
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+
+        vectors = np.asarray(self.embed_model.embed_documents(queries), dtype=np.float32)
+        if self.vector_db._normalize_L2:
+            faiss.normalize_L2(vectors)
+        scores, indices = self.vector_db.index.search(vectors, k)
+
+        results = []
+        for query_scores, query_indices in zip(scores, indices):
+            results.append([
+                (self.vector_db.docstore.search(self.vector_db.index_to_docstore_id[i]), float(score))
+                for score, i in zip(query_scores, query_indices)
+                if i != -1  # 문서 수가 k보다 적으면 -1이 반환됨
+            ])
+        return results
@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import os
+import json
+import bisect
+import numpy as np
+
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from langchain_core.documents import Document
+
+
+def _load_array(path: str, mmap: bool) -> np.ndarray:
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+def _write_blob(chunks: List[bytes], directory: str, name: str) -> None:
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum([len(chunk) for chunk in chunks], out=offsets[1:])
+    np.save(os.path.join(directory, f"{name}.npy"), np.frombuffer(b"".join(chunks), dtype=np.uint8))
+    np.save(os.path.join(directory, f"{name}_offsets.npy"), offsets)
+
+
+class SortedStringTable(Mapping):
+    """
+    정렬된 문자열 테이블. UTF-8 blob(uint8 배열)과 offset 배열로 저장되며,
+    문자열 -> 순번(id) 조회를 이진 탐색으로 처리하므로 dict 없이 mmap 상태 그대로 사용할 수 있습니다.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @staticmethod
+    def write(strings: Iterable[str], directory: str, name: str) -> None:
+        """이미 정렬된 문자열 목록을 `{name}.npy`, `{name}_offsets.npy`로 저장합니다."""
+        _write_blob([s.encode("utf-8") for s in strings], directory, name)
+
+    @classmethod
+    def load(cls, directory: str, name: str, mmap: bool = True) -> SortedStringTable:
+        return cls(
+            _load_array(os.path.join(directory, f"{name}.npy"), mmap),
+            _load_array(os.path.join(directory, f"{name}_offsets.npy"), mmap),
+        )
+
+    def string_at(self, i: int) -> str:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __getitem__(self, key: str) -> int:
+        i = bisect.bisect_left(_StringView(self), key)
+        if i < len(self) and self.string_at(i) == key:
+            return i
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.string_at(i) for i in range(len(self)))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class _StringView:
+    """bisect가 SortedStringTable을 문자열 시퀀스로 다룰 수 있도록 하는 뷰"""
+
+    def __init__(self, table: SortedStringTable):
+        self.table = table
+
+    def __getitem__(self, i: int) -> str:
+        return self.table.string_at(i)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+
+class DocumentBlob(Sequence):
+    """
+    offset으로 색인되는 Document 저장소. 문서별 JSON(page_content, metadata, id)을 하나의 blob에 이어 붙여 저장하고,
+    조회 시 해당 문서만 디코딩합니다. 문서 id는 정렬된 문자열 테이블로 함께 저장해 id -> 위치를 이진 탐색으로 찾습니다.
+    """
+
+    def __init__(
+        self,
+        blob: np.ndarray,
+        offsets: np.ndarray,
+        ids: Optional[SortedStringTable] = None,
+        id_positions: Optional[np.ndarray] = None,
+    ):
+        self.blob = blob
+        self.offsets = offsets
+        self.ids = ids
+        self.id_positions = id_positions
+
+    @staticmethod
+    def write(documents: Iterable[Document], directory: str, name: str = "docs") -> None:
+        chunks, ids = [], []
+        for position, doc in enumerate(documents):
+            doc_id = None if doc.id is None else str(doc.id)
+            chunks.append(
+                json.dumps(
+                    {"page_content": doc.page_content, "metadata": doc.metadata, "id": doc_id},
+                    ensure_ascii=False,
+                    default=str,  # datetime, Decimal 등 DB 타입은 문자열로 저장
+                ).encode("utf-8")
+            )
+            if doc_id is not None:
+                ids.append((doc_id, position))
+        _write_blob(chunks, directory, name)
+
+        ids.sort()
+        SortedStringTable.write((doc_id for doc_id, _ in ids), directory, f"{name}_ids")
+        np.save(os.path.join(directory, f"{name}_id_positions.npy"), np.asarray([p for _, p in ids], dtype=np.int64))
+
+    @classmethod
+    def load(cls, directory: str, name: str = "docs", mmap: bool = True) -> DocumentBlob:
+        return cls(
+            _load_array(os.path.join(directory, f"{name}.npy"), mmap),
+            _load_array(os.path.join(directory, f"{name}_offsets.npy"), mmap),
+            SortedStringTable.load(directory, f"{name}_ids", mmap=mmap),
+            _load_array(os.path.join(directory, f"{name}_id_positions.npy"), mmap),
+        )
+
+    def position(self, doc_id: str) -> Optional[int]:
+        """문서 id의 위치를 반환합니다. 없으면 None"""
+        i = self.ids.get(doc_id) if self.ids is not None else None
+        return None if i is None else int(self.id_positions[i])
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Document, List[Document]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+
+        record = json.loads(bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8"))
+        return Document(**record)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class DocumentSegments(Sequence):
+    """
+    base 문서 목록(List[Document] 또는 mmap된 DocumentBlob) 뒤에 증분 추가된 문서(delta)를 이어 붙인 Document 시퀀스.
+    BM25Index의 base/delta segment와 같은 위치 체계를 사용합니다.
+    """
+
+    def __init__(self, base: Sequence[Document], delta: Optional[Iterable[Document]] = None):
+        self.base = base
+        self.delta: List[Document] = []
+        self._delta_ids: Dict[str, int] = {}
+        # DocumentBlob은 저장된 id 테이블을 그대로 사용하고, 메모리 목록만 dict로 색인
+        self._base_ids: Optional[Dict[str, int]] = None
+        if not isinstance(base, DocumentBlob):
+            self._base_ids = {str(doc.id): i for i, doc in enumerate(base) if doc.id is not None}
+        if delta is not None:
+            self.extend(delta)
+
+    def extend(self, documents: Iterable[Document]) -> None:
+        for doc in documents:
+            if doc.id is not None:
+                self._delta_ids[str(doc.id)] = len(self)
+            self.delta.append(doc)
+
+    def position(self, doc_id: str) -> Optional[int]:
+        """문서 id의 위치를 반환합니다. 같은 id가 다시 추가된 경우 가장 최근 위치를 반환하며, 없으면 None"""
+        doc_id = str(doc_id)
+        if doc_id in self._delta_ids:
+            return self._delta_ids[doc_id]
+        if self._base_ids is not None:
+            return self._base_ids.get(doc_id)
+        return self.base.position(doc_id)
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Document, List[Document]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        n_base = len(self.base)
+        return self.base[i] if i < n_base else self.delta[i - n_base]
+
+    def __len__(self) -> int:
+        return len(self.base) + len(self.delta)
+
+
+class StringColumn(Sequence):
+    """UTF-8 blob(uint8 배열)과 offset 배열로 저장된 문자열 열. 위치로 조회하며 해당 문자열만 디코딩합니다."""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+
+    @staticmethod
+    def write(strings: Iterable[str], directory: str, name: str) -> None:
+        _write_blob([s.encode("utf-8") for s in strings], directory, name)
+
+    @classmethod
+    def load(cls, directory: str, name: str, mmap: bool = True) -> StringColumn:
+        return cls(
+            _load_array(os.path.join(directory, f"{name}.npy"), mmap),
+            _load_array(os.path.join(directory, f"{name}_offsets.npy"), mmap),
+        )
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class DocumentColumns(Sequence):
+    """
+    텍스트, 메타데이터, 문서 id를 열별로 나눠 저장하는 Document 저장소. 정수 위치(id)로 조회합니다.
+
+    텍스트만 필요한 경우(재순위화 등)에는 text()로 메타데이터를 디코딩하지 않고 읽을 수 있습니다.
+    base 열은 메모리 리스트 또는 mmap된 StringColumn이며, 이후 추가된 문서는 메모리 리스트(delta)에 이어 붙입니다.
+    위치 체계는 DocumentSegments와 같으므로 BM25Index의 문서 위치와 그대로 대응합니다.
+    """
+
+    def __init__(
+        self,
+        texts: Sequence[str],
+        metadatas: Sequence[Union[dict, str]],
+        ids: Sequence[Optional[str]],
+        id_table: Optional[SortedStringTable] = None,
+        id_positions: Optional[np.ndarray] = None,
+    ):
+        # base 열 (metadatas는 dict 또는 JSON 문자열)
+        self.texts = texts
+        self.metadatas = metadatas
+        self.ids = ids
+        self.id_table = id_table
+        self.id_positions = id_positions
+        self._base_ids: Optional[Dict[str, int]] = None
+        if id_table is None:
+            self._base_ids = {str(doc_id): i for i, doc_id in enumerate(ids) if doc_id is not None}
+
+        self.delta_texts: List[str] = []
+        self.delta_metadatas: List[dict] = []
+        self.delta_ids: List[Optional[str]] = []
+        self._delta_ids: Dict[str, int] = {}
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Document]) -> DocumentColumns:
+        documents = list(documents)
+        return cls(
+            [doc.page_content for doc in documents],
+            [doc.metadata for doc in documents],
+            [None if doc.id is None else str(doc.id) for doc in documents],
+        )
+
+    def extend(self, documents: Iterable[Document]) -> None:
+        for doc in documents:
+            doc_id = None if doc.id is None else str(doc.id)
+            if doc_id is not None:
+                self._delta_ids[doc_id] = len(self)
+            self.delta_texts.append(doc.page_content)
+            self.delta_metadatas.append(doc.metadata)
+            self.delta_ids.append(doc_id)
+
+    def select(self, positions: Iterable[int]) -> DocumentColumns:
+        """positions 순서대로 문서를 모은 새 저장소 (compact 후 위치를 다시 매길 때 사용)"""
+        positions = [int(i) for i in positions]
+        return DocumentColumns(
+            [self.text(i) for i in positions],
+            [self.metadata(i) for i in positions],
+            [self.doc_id(i) for i in positions],
+        )
+
+    def write(self, directory: str, name: str = "columns") -> None:
+        """`{name}_texts`, `{name}_metadata`(문서별 JSON), `{name}_ids` 열과 id 조회 테이블을 저장합니다."""
+        os.makedirs(directory, exist_ok=True)
+        n_docs = len(self)
+        StringColumn.write((self.text(i) for i in range(n_docs)), directory, f"{name}_texts")
+        StringColumn.write(
+            (json.dumps(self.metadata(i), ensure_ascii=False, default=str) for i in range(n_docs)),
+            directory,
+            f"{name}_metadata",
+        )
+        doc_ids = [self.doc_id(i) for i in range(n_docs)]
+        StringColumn.write((doc_id or "" for doc_id in doc_ids), directory, f"{name}_ids")
+
+        ids = sorted((doc_id, position) for position, doc_id in enumerate(doc_ids) if doc_id is not None)
+        SortedStringTable.write((doc_id for doc_id, _ in ids), directory, f"{name}_id_table")
+        np.save(os.path.join(directory, f"{name}_id_positions.npy"), np.asarray([p for _, p in ids], dtype=np.int64))
+
+    @classmethod
+    def load(cls, directory: str, name: str = "columns", mmap: bool = True) -> DocumentColumns:
+        return cls(
+            StringColumn.load(directory, f"{name}_texts", mmap=mmap),
+            StringColumn.load(directory, f"{name}_metadata", mmap=mmap),
+            StringColumn.load(directory, f"{name}_ids", mmap=mmap),
+            SortedStringTable.load(directory, f"{name}_id_table", mmap=mmap),
+            _load_array(os.path.join(directory, f"{name}_id_positions.npy"), mmap),
+        )
+
+    @property
+    def n_base(self) -> int:
+        return len(self.texts)
+
+    def text(self, i: int) -> str:
+        return self.texts[i] if i < self.n_base else self.delta_texts[i - self.n_base]
+
+    def metadata(self, i: int) -> dict:
+        if i >= self.n_base:
+            return self.delta_metadatas[i - self.n_base]
+        metadata = self.metadatas[i]
+        return json.loads(metadata) if isinstance(metadata, str) else metadata
+
+    def doc_id(self, i: int) -> Optional[str]:
+        doc_id = self.ids[i] if i < self.n_base else self.delta_ids[i - self.n_base]
+        return doc_id or None
+
+    def position(self, doc_id: str) -> Optional[int]:
+        """문서 id의 위치를 반환합니다. 같은 id가 다시 추가된 경우 가장 최근 위치를 반환하며, 없으면 None"""
+        doc_id = str(doc_id)
+        if doc_id in self._delta_ids:
+            return self._delta_ids[doc_id]
+        if self._base_ids is not None:
+            return self._base_ids.get(doc_id)
+        i = self.id_table.get(doc_id)
+        return None if i is None else int(self.id_positions[i])
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[Document, List[Document]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return Document(page_content=self.text(i), metadata=self.metadata(i), id=self.doc_id(i))
+
+    def __len__(self) -> int:
+        return self.n_base + len(self.delta_texts)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import numpy as np
+
+from typing import Dict, List, Optional, Sequence
+
+
+logger = logging.getLogger(__name__)
+
+# SQLite의 한 쿼리당 바인딩 변수 수 제한을 넘지 않도록 나누어 조회
+_QUERY_BATCH_SIZE = 500
+
+
+class TokenCache:
+    """
+    텍스트 해시 -> token id 배열을 저장하는 SQLite 기반 영구 토큰 캐시.
+
+    키는 (토크나이저 방식, 토크나이저 버전, 텍스트)의 해시이므로 토크나이저를 바꾸거나 업그레이드하면 자동으로 다시 분석합니다.
+    토큰 문자열은 vocab 테이블에 한 번만 저장하고 문서별로는 int32 id 배열(BLOB)만 저장하며,
+    id 배열의 총 크기가 max_bytes를 넘으면 가장 오래 사용되지 않은 항목부터 삭제합니다.
+    """
+
+    def __init__(self, path: str, namespace: str, max_bytes: int = 1 << 30):
+        """
+        Args:
+            path: SQLite 파일 경로
+            namespace: 캐시 키에 포함할 토크나이저 식별자 (예: "kiwi:0.24.0")
+            max_bytes: token id 배열 총 크기 상한 (기본값: 1GiB)
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.path = path
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS vocab (id INTEGER PRIMARY KEY, token TEXT UNIQUE NOT NULL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, ids BLOB NOT NULL, accessed INTEGER NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self.conn.commit()
+
+        self._id_to_token: Dict[int, str] = {}
+        self._token_to_id: Dict[str, int] = {}
+        self._sync_vocab()
+
+    def _sync_vocab(self) -> None:
+        """다른 프로세스가 추가한 token까지 vocab을 읽어옵니다."""
+        last_id = max(self._id_to_token, default=0)
+        for token_id, token in self.conn.execute("SELECT id, token FROM vocab WHERE id > ?", (last_id,)):
+            self._id_to_token[token_id] = token
+            self._token_to_id[token] = token_id
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.blake2b(f"{self.namespace}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+    def _decode(self, blob: bytes) -> List[str]:
+        token_ids = np.frombuffer(blob, dtype=np.int32)
+        if any(int(i) not in self._id_to_token for i in token_ids):
+            self._sync_vocab()
+        return [self._id_to_token[int(i)] for i in token_ids]
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[str]]]:
+        """텍스트별 캐시된 토큰 목록을 반환합니다. 캐시에 없으면 None"""
+        keys = [self._key(text) for text in texts]
+        found: Dict[bytes, bytes] = {}
+        for i in range(0, len(keys), _QUERY_BATCH_SIZE):
+            batch = keys[i:i + _QUERY_BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            found.update(self.conn.execute(f"SELECT key, ids FROM entries WHERE key IN ({placeholders})", batch))
+
+        if found:
+            now = time.time_ns()
+            self.conn.executemany("UPDATE entries SET accessed = ? WHERE key = ?", ((now, key) for key in found))
+            self.conn.commit()
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return [self._decode(found[key]) if key in found else None for key in keys]
+
+    def put_many(self, texts: Sequence[str], tokenized: Sequence[Sequence[str]]) -> None:
+        """텍스트별 토큰 목록을 캐시에 저장하고 필요하면 오래된 항목을 삭제합니다."""
+        new_tokens = {token for tokens in tokenized for token in tokens if token not in self._token_to_id}
+        if new_tokens:
+            self.conn.executemany("INSERT OR IGNORE INTO vocab (token) VALUES (?)", ((token,) for token in new_tokens))
+            self._sync_vocab()
+
+        now = time.time_ns()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO entries (key, ids, accessed) VALUES (?, ?, ?)",
+            (
+                (self._key(text), np.asarray([self._token_to_id[t] for t in tokens], dtype=np.int32).tobytes(), now)
+                for text, tokens in zip(texts, tokenized)
+            ),
+        )
+        self.conn.commit()
+        self._evict()
+
+    def size_bytes(self) -> int:
+        return self.conn.execute("SELECT COALESCE(SUM(LENGTH(ids)), 0) FROM entries").fetchone()[0]
+
+    def _evict(self) -> None:
+        """token id 배열 총 크기가 max_bytes를 넘으면 LRU 순으로 max_bytes의 90%까지 삭제합니다."""
+        excess = self.size_bytes() - self.max_bytes
+        if excess <= 0:
+            return
+
+        excess += self.max_bytes // 10
+        evicted: List[bytes] = []
+        for key, size in self.conn.execute("SELECT key, LENGTH(ids) FROM entries ORDER BY accessed"):
+            evicted.append(key)
+            excess -= size
+            if excess <= 0:
+                break
+
+        for i in range(0, len(evicted), _QUERY_BATCH_SIZE):
+            batch = evicted[i:i + _QUERY_BATCH_SIZE]
+            self.conn.execute(f"DELETE FROM entries WHERE key IN ({','.join('?' * len(batch))})", batch)
+        self.conn.commit()
+        logger.info(f"TokenCache evicted {len(evicted)} entries from {self.path}")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> TokenCache:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
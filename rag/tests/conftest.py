@@ -0,0 +1,5 @@
+import os
+import sys
+
+# rag/src의 스크립트와 같은 방식(from retriever.x import ...)으로 import
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from retriever.embedding_cache import EmbeddingCache
+
+
+DIM = 4
+
+
+def make_cache(directory, max_rows=3):
+    return EmbeddingCache(str(directory), "test", max_bytes=max_rows * DIM * 4)
+
+
+@pytest.mark.parametrize("order", [["a", "d", "e"], ["d", "e", "a"]])
+def test_overwrite_is_not_evicted_for_new_keys(tmp_path, order):
+    """같은 호출에서 덮어쓰는 항목의 행이 새 항목에 재배정되어 한 항목이 사라지면 안 됨"""
+    cache = make_cache(tmp_path)
+    cache.put_many(["a", "b", "c"], np.eye(DIM)[:3])
+
+    vectors = np.arange(len(order) * DIM, dtype=np.float32).reshape(len(order), DIM)
+    cache.put_many(order, vectors)
+
+    found = cache.get_many(order)
+    assert all(vector is not None for vector in found)
+    np.testing.assert_array_equal(np.stack(found), vectors)
+    assert cache.get_many(["b", "c"]) == [None, None]
+
+
+def test_two_handles_do_not_share_rows(tmp_path):
+    """같은 디렉토리를 연 두 캐시(프로세스)가 번갈아 추가해도 행이 겹치지 않음"""
+    first, second = make_cache(tmp_path, max_rows=100), make_cache(tmp_path, max_rows=100)
+    first.put_many(["x"], [[1, 1, 1, 1]])
+    second.put_many(["y"], [[2, 2, 2, 2]])
+    first.put_many(["z"], [[3, 3, 3, 3]])
+
+    for cache in (first, second):
+        np.testing.assert_array_equal(np.stack(cache.get_many(["x", "y", "z"]))[:, 0], [1, 2, 3])
@@ -0,0 +1,19 @@
+import time
+
+import pytest
+
+from retriever.embedding_executor import RateLimiter
+
+
+@pytest.mark.parametrize("limits", [(None, 1_000), (1_000, None)])
+def test_rate_limiter_with_one_unlimited_dimension(limits):
+    limiter = RateLimiter(*limits)
+
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire(10)
+
+    assert time.monotonic() - start < 1.0
+    # 제한 없는 항목은 capacity를 세지 않음
+    assert (limiter.available_requests is None) == (limits[0] is None)
+    assert (limiter.available_tokens is None) == (limits[1] is None)
@@ -0,0 +1,83 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from retriever.ensemble import EnsembleMethod, EnsembleRetriever
+from retriever.fusion import SMALL_FUSION_SIZE
+
+
+def make_doc_lists(n_candidates):
+    return [
+        [Document(page_content=f"doc-{i}", metadata={"score": 1.0 / (i + 1)}) for i in range(n_candidates)],
+        [Document(page_content=f"doc-{i}", metadata={"score": 1.0 / (i + 2)}) for i in range(n_candidates // 2, n_candidates * 3 // 2)],
+    ]
+
+
+@pytest.mark.parametrize("method", list(EnsembleMethod))
+@pytest.mark.parametrize("n_candidates", [10, SMALL_FUSION_SIZE])
+def test_ensemble_results_does_not_mutate_inputs(method, n_candidates):
+    ensemble = EnsembleRetriever(retrievers=[RunnableLambda(lambda q: [])] * 2, weights=[0.5, 0.5], method=method)
+    doc_lists = make_doc_lists(n_candidates)
+    before = [[dict(doc.metadata) for doc in doc_list] for doc_list in doc_lists]
+
+    fused = ensemble.ensemble_results(doc_lists)
+
+    assert [[doc.metadata for doc in doc_list] for doc_list in doc_lists] == before
+    inputs = {id(doc) for doc_list in doc_lists for doc in doc_list}
+    assert not any(id(doc) in inputs for doc in fused)
+    assert [doc.metadata["score"] for doc in fused] == sorted((doc.metadata["score"] for doc in fused), reverse=True)
+
+
+def test_trace_metadata_is_per_query():
+    """retriever가 같은 Document 객체를 돌려줘도 빠진 retriever 기록이 다음 검색으로 남으면 안 됨"""
+    shared = [Document(page_content=f"doc-{i}", metadata={"score": 1.0 / (i + 1)}) for i in range(3)]
+    calls = []
+
+    def flaky(query):
+        calls.append(query)
+        if len(calls) == 1:
+            raise RuntimeError("dense leg down")
+        return shared
+
+    ensemble = EnsembleRetriever(
+        retrievers=[RunnableLambda(lambda q: shared), RunnableLambda(flaky)], weights=[0.5, 0.5], method=EnsembleMethod.CC
+    )
+
+    first = ensemble.invoke("q")
+    assert all(doc.metadata["missing_retrievers"] == ["retriever_2"] for doc in first)
+    second = ensemble.invoke("q")
+    assert all("missing_retrievers" not in doc.metadata for doc in second)
+    assert set(second[0].metadata["retriever_latency_ms"]) == {"retriever_1", "retriever_2"}
+    assert second[0].metadata["retriever_latency_ms"] is not second[1].metadata["retriever_latency_ms"]
+    assert all(set(doc.metadata) == {"score"} for doc in shared)
+
+
+def sleeping_leg(seconds):
+    def search(query):
+        time.sleep(seconds)
+        return [Document(page_content=query, metadata={"score": 1.0})]
+    return RunnableLambda(search)
+
+
+def test_concurrent_invokes_do_not_share_threads():
+    ensemble = EnsembleRetriever(retrievers=[sleeping_leg(0.2), sleeping_leg(0.2)], weights=[0.5, 0.5])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(ensemble.invoke, [f"q{i}" for i in range(8)]))
+
+    assert time.perf_counter() - start < 0.6
+
+
+def test_timed_out_leg_does_not_block_the_caller():
+    ensemble = EnsembleRetriever(retrievers=[sleeping_leg(0.0), sleeping_leg(1.0)], weights=[0.5, 0.5], timeout=0.1)
+
+    start = time.perf_counter()
+    for _ in range(3):
+        fused = ensemble.invoke("q")
+        assert fused[0].metadata["missing_retrievers"] == ["retriever_2"]
+
+    assert time.perf_counter() - start < 0.6
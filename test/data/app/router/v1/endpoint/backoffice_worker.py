@@ -5,7 +5,6 @@ from datetime import datetime
 from bson.objectid import ObjectId
 from typing import Optional, List, Dict, Any
 from fastapi.encoders import jsonable_encoder
-from starlette.concurrency import run_in_threadpool
 from fastapi import APIRouter, HTTPException, Request, Query, Body, BackgroundTasks
 
 from src.db.mongo import connect_to_mongo, async_mongo_client
@@ -563,8 +562,8 @@ async def background_company_vision_analysis(
             raise Exception(error_msg)
         
         try:
-            # 만약 similarity_search_with_relevance_scores가 blocking 함수라면 run_in_threadpool 사용
-            relevance_docs = await run_in_threadpool(vector_store.similarity_search_with_relevance_scores, query)
+            # 임베딩은 async 클라이언트, FAISS 검색은 VectorStore 전용 스레드 풀에서 실행
+            relevance_docs = await vector_store.asearch(query, relevance_scores=True)
             logger.info(f"[company_vision_analysis] relevance_docs: {len(relevance_docs)}")
         except Exception as e:
             await error_handler.handle_error(
@@ -755,8 +754,8 @@ async def background_company_workstyle_analysis(
             raise Exception(error_msg)
         
         try:
-            # 만약 similarity_search_with_relevance_scores가 blocking 함수라면 run_in_threadpool 사용
-            relevance_docs = await run_in_threadpool(vector_store.similarity_search_with_relevance_scores, query)
+            # 임베딩은 async 클라이언트, FAISS 검색은 VectorStore 전용 스레드 풀에서 실행
+            relevance_docs = await vector_store.asearch(query, relevance_scores=True)
             logger.info(f"[company_workstyle_analysis] relevance_docs: {len(relevance_docs)}")
         except Exception as e:
             await error_handler.handle_error(
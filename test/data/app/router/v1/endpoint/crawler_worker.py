@@ -86,7 +86,7 @@ async def get_company_homepage_api(request: Request, company_name: str, start_ur
             
             # 문서 추가 시도
             try:
-                vector_store.vector_db.add_documents(new_documents)
+                await vector_store.aadd_documents(new_documents)
                 logger.info(f"✅[company_homepage] {len(new_documents)} new documents added to Vector DB")
 
             except Exception as e:
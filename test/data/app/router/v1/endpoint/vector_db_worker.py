@@ -130,13 +130,13 @@ def delete_document_api(request: Request, company_name: str, url: str):
 
 
 @router.get("/vector_db_worker/similarity_search_with_score")
-def similarity_search_with_score_api(request: Request, query: str):
+async def similarity_search_with_score_api(request: Request, query: str):
     """
     주어진 쿼리와 회사명에 따라 유사도 점수를 기반으로 문서를 검색하는 API.
     """
     try:
         vector_store = request.app.state.vector_store
-        results = vector_store.similarity_search_with_score(query)
+        results = await vector_store.asearch(query)
         
         return {"status": "success", "data": results}
     
@@ -146,16 +146,31 @@ def similarity_search_with_score_api(request: Request, query: str):
 
 
 @router.get("/vector_db_worker/similarity_search_with_relevance_scores")
-def similarity_search_with_relevance_scores_api(request: Request, query: str):
+async def similarity_search_with_relevance_scores_api(request: Request, query: str):
     """
     주어진 쿼리와 회사명에 따라 관련성 점수를 기반으로 문서를 검색하는 API.
     """
     try:
         vector_store = request.app.state.vector_store
-        results = vector_store.similarity_search_with_relevance_scores(query)
+        results = await vector_store.asearch(query, relevance_scores=True)
         
         return {"status": "success", "data": results}
     
     except Exception as e:
         logger.error(f"관련성 점수 검색 중 오류 발생: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"관련성 점수 검색 중 오류 발생: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"관련성 점수 검색 중 오류 발생: {str(e)}")
+
+@router.get("/vector_db_worker/query_cache_stats")
+def query_cache_stats_api(request: Request):
+    """
+    쿼리 임베딩 캐시의 hit/miss 지표를 반환하는 API.
+    """
+    try:
+        vector_store = request.app.state.vector_store
+        stats = vector_store.query_cache_stats()
+
+        return {"status": "success", "data": stats}
+
+    except Exception as e:
+        logger.error(f"쿼리 캐시 지표 조회 중 오류 발생: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"쿼리 캐시 지표 조회 중 오류 발생: {str(e)}")
@@ -64,7 +64,7 @@ def add_new_page(collection, company_name, url, text, vector_store):
     )
     logger.info(f"✅ {company_name}의 새로운 페이지 {url} 등록 성공.")
 
-    vector_store.vector_db.add_documents([Document(page_content=text, metadata={"url": url, "company_name": company_name})])
+    vector_store.add_documents([Document(page_content=text, metadata={"url": url, "company_name": company_name})])
     logger.info(f"✅ {company_name}의 새로운 페이지 {url} 벡터 데이터베이스에 등록 성공.")
     
     return {"success": True, "message": "신규 페이지 등록 성공", "new_page": {"url": url, "text": text}}
@@ -0,0 +1,279 @@
+import time
+import faiss
+import numpy as np
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.utils.logging import logger
+
+ANN_INDEX_TYPES = ("L2", "IP", "HNSW", "IVF", "IVFPQ", "OPQ")
+
+# ann_params 기본값 (config의 ann_params로 덮어씀)
+DEFAULT_ANN_PARAMS = {
+    "metric": "L2",          # IVF/IVFPQ/OPQ/HNSW의 거리 ("L2", "IP")
+    "nlist": 1024,           # IVF 클러스터 수 (학습 벡터는 최소 nlist개, 권장 39 * nlist개)
+    "pq_m": 64,              # PQ sub-quantizer 수 (차원의 약수)
+    "pq_nbits": 8,           # sub-quantizer당 비트 수
+    "hnsw_m": 32,            # HNSW 노드당 이웃 수
+    "ef_construction": 200,  # HNSW 구축 시 탐색 폭
+    "ef_search": 64,         # HNSW 검색 시 탐색 폭 (query-time)
+    "nprobe": 16,            # IVF 검색 시 방문할 클러스터 수 (query-time)
+    "train_size": 50000,     # 학습에 사용할 샘플 벡터 수
+}
+
+
+def ann_params(params: Optional[dict] = None) -> dict:
+    return {**DEFAULT_ANN_PARAMS, **(params or {})}
+
+
+def build_index(index_type: str, dim: int, params: Optional[dict] = None) -> faiss.Index:
+    """
+    index_type과 ann_params로 FAISS 인덱스를 생성합니다.
+
+    - "L2", "IP": Flat (전수 탐색, 학습 불필요)
+    - "HNSW": IndexHNSWFlat(M, efConstruction, efSearch)
+    - "IVF": IVF{nlist},Flat
+    - "IVFPQ": IVF{nlist},PQ{pq_m}x{pq_nbits}
+    - "OPQ": OPQ{pq_m},IVF{nlist},PQ{pq_m}x{pq_nbits} (회전 후 PQ로 양자화 오차 감소)
+
+    IVF 계열은 벡터를 추가하기 전에 train_index로 학습해야 합니다.
+    """
+    params = ann_params(params)
+    metric = faiss.METRIC_INNER_PRODUCT if params["metric"] == "IP" else faiss.METRIC_L2
+
+    if index_type == "L2": ## L2 Distance(Euclidean Distance)
+        return faiss.IndexFlatL2(dim)
+
+    elif index_type == "IP": ## Inner Product
+        return faiss.IndexFlatIP(dim)
+
+    elif index_type == "HNSW": ## ANN -> Hierarchical Navigable Small World
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"], metric)
+        index.hnsw.efConstruction = params["ef_construction"]
+        index.hnsw.efSearch = params["ef_search"]
+        return index
+
+    elif index_type == "IVF":
+        factory = f"IVF{params['nlist']},Flat"
+
+    elif index_type == "IVFPQ":
+        factory = f"IVF{params['nlist']},PQ{params['pq_m']}x{params['pq_nbits']}"
+
+    elif index_type == "OPQ":
+        factory = f"OPQ{params['pq_m']},IVF{params['nlist']},PQ{params['pq_m']}x{params['pq_nbits']}"
+
+    else:
+        raise ValueError(f"Unknown index_type: {index_type}. Available: {ANN_INDEX_TYPES}")
+
+    index = faiss.index_factory(dim, factory, metric)
+    set_search_params(index, params)
+    return index
+
+
+def unwrap_index(index: faiss.Index) -> faiss.Index:
+    """IndexIDMap/IndexIDMap2로 감싼 경우 내부 인덱스를 구체 타입으로 반환합니다."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def set_search_params(index: faiss.Index, params: Optional[dict] = None) -> None:
+    """query-time 파라미터(IVF nprobe, HNSW efSearch)를 설정합니다. 해당 없는 인덱스는 무시합니다."""
+    params = ann_params(params)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = params["nprobe"]
+
+    hnsw = unwrap_index(index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        hnsw.hnsw.efSearch = params["ef_search"]
+
+
+def search_parameters(index: faiss.Index, selector: Optional[faiss.IDSelector]) -> Optional[faiss.SearchParameters]:
+    """
+    IDSelector를 적용한 검색 파라미터를 만듭니다. (selector가 None이면 None)
+    파라미터를 넘기면 인덱스에 설정된 nprobe/efSearch 대신 파라미터 값이 쓰이므로 현재 값을 그대로 옮깁니다.
+    IndexIDMap2.search는 검색 중 파라미터의 sel을 잠시 바꾸므로, 반환한 파라미터는 검색 하나에서만 사용합니다.
+    """
+    if selector is None:
+        return None
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+
+    inner = unwrap_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=inner.hnsw.efSearch)
+
+    return faiss.SearchParameters(sel=selector)
+
+
+def with_stable_ids(index: faiss.Index) -> faiss.Index:
+    """
+    삭제 후에도 바뀌지 않는 64bit id로 벡터를 관리할 수 있는 인덱스를 반환합니다.
+
+    - IVF 계열: 역리스트에 id를 직접 저장하므로 그대로 사용 (add_with_ids/remove_ids 지원, hashtable direct map 추가)
+    - 그 외(Flat, HNSW): IndexIDMap2로 감쌈. 이전 버전에서 저장된 비어 있지 않은 인덱스는
+      벡터를 다시 추가하지 않고 기존 순번(0..ntotal-1)을 그대로 id로 사용
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        # id로 벡터를 꺼낼 수 있도록 (exact_search) hashtable direct map 사용
+        if ivf.direct_map.type != faiss.DirectMap.Hashtable:
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return index
+
+    if isinstance(faiss.downcast_index(index), faiss.IndexIDMap2):
+        return index
+
+    # IndexIDMap2는 빈 인덱스만 받으므로 생성하는 동안만 ntotal을 0으로 둠
+    ntotal = index.ntotal
+    index.ntotal = 0
+    wrapped = faiss.IndexIDMap2(index)
+    index.ntotal = ntotal
+
+    faiss.copy_array_to_vector(np.arange(ntotal, dtype=np.int64), wrapped.id_map)
+    wrapped.ntotal = ntotal
+    wrapped.construct_rev_map()
+    return wrapped
+
+
+def removal_selector(index: faiss.Index, ids: np.ndarray) -> faiss.IDSelector:
+    """remove_ids용 selector. hashtable direct map을 쓰는 IVF는 IDSelectorArray만 지원합니다."""
+    if faiss.try_extract_index_ivf(index) is not None:
+        return faiss.IDSelectorArray(ids)
+    return faiss.IDSelectorBatch(ids)
+
+
+def knn_search(queries: np.ndarray, vectors: np.ndarray, ids: np.ndarray, k: int, metric_type: int) -> Tuple[np.ndarray, np.ndarray]:
+    """vectors 전체를 전수 비교해 상위 k개의 (score, id)를 반환합니다. (ids[i]는 vectors[i]의 id)"""
+    if not len(ids):
+        return np.zeros((len(queries), 0), dtype=np.float32), np.zeros((len(queries), 0), dtype=np.int64)
+    scores, positions = faiss.knn(queries, vectors, min(k, len(ids)), metric=metric_type)
+    return scores, ids[positions]
+
+
+def exact_search(index: faiss.Index, ids: np.ndarray, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    ids에 해당하는 벡터만 꺼내 전수 비교합니다. 비용은 O(len(ids) * d)이고 len(ids) >= k면 항상 k개를 반환합니다.
+    PQ 계열도 복원 벡터와의 거리가 인덱스 검색 거리와 같으므로 점수 단위가 index.search와 일치합니다.
+    """
+    return knn_search(queries, index.reconstruct_batch(ids), ids, k, index.metric_type)
+
+
+def merge_knn(metric_type: int, k: int, *results: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """단일 쿼리 검색 결과 (scores, ids) 여러 개를 거리 기준으로 합쳐 상위 k개를 반환합니다. (id -1 제외)"""
+    scores = np.concatenate([result[0][0] for result in results])
+    ids = np.concatenate([result[1][0] for result in results])
+    scores, ids = scores[ids >= 0], ids[ids >= 0]
+    order = np.argsort(-scores if metric_type == faiss.METRIC_INNER_PRODUCT else scores, kind="stable")[:k]
+    return scores[order][None, :], ids[order][None, :]
+
+
+def stored_ids(index: faiss.Index) -> Optional[np.ndarray]:
+    """IndexIDMap2에 저장된 id 목록 (IVF 계열 등 id_map이 없으면 None)"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap2):
+        return faiss.vector_to_array(index.id_map)
+    return None
+
+
+def train_index(index: faiss.Index, vectors: np.ndarray, train_size: Optional[int] = None, seed: int = 0) -> None:
+    """학습이 필요한 인덱스를 vectors에서 무작위로 뽑은 train_size개 샘플로 학습합니다."""
+    if index.is_trained:
+        return
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    train_size = train_size or DEFAULT_ANN_PARAMS["train_size"]
+    if len(vectors) > train_size:
+        vectors = vectors[np.random.default_rng(seed).choice(len(vectors), train_size, replace=False)]
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and len(vectors) < ivf.nlist:
+        raise ValueError(f"IVF index needs at least nlist={ivf.nlist} training vectors, got {len(vectors)}")
+
+    start_time = time.time()
+    index.train(vectors)
+    logger.info(f"🏋️ ANN Index Trained on {len(vectors)} vectors in {time.time() - start_time:.2f} seconds")
+
+
+def index_size_bytes(index: faiss.Index) -> int:
+    return faiss.serialize_index(index).nbytes
+
+
+def ann_report(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    candidates: Sequence[Dict],
+    k: int = 10,
+    metric: str = "L2",
+) -> List[Dict]:
+    """
+    Flat 인덱스 결과를 정답으로 각 ANN 설정의 recall@k와 쿼리당 지연 시간을 측정합니다.
+
+    Args:
+        vectors: 색인할 문서 벡터
+        queries: 쿼리 벡터 (문서 벡터에서 제외한 샘플 등)
+        candidates: {"index_type": ..., "params": {...}, "sweep": {"nprobe": [...]} 또는 {"ef_search": [...]}} 목록
+        k: recall@k의 k
+        metric: Flat 기준 인덱스의 거리 ("L2", "IP")
+    Returns:
+        설정/query-time 파라미터 조합별 {"index_type", "params", "recall", "latency_ms_p50", "latency_ms_p95", "build_seconds", "size_mb"}
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    dim = vectors.shape[1]
+
+    def measure(index: faiss.Index, ground_truth: Optional[np.ndarray]) -> Dict:
+        latencies, found = [], []
+        for query in queries:
+            start_time = time.perf_counter()
+            _, indices = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - start_time) * 1000)
+            found.append(indices[0])
+        found = np.asarray(found)
+        recall = 1.0 if ground_truth is None else float(np.mean([
+            len(np.intersect1d(f[f >= 0], g)) / k for f, g in zip(found, ground_truth)
+        ]))
+        return {
+            "recall": recall,
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p95": float(np.percentile(latencies, 95)),
+        }, found
+
+    start_time = time.time()
+    baseline = build_index("IP" if metric == "IP" else "L2", dim)
+    baseline.add(vectors)
+    build_seconds = time.time() - start_time
+    baseline_metrics, ground_truth = measure(baseline, None)
+    report = [{
+        "index_type": "Flat", "params": {"metric": metric}, **baseline_metrics,
+        "build_seconds": build_seconds, "size_mb": index_size_bytes(baseline) / 2**20,
+    }]
+
+    for candidate in candidates:
+        params = ann_params({"metric": metric, **candidate.get("params", {})})
+        start_time = time.time()
+        index = build_index(candidate["index_type"], dim, params)
+        train_index(index, vectors, params["train_size"])
+        index.add(vectors)
+        build_seconds = time.time() - start_time
+        size_mb = index_size_bytes(index) / 2**20
+
+        (knob, values), = (candidate.get("sweep") or {"nprobe": [params["nprobe"]]}).items()
+        for value in values:
+            search_params = {**params, knob: value}
+            set_search_params(index, search_params)
+            metrics, _ = measure(index, ground_truth)
+            report.append({
+                "index_type": candidate["index_type"], "params": search_params, **metrics,
+                "build_seconds": build_seconds, "size_mb": size_mb,
+            })
+            logger.info(
+                f"{candidate['index_type']} {knob}={value}: recall@{k}={metrics['recall']:.4f}, "
+                f"p50={metrics['latency_ms_p50']:.3f}ms, p95={metrics['latency_ms_p95']:.3f}ms, size={size_mb:.1f}MB"
+            )
+
+    return report
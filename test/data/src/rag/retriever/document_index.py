@@ -0,0 +1,64 @@
+from typing import Dict, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+
+
+class DocumentIndex:
+    """
+    VectorStore의 docstore 역방향 맵과 메타데이터 보조 인덱스.
+
+    - faiss_ids: docstore_id -> FAISS id (index_to_docstore_id의 역방향)
+    - by_company: company_name -> docstore_id들 (삽입 순서 유지)
+    - by_company_url: (company_name, url) -> docstore_id들 (삽입 순서 유지)
+
+    docstore를 선형 탐색하지 않고 회사/URL 단위 조회를 O(1) 또는 O(일치 문서 수)로 처리합니다.
+    FAISS 인덱스와 함께 수정해야 하므로 VectorStore의 writer 스레드에서만 갱신합니다.
+    검색 스레드는 get/len/list()처럼 한 번에 끝나는 연산으로만 읽습니다.
+    """
+
+    def __init__(self):
+        self.faiss_ids: Dict[str, int] = {}
+        self.by_company: Dict[str, Dict[str, None]] = {}
+        self.by_company_url: Dict[Tuple[str, str], Dict[str, None]] = {}
+
+    @classmethod
+    def from_vector_db(cls, vector_db) -> "DocumentIndex":
+        """로드/생성된 FAISS 벡터 DB에서 한 번 O(N)으로 인덱스를 만듭니다."""
+        index = cls()
+        docstore = vector_db.docstore._dict
+        for faiss_id, doc_id in vector_db.index_to_docstore_id.items():
+            document = docstore.get(doc_id)
+            if isinstance(document, Document):
+                index.add(doc_id, faiss_id, document)
+        return index
+
+    def add(self, doc_id: str, faiss_id: int, document: Document) -> None:
+        self.faiss_ids[doc_id] = faiss_id
+        company_name = document.metadata.get("company_name")
+        self.by_company.setdefault(company_name, {})[doc_id] = None
+        self.by_company_url.setdefault((company_name, document.metadata.get("url")), {})[doc_id] = None
+
+    def remove(self, doc_id: str, document: Document) -> Optional[int]:
+        """문서를 인덱스에서 제거하고 FAISS id를 반환합니다."""
+        company_name = document.metadata.get("company_name")
+        key = (company_name, document.metadata.get("url"))
+        for mapping, mapping_key in ((self.by_company, company_name), (self.by_company_url, key)):
+            ids = mapping.get(mapping_key)
+            if ids is not None:
+                ids.pop(doc_id, None)
+                if not ids:
+                    del mapping[mapping_key]
+        return self.faiss_ids.pop(doc_id, None)
+
+    def company_doc_ids(self, company_name: str) -> List[str]:
+        return list(self.by_company.get(company_name, ()))
+
+    def find(self, company_name: str, url: str) -> Optional[str]:
+        """(company_name, url)에 해당하는 첫 번째 docstore_id"""
+        doc_ids = list(self.by_company_url.get((company_name, url), ()))
+        return doc_ids[0] if doc_ids else None
+
+    def clear(self) -> None:
+        self.faiss_ids.clear()
+        self.by_company.clear()
+        self.by_company_url.clear()
@@ -0,0 +1,382 @@
+from __future__ import annotations
+
+import os
+import asyncio
+import json
+import time
+import sqlite3
+import hashlib
+import itertools
+import threading
+import numpy as np
+
+from collections import OrderedDict
+from functools import partial
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.embeddings import Embeddings
+
+from app.utils.logging import logger
+
+# SQLite의 한 쿼리당 바인딩 변수 수 제한을 넘지 않도록 나누어 조회
+_QUERY_BATCH_SIZE = 500
+
+
+def embedding_namespace(provider: str, model_name: str, encode_kwargs: Optional[dict] = None) -> str:
+    """임베딩 캐시 namespace: 모델과 정규화 옵션이 다르면 다른 벡터이므로 모두 포함합니다."""
+    return f"{provider}:{model_name}:{json.dumps(encode_kwargs or {}, sort_keys=True)}"
+
+
+class EmbeddingCache:
+    """
+    텍스트 해시 -> 임베딩 벡터를 저장하는 content-addressed 디스크 캐시.
+
+    namespace(provider, 모델, 정규화 옵션)별 디렉토리에 고정 크기 행으로 된 float32/float16 행렬 파일(vectors.bin)을
+    뒤에 덧붙여 가며 저장하고, 텍스트 해시 -> 행 번호 색인은 SQLite(index.sqlite)에 둡니다.
+    행렬 크기가 max_bytes를 넘으면 가장 오래 사용되지 않은 항목을 색인에서 지우고 그 행을 새 항목에 재사용합니다.
+    """
+
+    def __init__(self, directory: str, namespace: str, dtype: str = "float32", max_bytes: int = 4 << 30):
+        """
+        Args:
+            directory: 캐시 루트 디렉토리
+            namespace: embedding_namespace()로 만든 모델 식별자
+            dtype: 저장 dtype ("float32", "float16")
+            max_bytes: 행렬 파일 크기 상한 (기본값: 4GiB)
+        """
+        self.namespace = namespace
+        self.directory = os.path.join(directory, hashlib.blake2b(namespace.encode("utf-8"), digest_size=8).hexdigest())
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._matrix_path = os.path.join(self.directory, "vectors.bin")
+        self.conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key BLOB PRIMARY KEY, row INTEGER UNIQUE NOT NULL, accessed INTEGER NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY)")
+        self.conn.commit()
+
+        meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+        self.dtype = np.dtype(meta.get("dtype", dtype))
+        self.dim: Optional[int] = int(meta["dim"]) if "dim" in meta else None
+        self.n_rows = int(meta.get("n_rows", 0))
+        if "namespace" not in meta:
+            self._set_meta(namespace=namespace, dtype=self.dtype.name)
+            self.conn.commit()
+        self._matrix: Optional[np.memmap] = None
+        self._capacity = 0
+        if self.dim is not None:
+            self._map(max(self.n_rows, 1))
+
+    def _set_meta(self, **values) -> None:
+        self.conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [(k, str(v)) for k, v in values.items()])
+
+    @property
+    def max_rows(self) -> int:
+        return max(1, self.max_bytes // (self.dim * self.dtype.itemsize)) if self.dim else 0
+
+    def _map(self, n_rows: int) -> None:
+        """행렬 파일을 최소 n_rows행 크기로 늘리고 다시 메모리 매핑합니다. (2배씩 증가, max_rows까지)"""
+        row_bytes = self.dim * self.dtype.itemsize
+        file_rows = os.path.getsize(self._matrix_path) // row_bytes if os.path.exists(self._matrix_path) else 0
+        capacity = max(file_rows, n_rows)
+        if capacity > file_rows:
+            capacity = min(max(capacity, file_rows * 2, 1024), max(self.max_rows, n_rows))
+            with open(self._matrix_path, "ab") as f:
+                f.truncate(capacity * row_bytes)
+
+        if self._matrix is not None:
+            self._matrix.flush()
+        self._matrix = np.memmap(self._matrix_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+        self._capacity = capacity
+
+    @staticmethod
+    def _key(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """텍스트별 캐시된 벡터(float32)를 반환합니다. 캐시에 없으면 None"""
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            rows: Dict[bytes, int] = {}
+            for i in range(0, len(keys), _QUERY_BATCH_SIZE):
+                batch = keys[i:i + _QUERY_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows.update(self.conn.execute(f"SELECT key, row FROM entries WHERE key IN ({placeholders})", batch))
+
+            if rows:
+                max_row = max(rows.values())
+                if self._matrix is None or max_row >= self._capacity:
+                    # 다른 프로세스가 추가한 행은 파일을 다시 매핑해야 보임
+                    if self.dim is None:
+                        self.dim = int(dict(self.conn.execute("SELECT key, value FROM meta"))["dim"])
+                    self._map(max_row + 1)
+                now = time.time_ns()
+                self.conn.executemany("UPDATE entries SET accessed = ? WHERE key = ?", ((now, key) for key in rows))
+                self.conn.commit()
+                vectors = dict(zip(rows, np.asarray(self._matrix[list(rows.values())], dtype=np.float32)))
+            else:
+                vectors = {}
+
+        self.hits += sum(key in rows for key in keys)
+        self.misses += sum(key not in rows for key in keys)
+        return [vectors.get(key) for key in keys]
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        """텍스트별 벡터를 저장합니다. 크기 상한을 넘으면 LRU 항목의 행을 재사용합니다."""
+        items = {self._key(text): vector for text, vector in zip(texts, vectors)}
+        if not items:
+            return
+        matrix = np.asarray(list(items.values()), dtype=self.dtype)
+
+        with self._lock:
+            # 같은 캐시 디렉토리를 쓰는 다른 프로세스와 행 배정이 겹치지 않도록 쓰기 잠금을 잡은 뒤 meta를 다시 읽음
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                meta = dict(self.conn.execute("SELECT key, value FROM meta"))
+                self.n_rows = int(meta.get("n_rows", 0))
+                if self.dim is None and "dim" in meta:
+                    self.dim = int(meta["dim"])
+                if self.dim is None:
+                    self.dim = matrix.shape[1]
+                    self._set_meta(dim=self.dim)
+                if matrix.shape[1] != self.dim:
+                    raise ValueError(f"Embedding dimension mismatch: cache={self.dim}, input={matrix.shape[1]}")
+
+                # 이미 있는 항목은 같은 행에 덮어쓰고, 새 항목은 빈 행 -> 파일 끝 순서로 배정
+                existing = dict(self.conn.execute(
+                    f"SELECT key, row FROM entries WHERE key IN ({','.join('?' * len(items))})", list(items)
+                )) if len(items) <= _QUERY_BATCH_SIZE else {
+                    key: row for key, row in self.conn.execute("SELECT key, row FROM entries") if key in items
+                }
+                new_keys = [key for key in items if key not in existing]
+                self._evict(len(new_keys), keep=existing)
+                rows = self._allocate(len(new_keys))
+
+                row_of = {**existing, **dict(zip(new_keys, rows))}
+                if self._matrix is None or self.n_rows > self._capacity:
+                    self._map(max(self.n_rows, 1))
+                self._matrix[[row_of[key] for key in items]] = matrix
+
+                now = time.time_ns()
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, row, accessed) VALUES (?, ?, ?)",
+                    ((key, row_of[key], now) for key in items),
+                )
+                self._set_meta(n_rows=self.n_rows)
+                self._matrix.flush()
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+
+    def _allocate(self, n: int) -> List[int]:
+        free = [row for (row,) in self.conn.execute("SELECT row FROM free_rows ORDER BY row LIMIT ?", (n,))]
+        self.conn.executemany("DELETE FROM free_rows WHERE row = ?", ((row,) for row in free))
+        rows = free + list(range(self.n_rows, self.n_rows + n - len(free)))
+        self.n_rows += n - len(free)
+        return rows
+
+    def _evict(self, n_new: int, keep: Dict[bytes, int]) -> None:
+        """
+        새 항목 n_new개가 들어갈 자리를 LRU 순서로 비웁니다.
+        keep(이번 호출에서 덮어쓸 항목)은 제외합니다. 지우면 그 행이 새 항목에 다시 배정되어 두 키가 한 행을 공유하게 됩니다.
+        """
+        n_entries = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        n_evict = n_entries + n_new - self.max_rows
+        if n_evict <= 0:
+            return
+
+        evicted = list(itertools.islice(
+            ((key, row) for key, row in self.conn.execute("SELECT key, row FROM entries ORDER BY accessed") if key not in keep),
+            n_evict,
+        ))
+        self.conn.executemany("DELETE FROM entries WHERE key = ?", ((key,) for key, _ in evicted))
+        self.conn.executemany("INSERT OR IGNORE INTO free_rows (row) VALUES (?)", ((row,) for _, row in evicted))
+        logger.info(f"🧹 EmbeddingCache evicted {len(evicted)} entries from {self.directory}")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            self.conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings 앞에 EmbeddingCache를 두는 래퍼.
+    embed_documents는 캐시에 없는 텍스트만 원래 모델로 임베딩하고, embed_query는 그대로 원래 모델을 호출합니다.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.cache.get_many(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            embedded = self.embeddings.embed_documents(missing)
+            self.cache.put_many(missing, embedded)
+            embedded_by_text = dict(zip(missing, embedded))
+            vectors = [embedded_by_text[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+            logger.info(f"🗂️  EmbeddingCache: {len(texts) - len(missing)} hits, {len(missing)} embedded")
+
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # 캐시 조회/저장(SQLite, memmap)은 executor에서 실행하고 임베딩은 원래 모델의 async 경로를 사용
+        loop = asyncio.get_running_loop()
+        vectors = await loop.run_in_executor(None, self.cache.get_many, texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            embedded = await self.embeddings.aembed_documents(missing)
+            await loop.run_in_executor(None, self.cache.put_many, missing, embedded)
+            embedded_by_text = dict(zip(missing, embedded))
+            vectors = [embedded_by_text[text] if vector is None else vector for text, vector in zip(texts, vectors)]
+            logger.info(f"🗂️  EmbeddingCache: {len(texts) - len(missing)} hits, {len(missing)} embedded")
+
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in vectors]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.embeddings.aembed_query(text)
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    embed_query 결과를 프로세스 메모리 LRU(+TTL)에 두는 래퍼. 선택적으로 EmbeddingCache를 디스크 2차 캐시로 사용합니다.
+
+    분석 API처럼 같은 템플릿 쿼리("{company_name}이 추구하는 비전...")를 반복 검색할 때 임베딩 왕복을 없앱니다.
+    캐시는 모델(namespace)별로 만들고 키는 쿼리 텍스트입니다. embed_documents/aembed_documents는 그대로 원래 모델을 호출합니다.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_entries: int = 1024,
+        ttl_seconds: Optional[float] = 24 * 60 * 60,
+        disk_cache: Optional[EmbeddingCache] = None,
+    ):
+        """
+        Args:
+            embeddings: 원래 임베딩 모델
+            max_entries: 메모리에 둘 쿼리 수 (초과 시 가장 오래 사용되지 않은 쿼리부터 제거)
+            ttl_seconds: 메모리 항목 유효 시간 (None이면 만료 없음)
+            disk_cache: 디스크 2차 캐시 (문서 임베딩과 다른 namespace 사용)
+        """
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_cache = disk_cache
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  ## text -> (만료 시각, 벡터)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.miss_seconds = 0.0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._lookup(text)
+        if vector is None:
+            start_time = time.perf_counter()
+            vector = self.embeddings.embed_query(text)
+            self._store(text, vector, time.perf_counter() - start_time)
+        return np.asarray(vector, dtype=np.float32).tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        # 메모리 LRU만 이벤트 루프에서 확인하고, 디스크 캐시(SQLite commit, memmap flush)는 executor에서 실행
+        loop = asyncio.get_running_loop()
+        vector = self._lookup_memory(text)
+        if vector is None and self.disk_cache is not None:
+            vector = await loop.run_in_executor(None, self._lookup_disk, text)
+        if vector is None:
+            start_time = time.perf_counter()
+            vector = await self.embeddings.aembed_query(text)
+            self._record_miss(text, vector, time.perf_counter() - start_time)
+            if self.disk_cache is not None:
+                await loop.run_in_executor(None, partial(self.disk_cache.put_many, [text], [vector]))
+        return np.asarray(vector, dtype=np.float32).tolist()
+
+    def _lookup(self, text: str) -> Optional[np.ndarray]:
+        """메모리 -> 디스크 순서로 찾고, 디스크에서 찾으면 메모리에 올립니다. 없으면 None"""
+        vector = self._lookup_memory(text)
+        if vector is None and self.disk_cache is not None:
+            vector = self._lookup_disk(text)
+        return vector
+
+    def _lookup_memory(self, text: str) -> Optional[np.ndarray]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(text)
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self._entries.move_to_end(text)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[text]
+                self.expired += 1
+        return None
+
+    def _lookup_disk(self, text: str) -> Optional[np.ndarray]:
+        """디스크 캐시에서 찾으면 메모리에 올립니다. 없으면 None"""
+        vector = self.disk_cache.get_many([text])[0]
+        if vector is not None:
+            self.disk_hits += 1
+            self._remember(text, vector)
+        return vector
+
+    def _store(self, text: str, vector: Sequence[float], elapsed: float) -> None:
+        self._record_miss(text, vector, elapsed)
+        if self.disk_cache is not None:
+            self.disk_cache.put_many([text], [vector])
+
+    def _record_miss(self, text: str, vector: Sequence[float], elapsed: float) -> None:
+        self.miss_seconds += elapsed
+        self.misses += 1
+        self._remember(text, vector)
+
+    def _remember(self, text: str, vector: Sequence[float]) -> None:
+        with self._lock:
+            expires_at = None if self.ttl_seconds is None else time.monotonic() + self.ttl_seconds
+            self._entries[text] = (expires_at, np.asarray(vector, dtype=np.float32))
+            self._entries.move_to_end(text)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, float]:
+        """hit/miss 지표. miss_latency_ms는 실제 임베딩 호출의 평균 지연 시간입니다."""
+        requests = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / requests if requests else 0.0,
+            "miss_latency_ms": self.miss_seconds / self.misses * 1000 if self.misses else 0.0,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,109 @@
+from typing import FrozenSet, Optional, Tuple
+
+import faiss
+import numpy as np
+
+from src.rag.retriever.ann import search_parameters
+
+
+class DeltaBuffer:
+    """
+    마지막 병합 이후 추가된 벡터를 담는 append-only 버퍼.
+
+    writer만 쓰고, 검색은 IndexGeneration이 잡아 둔 [:n] view만 읽습니다.
+    새 행은 항상 공개된 n 뒤에 쓰고, 공간이 부족하거나 행을 지울 때는 새 배열을 만들므로
+    이미 공개된 view는 바뀌지 않습니다.
+    """
+
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.vectors = np.empty((capacity, dim), dtype=np.float32)
+        self.ids = np.empty(capacity, dtype=np.int64)
+        self.n = 0
+
+    def append(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        if self.n + len(ids) > len(self.ids):
+            capacity = max(len(self.ids) * 2, self.n + len(ids))
+            vectors_, ids_ = np.empty((capacity, self.vectors.shape[1]), dtype=np.float32), np.empty(capacity, dtype=np.int64)
+            vectors_[:self.n], ids_[:self.n] = self.vectors[:self.n], self.ids[:self.n]
+            self.vectors, self.ids = vectors_, ids_
+
+        self.vectors[self.n:self.n + len(ids)] = vectors
+        self.ids[self.n:self.n + len(ids)] = ids
+        self.n += len(ids)
+
+    def remove(self, ids: np.ndarray) -> np.ndarray:
+        """ids 중 버퍼에 있는 행을 새 배열로 옮겨 지우고, 지운 id를 반환합니다."""
+        mask = np.isin(self.ids[:self.n], ids)
+        if not mask.any():
+            return np.zeros(0, dtype=np.int64)
+
+        removed, keep = self.ids[:self.n][mask], ~mask
+        vectors, kept_ids = self.vectors[:self.n][keep], self.ids[:self.n][keep]
+        self.vectors = np.empty((max(len(kept_ids), 1024), self.vectors.shape[1]), dtype=np.float32)
+        self.ids = np.empty(len(self.vectors), dtype=np.int64)
+        self.n = 0
+        self.append(vectors, kept_ids)
+        return removed
+
+
+class IndexGeneration:
+    """
+    검색이 읽는 불변 스냅샷. writer가 쓰기 묶음을 반영할 때마다 새 세대를 만들어 교체합니다.
+
+    - index: 병합된 FAISS 인덱스 (공개된 뒤에는 수정하지 않고, 병합 시 복제본을 수정해 새 세대로 교체)
+    - delta_vectors/delta_ids: 병합 전 추가된 벡터 (id 오름차순, 전수 비교로 검색)
+    - deleted: index 안에 남아 있지만 삭제된 id (검색 시 selector로 제외)
+    - base_next_id: 이 값보다 작은 id는 index에, 크거나 같은 id는 delta에 있음
+    - next_id: 이 세대가 볼 수 있는 id 상한
+    """
+
+    __slots__ = (
+        "number", "index", "delta_vectors", "delta_ids", "deleted",
+        "deleted_ids", "base_next_id", "next_id", "selector",
+    )
+
+    def __init__(
+        self,
+        number: int,
+        index: faiss.Index,
+        delta: DeltaBuffer,
+        deleted: FrozenSet[int],
+        base_next_id: int,
+        next_id: int,
+        previous: Optional["IndexGeneration"] = None,
+    ):
+        self.number = number
+        self.index = index
+        self.delta_vectors = delta.vectors[:delta.n]
+        self.delta_ids = delta.ids[:delta.n]
+        self.deleted = deleted
+        self.base_next_id = base_next_id
+        self.next_id = next_id
+        if previous is not None and previous.index is index and previous.deleted is deleted:
+            # 인덱스와 삭제 목록이 그대로면 (추가만 있었던 경우) selector를 다시 만들지 않음
+            self.deleted_ids, self.selector = previous.deleted_ids, previous.selector
+        else:
+            self.deleted_ids = np.fromiter(deleted, dtype=np.int64, count=len(deleted))
+            self.selector = faiss.IDSelectorNot(faiss.IDSelectorBatch(self.deleted_ids)) if deleted else None
+
+    def search_params(self) -> Optional[faiss.SearchParameters]:
+        """
+        삭제 목록을 제외하는 검색 파라미터. IndexIDMap2.search가 검색 중 파라미터의 sel을 잠시 바꾸므로
+        스레드 간에 공유하지 않고 검색마다 새로 만듭니다. (selector는 읽기만 하므로 공유)
+        """
+        return search_parameters(self.index, self.selector)
+
+    def visible(self, faiss_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """이 세대에서 살아 있는 id만 남겨 (index에 있는 id, delta에 있는 id)로 나눕니다."""
+        base = faiss_ids[faiss_ids < self.base_next_id]
+        if self.deleted:
+            base = base[~np.isin(base, self.deleted_ids)]
+        delta = faiss_ids[faiss_ids >= self.base_next_id]
+        return base, delta[np.isin(delta, self.delta_ids)]
+
+    def delta_rows(self, faiss_ids: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.delta_ids, faiss_ids)
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal - len(self.deleted) + len(self.delta_ids)
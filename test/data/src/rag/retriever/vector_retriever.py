@@ -1,9 +1,15 @@
 import os
 import faiss
+import pickle
+import queue
+import asyncio
+import threading
 import numpy as np
 
+from uuid import uuid4
+from functools import partial
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from fastapi import APIRouter, Request
 
 from langchain_community.vectorstores import FAISS
 from langchain_community.docstore.in_memory import InMemoryDocstore
@@ -15,6 +21,18 @@ from langchain_huggingface.embeddings import HuggingFaceEmbeddings
 from app.utils.logging import logger
 from src.utils.config_utils import save_config
 from src.rag.data.dataset import load_documents_from_db
+from src.rag.retriever.ann import (
+    ANN_INDEX_TYPES, ann_params, build_index, exact_search, knn_search, merge_knn, removal_selector,
+    search_parameters, set_search_params, train_index, stored_ids, unwrap_index, with_stable_ids,
+)
+from src.rag.retriever.document_index import DocumentIndex
+from src.rag.retriever.generation import DeltaBuffer, IndexGeneration
+from src.rag.retriever.embedding_cache import CachedEmbeddings, CachedQueryEmbeddings, EmbeddingCache, embedding_namespace
+from src.rag.retriever.embedding_executor import EmbeddingExecutor
+
+## 읽기 전용 메모리 매핑 (IO_FLAG_MMAP_IFC: Flat 계열 코드도 매핑, 구버전 faiss에는 없음)
+INDEX_MMAP_FLAGS = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+
 
 class VectorStore:
     def __init__(self, cfg):
@@ -28,24 +46,88 @@ class VectorStore:
         elif self.cfg['provider'] == "huggingface":
             self.embed_model = HuggingFaceEmbeddings(model_name=self.cfg['model_name'], model_kwargs=self.cfg['model_kwargs'], encode_kwargs=self.cfg['encode_kwargs'])
 
+        ## 요청 packing/동시 실행/재시도 executor (로컬 HuggingFace 모델은 순차 실행 + CPU면 batch_size 튜닝)
+        is_local = self.cfg['provider'] == "huggingface"
+        self.embed_model = EmbeddingExecutor(
+            self.embed_model,
+            max_concurrency=1 if is_local else self.cfg.get('embed_max_concurrency', 4),
+            max_tokens_per_request=self.cfg.get('embed_max_tokens_per_request', 100_000),
+            max_texts_per_request=self.cfg.get('embed_max_texts_per_request', 2048),
+            max_requests_per_minute=None if is_local else self.cfg.get('embed_requests_per_minute'),
+            max_tokens_per_minute=None if is_local else self.cfg.get('embed_tokens_per_minute'),
+            max_attempts=self.cfg.get('embed_max_attempts', 5),
+            tune_batch_size=is_local and (self.cfg.get('model_kwargs') or {}).get('device', "cpu") == "cpu",
+        )
+
+        ## 같은 텍스트를 다시 임베딩하지 않도록 디스크 캐시를 앞에 둠
+        if self.cfg.get('embedding_cache_path'):
+            cache = EmbeddingCache(
+                self.cfg['embedding_cache_path'],
+                embedding_namespace(self.cfg['provider'], self.cfg['model_name'], self.cfg.get('encode_kwargs')),
+                dtype=self.cfg.get('embedding_cache_dtype', "float32"),
+                max_bytes=self.cfg.get('embedding_cache_max_bytes', 4 << 30),
+            )
+            self.embed_model = CachedEmbeddings(self.embed_model, cache)
+            logger.info(f"🗂️  임베딩 캐시 사용: {cache.directory}")
+
+        ## 반복되는 분석 쿼리의 임베딩 왕복을 없애는 쿼리 임베딩 LRU (embedding_cache_path가 있으면 디스크에도 저장)
+        query_disk_cache = None
+        if self.cfg.get('embedding_cache_path'):
+            query_disk_cache = EmbeddingCache(
+                self.cfg['embedding_cache_path'],
+                embedding_namespace(self.cfg['provider'], self.cfg['model_name'], self.cfg.get('encode_kwargs')) + ":query",
+                dtype="float32",
+                max_bytes=self.cfg.get('query_cache_max_bytes', 64 << 20),
+            )
+        self.query_cache = CachedQueryEmbeddings(
+            self.embed_model,
+            max_entries=self.cfg.get('query_cache_max_entries', 1024),
+            ttl_seconds=self.cfg.get('query_cache_ttl_seconds', 24 * 60 * 60),
+            disk_cache=query_disk_cache,
+        )
+        self.embed_model = self.query_cache
+
         self.vector_db = None
+        self.doc_index = DocumentIndex()
+        self.index_path = None
+        self.index_mmapped = False
+
+        ## async API: 임베딩 I/O는 이벤트 루프에서, FAISS 연산은 전용 스레드 풀에서 실행 (Starlette 스레드 풀과 분리)
+        self._executor = ThreadPoolExecutor(max_workers=self.cfg.get('search_max_workers', 4), thread_name_prefix="vector-store")
+        self._async_slots = asyncio.Semaphore(self.cfg.get('async_max_concurrency', 16))
+
+        ## 검색은 현재 세대(불변 스냅샷)만 읽고, 모든 수정은 단일 writer 스레드가 묶어서 반영한 뒤 새 세대를 공개
+        self.generation = None
+        self._writes = queue.Queue()
+        self._writer = None
+        self._writer_start_lock = threading.Lock()
+        ## 이하 writer 스레드만 수정하는 상태
+        self.next_id = 0  ## 다음에 부여할 FAISS id (삭제해도 재사용하지 않음)
+        self._base_next_id = 0  ## 이보다 작은 id는 인덱스에, 크거나 같은 id는 delta 버퍼에 있음
+        self._delta = None  ## 마지막 병합 이후 추가된 벡터
+        self._deleted = frozenset()  ## 인덱스에 남아 있지만 삭제된 id (HNSW tombstone 포함)
+        self._purge = []  ## 병합 때 docstore/매핑에서 지울 (faiss_id, doc_id)
 
     
     def create_vector_db(self, index_type):
         logger.info(f"🚀 벡터 DB 초기화 중")
         sample_query = "기업의 비전에 대해 알려주세요."
 
-        if index_type == "L2": ## L2 Distance(Euclidean Distance)
-            index = faiss.IndexFlatL2(len(self.embed_model.embed_query(sample_query)))
+        if index_type not in ANN_INDEX_TYPES:
+            raise ValueError("❌ 지원하지 않는 index_type")
 
-        elif index_type == "IP": ## Inner Product
-            index = faiss.IndexFlatIP(len(self.embed_model.embed_query(sample_query)))
+        ## IVF/IVFPQ/OPQ는 문서 임베딩 샘플로 학습한 뒤 추가 (cfg['ann_params'])
+        ## 삭제 후에도 id가 바뀌지 않도록 64bit id를 직접 부여 (Flat/HNSW는 IndexIDMap2로 감쌈)
+        index = with_stable_ids(build_index(index_type, len(self.embed_model.embed_query(sample_query)), self.cfg.get('ann_params')))
 
-        elif index_type == "HNSW":## ANN -> Hierarchical Navigable Small World
-            index = faiss.IndexHNSWFlat(len(self.embed_model.embed_query(sample_query)))
+        documents = load_documents_from_db(db_name='culture_db', collection_name='company_homepage')
+        logger.info(f"문서 로드 완료 : {len(documents)}")
 
-        else:
-            raise ValueError("❌ 지원하지 않는 index_type")
+        embeddings = None
+        if documents:
+            embeddings = self.embed_model.embed_documents([doc.page_content for doc in documents])
+            # 공개된 인덱스는 수정하지 않으므로 공개 전에 학습
+            train_index(index, np.asarray(embeddings, dtype=np.float32), ann_params(self.cfg.get('ann_params'))['train_size'])
 
         vector_db = FAISS(
             embedding_function=self.embed_model,
@@ -53,17 +135,16 @@ class VectorStore:
             docstore=InMemoryDocstore(),
             index_to_docstore_id={},
         )
+        self.index_mmapped = False
+        self._write(self._set_vector_db, vector_db)
         logger.info("✅ 벡터 DB 초기화 완료")
 
-        documents = load_documents_from_db(db_name='culture_db', collection_name='company_homepage')
-        logger.info(f"문서 로드 완료 : {len(documents)}")
-
         if documents:
-            vector_db.add_documents(documents)
+            self._add_embeddings(documents, embeddings)
+            # 초기 문서는 delta 버퍼를 거치지 않고 바로 인덱스로 병합
+            self.flush()
             logger.info("✅ 문서 추가 완료")
 
-        self.vector_db = vector_db
-
         return vector_db
     
 
@@ -73,7 +154,8 @@ class VectorStore:
         
         os.makedirs(save_path, exist_ok=True)
 
-        vector_db.save_local(save_path)
+        ## 저장 중 docstore가 바뀌지 않도록 writer 스레드에서 병합 후 저장
+        self._write(self._save_local, vector_db, save_path)
         save_config(self.cfg, f"{save_path}/config.yaml")
 
         logger.info(f"✅ 벡터 데이터베이스 생성 완료. 저장 경로: {save_path}")
@@ -95,43 +177,360 @@ class VectorStore:
 
             # 3. 새로운 벡터 DB 저장
             self.save_vector_db(vector_db)
-
-            self.vector_db = vector_db
             logger.info("✅ 새로운 벡터 데이터베이스가 성공적으로 생성 및 저장되었습니다.")
             return vector_db
 
         try:
-            # 4. 기존 인덱스 로드
-            vector_db = FAISS.load_local(index_file_path, embeddings=self.embed_model, allow_dangerous_deserialization=True)
-
-            # 5. 기존 인덱스의 차원 확인
-            dim = vector_db.index.d
-
-            # 6. 새로운 빈 인덱스 생성
-            if isinstance(vector_db.index, faiss.IndexFlatL2):
-                new_index = faiss.IndexFlatL2(dim)
-            elif isinstance(vector_db.index, faiss.IndexFlatIP):
-                new_index = faiss.IndexFlatIP(dim)
-            elif isinstance(vector_db.index, faiss.IndexHNSWFlat):
-                new_index = faiss.IndexHNSWFlat(dim, 32)  # HNSW M 파라미터 기본값 32
-            else:
-                raise ValueError("❌ 지원하지 않는 인덱스 타입입니다.")
-
-            # 7. 기존 벡터들을 새 인덱스로 복사
-            if vector_db.index.ntotal > 0:
-                vectors = vector_db.index.reconstruct_n(0, vector_db.index.ntotal)
-                new_index.add(vectors)
+            # 4. 저장된 인덱스를 그대로 사용 (벡터 복사/그래프 재구축 없음, HNSW M 등 저장된 파라미터 유지)
+            vector_db = self._read_vector_db(index_file_path, mmap=self.cfg.get('index_mmap', False))
 
-            # 8. 새 인덱스로 교체
-            vector_db.index = new_index
-            logger.info("✅ 벡터 데이터베이스 로드 완료")
+            # 5. 검색 파라미터(nprobe, efSearch) 적용
+            set_search_params(vector_db.index, self.cfg.get('ann_params'))
+            logger.info(f"✅ 벡터 데이터베이스 로드 완료 (문서 수: {vector_db.index.ntotal}, mmap: {self.index_mmapped})")
 
-            self.vector_db = vector_db
+            self._write(self._set_vector_db, vector_db)
             return vector_db
 
         except Exception as e:
             logger.error(f"❌ Vector DB Initialization Error: {str(e)}")
             raise RuntimeError(f"Vector DB 로드 중 오류 발생: {str(e)}")
+
+
+    def _read_vector_db(self, index_file_path, mmap=False):
+        """
+        save_local로 저장된 인덱스(index.faiss)와 docstore(index.pkl)를 읽습니다.
+        mmap=True면 인덱스를 읽기 전용으로 메모리 매핑해 로드가 즉시 끝나고, 여러 worker가 같은 페이지를 공유합니다.
+        """
+        self.index_path = index_file_path
+        self.index_mmapped = mmap
+        if not mmap:
+            return FAISS.load_local(index_file_path, embeddings=self.embed_model, allow_dangerous_deserialization=True)
+
+        try:
+            index = faiss.read_index(os.path.join(index_file_path, "index.faiss"), INDEX_MMAP_FLAGS)
+        except RuntimeError:
+            # IVF 역리스트는 IO_FLAG_MMAP_IFC와 함께 읽을 수 없으므로 역리스트만 매핑
+            index = faiss.read_index(os.path.join(index_file_path, "index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        with open(os.path.join(index_file_path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+
+        return FAISS(
+            embedding_function=self.embed_model,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+        )
+
+
+    def _submit(self, func, *args):
+        """
+        수정 작업을 writer 스레드 큐에 넣고 Future를 반환합니다.
+        writer는 큐에 쌓인 작업을 한 번에 반영하고 새 세대를 공개한 뒤 Future를 완료합니다.
+        """
+        future = Future()
+        if self._writer is threading.current_thread():  # writer 작업 안에서 호출
+            future.set_result(func(*args))
+            return future
+
+        with self._writer_start_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, name="vector-store-writer", daemon=True)
+                self._writer.start()
+        self._writes.put((func, args, future))
+        return future
+
+
+    def _write(self, func, *args):
+        return self._submit(func, *args).result()
+
+
+    async def _awrite(self, func, *args):
+        return await asyncio.wrap_future(self._submit(func, *args))
+
+
+    def _writer_loop(self):
+        while True:
+            batch = [self._writes.get()]
+            while len(batch) < self.cfg.get('write_batch_size', 256):
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            results = []
+            for func, args, future in batch:
+                try:
+                    results.append((future, func(*args), None))
+                except Exception as e:
+                    results.append((future, None, e))
+
+            try:
+                self._publish()
+            except Exception as e:
+                logger.error(f"❌ 벡터 DB 세대 공개 실패: {str(e)}")
+            for future, result, error in results:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+            # 병합은 쓰기 완료를 알린 뒤에 수행 (그동안 검색은 이전 세대, 새 쓰기는 큐에서 대기)
+            try:
+                self._maybe_merge()
+            except Exception as e:
+                logger.error(f"❌ 벡터 DB 병합 실패: {str(e)}")
+
+
+    def _publish(self):
+        """writer 상태로 새 세대를 만들어 교체합니다. 검색은 교체 전에 잡은 세대를 끝까지 사용합니다. (writer 스레드)"""
+        if self.vector_db is None:
+            return
+
+        previous = self.generation
+        self.generation = IndexGeneration(
+            previous.number + 1 if previous is not None else 0,
+            self.vector_db.index,
+            self._delta,
+            self._deleted,
+            self._base_next_id,
+            self.next_id,
+            previous=previous,
+        )
+
+
+    def _set_vector_db(self, vector_db):
+        """
+        벡터 DB를 교체하고 docstore 역방향 맵/보조 인덱스를 다시 만듭니다. (writer 스레드)
+        이전 버전에서 저장된 인덱스는 IndexIDMap2로 감싸고, 인덱스에는 있지만 docstore 매핑이 없는 id(HNSW tombstone)를 복원합니다.
+        """
+        vector_db.index = with_stable_ids(vector_db.index)
+        self.vector_db = vector_db
+        self.doc_index = DocumentIndex.from_vector_db(vector_db)
+
+        # IVF는 삭제가 즉시 반영되므로 살아 있는 id만으로 충분하고, IndexIDMap2는 tombstone까지 포함해 계산
+        ids = stored_ids(vector_db.index)
+        if ids is None:
+            ids = np.fromiter(vector_db.index_to_docstore_id, dtype=np.int64)
+        self.next_id = self._base_next_id = int(ids.max()) + 1 if len(ids) else 0
+        self._deleted = frozenset(set(ids.tolist()) - set(vector_db.index_to_docstore_id))
+        self._delta = DeltaBuffer(vector_db.index.d)
+        self._purge = []
+
+
+    def _writable_copy(self):
+        """병합용 인덱스 복제본. 메모리 매핑된 인덱스는 복제할 수 없으므로 파일에서 다시 읽습니다. (writer 스레드)"""
+        if not self.index_mmapped:
+            return faiss.clone_index(self.vector_db.index)
+
+        index = with_stable_ids(faiss.read_index(os.path.join(self.index_path, "index.faiss")))
+        set_search_params(index, self.cfg.get('ann_params'))
+        self.index_mmapped = False
+        logger.info("🔓 메모리 매핑된 인덱스를 쓰기 가능한 인덱스로 다시 로드했습니다.")
+        return index
+
+
+    def _prepare_vectors(self, embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if self.vector_db._normalize_L2:
+            faiss.normalize_L2(vectors)
+        return vectors
+
+
+    def _add_embeddings(self, documents, embeddings):
+        """임베딩을 새 id로 추가하고 docstore, 역방향 맵/보조 인덱스를 함께 갱신합니다. 반영된 세대가 공개된 뒤 반환합니다."""
+        return self._write(self._apply_add, documents, self._prepare_vectors(embeddings))
+
+
+    def _apply_add(self, documents, vectors):
+        """벡터를 delta 버퍼에 추가합니다. 인덱스에는 병합 때 한 번에 추가합니다. (writer 스레드)"""
+        faiss_ids = np.arange(self.next_id, self.next_id + len(documents), dtype=np.int64)
+        doc_ids = [doc.id or str(uuid4()) for doc in documents]
+
+        self._delta.append(vectors, faiss_ids)
+        self.next_id += len(documents)
+        self.vector_db.docstore.add({
+            doc_id: Document(page_content=doc.page_content, metadata=doc.metadata, id=doc_id)
+            for doc_id, doc in zip(doc_ids, documents)
+        })
+        for faiss_id, doc_id, document in zip(faiss_ids.tolist(), doc_ids, documents):
+            self.vector_db.index_to_docstore_id[faiss_id] = doc_id
+            self.doc_index.add(doc_id, faiss_id, document)
+        return doc_ids
+
+
+    def add_documents(self, documents):
+        """문서를 벡터 데이터베이스에 추가합니다."""
+        embeddings = self.embed_model.embed_documents([doc.page_content for doc in documents])
+        return self._add_embeddings(documents, embeddings)
+
+
+    def _remove_documents(self, doc_ids):
+        """
+        보조 인덱스에서 문서를 지우고 벡터를 검색에서 제외합니다. (writer 스레드)
+        delta 버퍼의 벡터는 바로 지우고, 인덱스의 벡터는 삭제 목록(selector)으로 제외한 뒤 병합 때 제거합니다.
+        이전 세대를 읽는 검색이 있을 수 있으므로 docstore/매핑 항목도 병합 때 정리합니다.
+        """
+        faiss_ids = []
+        for doc_id in doc_ids:
+            document = self.vector_db.docstore._dict.get(doc_id)
+            faiss_id = self.doc_index.remove(doc_id, document) if isinstance(document, Document) else None
+            if faiss_id is not None:
+                faiss_ids.append(faiss_id)
+                self._purge.append((faiss_id, doc_id))
+
+        if faiss_ids:
+            removed = set(self._delta.remove(np.array(faiss_ids, dtype=np.int64)).tolist())
+            self._deleted = self._deleted | {faiss_id for faiss_id in faiss_ids if faiss_id not in removed}
+        return faiss_ids
+
+
+    def _maybe_merge(self):
+        """delta가 delta_merge_size를 넘거나 삭제 비율이 merge_deleted_ratio를 넘으면 병합합니다. (writer 스레드)"""
+        if self.vector_db is None:
+            return
+
+        ratio = self.cfg.get('merge_deleted_ratio', self.cfg.get('hnsw_compaction_ratio', 0.2))
+        if self._delta.n >= self.cfg.get('delta_merge_size', 10000) or len(self._deleted) > ratio * max(self.vector_db.index.ntotal, 1):
+            self._merge()
+
+
+    def _merge(self, rebuild=False):
+        """
+        인덱스 복제본에 delta 벡터를 추가하고 삭제된 벡터를 지워 새 세대로 공개합니다. (writer 스레드)
+        제자리 삭제가 안 되는 HNSW는 tombstone 비율이 임계값을 넘거나 rebuild=True면 살아 있는 벡터로 그래프를 다시 만듭니다.
+        복제/재구축하는 동안 검색은 이전 세대를 그대로 읽습니다.
+        """
+        index = self.vector_db.index
+        hnsw = unwrap_index(index)
+        ratio = self.cfg.get('merge_deleted_ratio', self.cfg.get('hnsw_compaction_ratio', 0.2))
+
+        if isinstance(hnsw, faiss.IndexHNSW) and self._deleted and (rebuild or len(self._deleted) > ratio * index.ntotal):
+            logger.info(f"🧹 HNSW 인덱스 재구축 중 (문서 수: {index.ntotal - len(self._deleted)}, tombstone: {len(self._deleted)})")
+            live_ids = np.array([i for i in self.vector_db.index_to_docstore_id if i < self._base_next_id and i not in self._deleted], dtype=np.int64)
+            new_index = faiss.IndexIDMap2(build_index("HNSW", index.d, {
+                "metric": "IP" if hnsw.metric_type == faiss.METRIC_INNER_PRODUCT else "L2",
+                "hnsw_m": hnsw.hnsw.nb_neighbors(1),
+                "ef_construction": hnsw.hnsw.efConstruction,
+                "ef_search": hnsw.hnsw.efSearch,
+            }))
+            if len(live_ids):
+                new_index.add_with_ids(index.reconstruct_batch(live_ids), live_ids)
+            self._deleted = frozenset()
+
+        elif self._delta.n or (self._deleted and not isinstance(hnsw, faiss.IndexHNSW)):
+            new_index = self._writable_copy()
+            if self._deleted and not isinstance(hnsw, faiss.IndexHNSW):
+                new_index.remove_ids(removal_selector(new_index, np.fromiter(self._deleted, dtype=np.int64)))
+                self._deleted = frozenset()
+
+        else:
+            new_index = index
+
+        if self._delta.n:
+            new_index.add_with_ids(self._delta.vectors[:self._delta.n], self._delta.ids[:self._delta.n])
+        if new_index is not index:
+            self.vector_db.index = new_index
+            self.index_mmapped = False  # 재구축된 인덱스는 메모리에 있음
+        self._delta = DeltaBuffer(new_index.d)
+        self._base_next_id = self.next_id
+
+        for faiss_id, doc_id in self._purge:
+            self.vector_db.index_to_docstore_id.pop(faiss_id, None)
+            if doc_id not in self.doc_index.faiss_ids:  # 같은 id로 다시 추가된 문서는 유지
+                self.vector_db.docstore._dict.pop(doc_id, None)
+        self._purge = []
+
+        self._publish()
+        logger.info(f"✅ 벡터 DB 병합 완료 (세대: {self.generation.number}, 인덱스 벡터 수: {new_index.ntotal}, tombstone: {len(self._deleted)})")
+
+
+    def flush(self):
+        """쌓인 추가/삭제를 인덱스에 병합합니다."""
+        return self._write(self._merge)
+
+
+    def compact(self):
+        """병합하면서 HNSW tombstone을 뺀 벡터로 그래프를 다시 만듭니다."""
+        return self._write(self._merge, True)
+
+
+    def _save_local(self, vector_db, save_path):
+        """병합해 delta/삭제 대기 항목을 인덱스와 docstore에 반영한 뒤 저장합니다. (writer 스레드)"""
+        if vector_db is self.vector_db and (self._delta.n or self._purge):
+            self._merge()
+        vector_db.save_local(save_path)
+
+
+    def _similarity_search(self, query, k, filter=None, fetch_k=None):
+        return self._similarity_search_by_vector(self.embed_model.embed_query(query), k, filter=filter, fetch_k=fetch_k)
+
+
+    def _similarity_search_by_vector(self, embedding, k, filter=None, fetch_k=None):
+        """
+        현재 세대(인덱스 + delta 버퍼, 삭제 목록 제외)에서 검색해 (Document, score) 목록을 반환합니다.
+
+        filter가 company_name 하나뿐이면 회사 문서 안에서만 검색하고 (_company_search),
+        그 외 filter는 fetch_k개를 가져와 메타데이터로 거른 뒤 k개를 남깁니다. (LangChain FAISS와 같은 방식)
+        """
+        generation = self.generation
+        embedding = np.asarray([embedding], dtype=np.float32)
+        if self.vector_db._normalize_L2:
+            faiss.normalize_L2(embedding)
+
+        if filter and set(filter) == {"company_name"}:
+            scores, faiss_ids = self._company_search(generation, embedding, k, filter["company_name"])
+            filter = None
+        else:
+            n = fetch_k if filter else k
+            scores, faiss_ids = generation.index.search(embedding, n, params=generation.search_params())
+            if len(generation.delta_ids):
+                delta = knn_search(embedding, generation.delta_vectors, generation.delta_ids, n, generation.index.metric_type)
+                scores, faiss_ids = merge_knn(generation.index.metric_type, n, (scores, faiss_ids), delta)
+
+        docstore = self.vector_db.docstore._dict
+        results = []
+        for score, faiss_id in zip(scores[0], faiss_ids[0]):
+            document = docstore.get(self.vector_db.index_to_docstore_id.get(int(faiss_id)))
+            if document is None:  # -1 (결과 부족) 또는 이후 세대에서 병합으로 정리된 문서
+                continue
+            if filter and any(document.metadata.get(key) != value for key, value in filter.items()):
+                continue
+            results.append((document, float(score)))
+            if len(results) == k:
+                break
+        return results
+
+
+    def _company_search(self, generation, embedding, k, company_name):
+        """
+        회사 문서만 대상으로 검색합니다. 회사 문서 비율(selectivity)에 따라 방식을 고릅니다.
+
+        - 문서 수가 filter_exact_max 이하이거나 전체 대비 비율이 filter_selector_min_ratio 미만:
+          회사 벡터만 꺼내 전수 비교 (O(회사 문서 수), 문서가 k개 이상이면 항상 k개)
+        - 큰 회사: 회사 id의 IDSelectorBatch를 SearchParameters로 넘겨 ANN 인덱스에서 검색하고,
+          ANN이 k개를 못 채우면 전수 비교로 다시 검색
+        delta 버퍼에 있는 회사 문서는 항상 전수 비교 후 합칩니다.
+        """
+        faiss_ids = np.fromiter(
+            (self.doc_index.faiss_ids.get(doc_id, -1) for doc_id in self.doc_index.company_doc_ids(company_name)),
+            dtype=np.int64,
+        )
+        base_ids, delta_ids = generation.visible(faiss_ids[faiss_ids >= 0])
+        index = generation.index
+        results = [knn_search(embedding, generation.delta_vectors[generation.delta_rows(delta_ids)], delta_ids, k, index.metric_type)]
+
+        if len(base_ids):
+            selectivity = len(base_ids) / max(generation.ntotal, 1)
+            if len(base_ids) <= self.cfg.get('filter_exact_max', 10000) or selectivity < self.cfg.get('filter_selector_min_ratio', 0.2):
+                results.append(exact_search(index, base_ids, embedding, k))
+            else:
+                selector = faiss.IDSelectorBatch(base_ids)
+                scores, found_ids = index.search(embedding, k, params=search_parameters(index, selector))
+                if (found_ids[0] >= 0).sum() < min(k, len(base_ids)):
+                    scores, found_ids = exact_search(index, base_ids, embedding, k)
+                results.append((scores, found_ids))
+
+        return merge_knn(index.metric_type, k, *results)
         
 
     def search_company(self, company_name):
@@ -139,12 +538,7 @@ class VectorStore:
         주어진 회사명이 벡터 데이터베이스에 존재하는지 확인하고, 몇 개의 문서가 있는지 반환합니다.
         """
         logger.info(f"🔍 '{company_name}' 회사의 문서 검색 중...")
-        count = 0
-
-        # 벡터 데이터베이스에서 모든 문서를 검색
-        for doc_id, document in self.vector_db.docstore._dict.items():
-            if isinstance(document, Document) and document.metadata.get("company_name") == company_name:
-                count += 1
+        count = len(self.doc_index.by_company.get(company_name, ()))
 
         logger.info(f"🔍 '{company_name}' 회사의 문서 개수: {count}")
         return count
@@ -155,35 +549,32 @@ class VectorStore:
         주어진 회사명에 해당하는 모든 문서를 벡터 데이터베이스에서 삭제하고, 삭제 여부를 반환합니다.
         """
         logger.info(f"🗑️ '{company_name}' 회사의 문서 삭제 중...")
-        to_delete = []
-
-        # 삭제할 문서 수집
-        for doc_id, document in self.vector_db.docstore._dict.items():
-            if isinstance(document, Document) and document.metadata.get("company_name") == company_name:
-                to_delete.append(doc_id)
-
-        # 문서 삭제
-        for doc_id in to_delete:
-            del self.vector_db.docstore._dict[doc_id]
+        to_delete = self._write(self._delete_company, company_name)
 
         logger.info(f"✅ '{company_name}' 회사의 문서 {len(to_delete)}개 삭제 완료")
         return len(to_delete) > 0
 
 
+    def _delete_company(self, company_name):
+        """회사 문서 목록 조회와 삭제를 같은 writer 작업에서 처리합니다. (writer 스레드)"""
+        return self._remove_documents(self.doc_index.company_doc_ids(company_name))
+
+
     def get_company_documents(self, company_name):
         """
         주어진 회사명을 가진 모든 문서를 벡터 데이터베이스에서 검색하여 반환합니다.
         """
         logger.info(f"🔍 Vector DB에서 '{company_name}' 회사의 문서 검색 중...")
+        docstore = self.vector_db.docstore._dict
         results = []
-
-        # 벡터 데이터베이스에서 모든 문서를 검색
-        for doc_id, document in self.vector_db.docstore._dict.items():
-            if isinstance(document, Document) and document.metadata.get("company_name") == company_name:
-                results.append({
-                    "url": document.metadata.get("url"),
-                    "text": document.page_content
-                })
+        for doc_id in self.doc_index.company_doc_ids(company_name):
+            document = docstore.get(doc_id)
+            if document is None:  # 조회 직후 병합으로 정리된 문서
+                continue
+            results.append({
+                "url": document.metadata.get("url"),
+                "text": document.page_content
+            })
 
         logger.info(f"🔍 검색 완료: {len(results)}개의 문서 발견")
         return results
@@ -194,15 +585,12 @@ class VectorStore:
         주어진 회사명과 URL에 해당하는 문서를 검색하여 반환합니다.
         """
         logger.info(f"🔍 '{company_name}' 회사의 URL '{url}'에 해당하는 문서 검색 중...")
-        
-        # 회사명으로 문서 검색
-        documents = self.get_company_documents(company_name)
-        
-        # URL에 해당하는 문서 찾기
-        for document in documents:
-            if document['url'] == url:
-                logger.info(f"✅ 문서 발견: {document}")
-                return document
+
+        document = self.vector_db.docstore._dict.get(self.doc_index.find(company_name, url))
+        if document is not None:
+            document = {"url": document.metadata.get("url"), "text": document.page_content}
+            logger.info(f"✅ 문서 발견: {document}")
+            return document
         
         logger.warning(f"'{company_name}' 회사의 URL '{url}'에 해당하는 문서를 찾을 수 없습니다.")
         return None
@@ -213,32 +601,15 @@ class VectorStore:
         주어진 회사명과 URL에 해당하는 문서를 업데이트합니다.
         """
         logger.info(f"🔄 '{company_name}' 회사의 문서 업데이트 중... (URL: {url})")
-        
-        # 기존 문서의 docstore ID 찾기
-        doc_id = None
-        for id_, doc in self.vector_db.docstore._dict.items():
-            if (isinstance(doc, Document) and 
-                doc.metadata.get("company_name") == company_name and 
-                doc.metadata.get("url") == url):
-                doc_id = id_
-                break
-        
-        if doc_id is None:
+
+        # 1. 기존 문서의 docstore ID 찾기
+        doc_id = self.doc_index.find(company_name, url)
+        original_doc = self.vector_db.docstore._dict.get(doc_id)
+        if original_doc is None:
             logger.warning(f"'{company_name}' 회사의 URL '{url}'에 해당하는 문서를 찾을 수 없습니다.")
             return None
 
-        # 1. Docstore에서 문서 삭제
-        original_doc = self.vector_db.docstore._dict.pop(doc_id)
-        
-        # 2. FAISS 인덱스에서 벡터 삭제
-        # docstore ID를 FAISS 인덱스 ID로 변환
-        index_id = list(self.vector_db.index_to_docstore_id.keys())[
-            list(self.vector_db.index_to_docstore_id.values()).index(doc_id)
-        ]
-        self.vector_db.index_to_docstore_id.pop(index_id)
-        self.vector_db.index.remove_ids(np.array([index_id]))
-
-        # 3. 새로운 문서 생성
+        # 2. 새로운 문서 생성 (임베딩은 writer 밖에서 계산)
         updated_text = new_text if new_text else original_doc.page_content
         updated_url = new_url if new_url else url
         
@@ -246,65 +617,47 @@ class VectorStore:
             page_content=updated_text,
             metadata={"company_name": company_name, "url": updated_url}
         )
+        vectors = self._prepare_vectors(self.embed_model.embed_documents([updated_text]))
 
-        # 4. 새로운 문서 추가
-        self.vector_db.add_documents([updated_document])
+        # 3. 기존 문서 삭제와 새 문서 추가를 한 세대에 반영
+        if not self._write(self._replace_document, doc_id, updated_document, vectors):
+            logger.warning(f"'{company_name}' 회사의 URL '{url}'에 해당하는 문서가 업데이트 중 삭제되었습니다.")
+            return None
         
         logger.info("✅ 문서 업데이트 완료")
         return updated_document
 
 
+    def _replace_document(self, doc_id, document, vectors):
+        """(writer 스레드)"""
+        if doc_id not in self.doc_index.faiss_ids:
+            return None
+        self._remove_documents([doc_id])
+        return self._apply_add([document], vectors)
+
+
     def delete_document(self, company_name, url):
         """
         주어진 회사명과 URL에 해당하는 문서를 벡터 데이터베이스에서 삭제합니다.
         """
         logger.info(f"🗑️ '{company_name}' 회사의 URL '{url}'에 해당하는 문서 삭제 중...")
-        
-        # docstore에서 문서 ID 찾기
-        doc_id = None
-        for id_, doc in self.vector_db.docstore._dict.items():
-            if (isinstance(doc, Document) and 
-                doc.metadata.get("company_name") == company_name and 
-                doc.metadata.get("url") == url):
-                doc_id = id_
-                break
-        
+
+        doc_id = self.doc_index.find(company_name, url)
         if doc_id is None:
             logger.warning(f"'{company_name}' 회사의 URL '{url}'에 해당하는 문서를 찾을 수 없습니다.")
             return False
 
         try:
-            # 1. Docstore에서 문서 삭제
-            self.vector_db.docstore._dict.pop(doc_id)
-            
-            # 2. FAISS 인덱스에서 벡터 삭제
-            # docstore ID를 FAISS 인덱스 ID로 변환
-            index_id = list(self.vector_db.index_to_docstore_id.keys())[
-                list(self.vector_db.index_to_docstore_id.values()).index(doc_id)
-            ]
-            self.vector_db.index_to_docstore_id.pop(index_id)
-            self.vector_db.index.remove_ids(np.array([index_id]))
-            
-            logger.info(f"✅ 문서 삭제 완료 (doc_id: {doc_id}, index_id: {index_id})")
-            return True
-            
+            index_ids = self._write(self._remove_documents, [doc_id])
+            logger.info(f"✅ 문서 삭제 완료 (doc_id: {doc_id}, index_id: {index_ids[0] if index_ids else None})")
+            return bool(index_ids)
+
         except Exception as e:
             logger.error(f"문서 삭제 중 오류 발생: {str(e)}")
             return False
     
 
-    def similarity_search_with_score(self, query: str, filter: str = None, fetch_k: int = None):
-        """
-        유사도 검색을 수행하고 score를 반환하는 함수
-        
-        Args:
-            query (str): 검색할 쿼리 문자열
-            filter (str, optional): 회사명으로 필터링할 경우 사용. 예: "samsung"
-            fetch_k (int, optional): 검색할 문서 수. 기본값은 k의 2배
-            
-        Returns:
-            List[Tuple[Document, float]]: 문서와 유사도 점수 튜플의 리스트
-        """
+    def _search_options(self, filter=None, fetch_k=None):
         k = int(self.cfg.get('top_k', 10))
         
         # fetch_k가 None이면 k의 2배로 설정
@@ -315,18 +668,33 @@ class VectorStore:
         filter_dict = None
         if filter:
             filter_dict = {"company_name": filter}
-            
-        results = self.vector_db.similarity_search_with_score(
-            query,
-            k=k,
-            filter=filter_dict,
-            fetch_k=fetch_k
-        )
+
+        return k, filter_dict, fetch_k
+
+
+    def _sort_results(self, results, relevance_scores=False):
+        if relevance_scores:
+            relevance_score_fn = self.vector_db._select_relevance_score_fn()
+            results = [(doc, relevance_score_fn(score)) for doc, score in results]
 
         # numpy.float32 → float 변환 및 score로 내림차순 정렬
-        results = sorted([(doc, float(score)) for doc, score in results], key=lambda x: x[1], reverse=True)
+        return sorted([(doc, float(score)) for doc, score in results], key=lambda x: x[1], reverse=True)
 
-        return results
+
+    def similarity_search_with_score(self, query: str, filter: str = None, fetch_k: int = None):
+        """
+        유사도 검색을 수행하고 score를 반환하는 함수
+        
+        Args:
+            query (str): 검색할 쿼리 문자열
+            filter (str, optional): 회사명으로 필터링할 경우 사용. 예: "samsung"
+            fetch_k (int, optional): 검색할 문서 수. 기본값은 k의 2배
+            
+        Returns:
+            List[Tuple[Document, float]]: 문서와 유사도 점수 튜플의 리스트
+        """
+        k, filter_dict, fetch_k = self._search_options(filter, fetch_k)
+        return self._sort_results(self._similarity_search(query, k, filter=filter_dict, fetch_k=fetch_k))
 
 
     def similarity_search_with_relevance_scores(self, query: str, filter: str = None, fetch_k: int = None):
@@ -341,28 +709,55 @@ class VectorStore:
         Returns:
             List[Tuple[Document, float]]: 문서와 관련도 점수 튜플의 리스트
         """
-        k = int(self.cfg.get('top_k', 10))
-        
-        # fetch_k가 None이면 k의 2배로 설정
-        if fetch_k is None:
-            fetch_k = k * 2
-            
-        # filter가 있으면 회사명으로 필터 조건 생성
-        filter_dict = None
-        if filter:
-            filter_dict = {"company_name": filter}
-            
-        results = self.vector_db.similarity_search_with_relevance_scores(
-            query,
-            k=k,
-            filter=filter_dict,
-            fetch_k=fetch_k
-        )
+        k, filter_dict, fetch_k = self._search_options(filter, fetch_k)
+        return self._sort_results(self._similarity_search(query, k, filter=filter_dict, fetch_k=fetch_k), relevance_scores=True)
 
-        # numpy.float32 → float 변환 및 score로 내림차순 정렬
-        results = sorted([(doc, float(score)) for doc, score in results], key=lambda x: x[1], reverse=True)
 
-        return results
+    async def _run_in_executor(self, func, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+
+    async def asearch(self, query: str, filter: str = None, fetch_k: int = None, relevance_scores: bool = False):
+        """
+        similarity_search_with_score / similarity_search_with_relevance_scores의 async 버전
+
+        쿼리 임베딩은 async 임베딩 클라이언트로 기다리고, FAISS 검색만 전용 스레드 풀(search_max_workers)에서 실행합니다.
+        동시에 처리하는 요청 수는 async_max_concurrency로 제한합니다.
+
+        Args:
+            query (str): 검색할 쿼리 문자열
+            filter (str, optional): 회사명으로 필터링할 경우 사용
+            fetch_k (int, optional): 검색할 문서 수. 기본값은 k의 2배
+            relevance_scores (bool): True면 relevance score(0~1), False면 원래 거리 score
+        """
+        k, filter_dict, fetch_k = self._search_options(filter, fetch_k)
+        async with self._async_slots:
+            embedding = await self.embed_model.aembed_query(query)
+            results = await self._run_in_executor(self._similarity_search_by_vector, embedding, k, filter=filter_dict, fetch_k=fetch_k)
+
+        return self._sort_results(results, relevance_scores=relevance_scores)
+
+
+    async def aadd_documents(self, documents):
+        """add_documents의 async 버전 (임베딩 캐시 조회/저장과 EmbeddingExecutor 요청은 executor 스레드, 인덱스 반영은 writer 스레드)"""
+        async with self._async_slots:
+            embeddings = await self.embed_model.aembed_documents([doc.page_content for doc in documents])
+            return await self._awrite(self._apply_add, documents, self._prepare_vectors(embeddings))
+
+
+    async def adelete(self, company_name, url=None):
+        """url이 있으면 delete_document, 없으면 delete_company의 async 버전 (삭제 여부 반환)"""
+        async with self._async_slots:
+            if url is None:
+                return len(await self._awrite(self._delete_company, company_name)) > 0
+            doc_id = self.doc_index.find(company_name, url)
+            return doc_id is not None and len(await self._awrite(self._remove_documents, [doc_id])) > 0
+
+
+    def query_cache_stats(self):
+        """쿼리 임베딩 캐시 hit/miss 지표"""
+        return self.query_cache.stats()
+
 
     def clear_all_documents(self):
         """
@@ -370,20 +765,19 @@ class VectorStore:
         """
         logger.info("🗑️ 벡터 DB의 모든 문서 삭제 중...")
 
-        # 모든 문서 ID 수집
-        all_doc_ids = list(self.vector_db.docstore._dict.keys())
-
-        # 모든 문서 삭제
-        for doc_id in all_doc_ids:
-            # 1. Docstore에서 문서 삭제
-            self.vector_db.docstore._dict.pop(doc_id, None)
-            
-            # 2. FAISS 인덱스에서 벡터 삭제
-            if doc_id in self.vector_db.index_to_docstore_id.values():
-                index_id = list(self.vector_db.index_to_docstore_id.keys())[
-                    list(self.vector_db.index_to_docstore_id.values()).index(doc_id)
-                ]
-                self.vector_db.index_to_docstore_id.pop(index_id, None)
-                self.vector_db.index.remove_ids(np.array([index_id]))
-
-        logger.info("✅ 벡터 DB의 모든 문서 삭제 완료")
\ No newline at end of file
+        self._write(self._clear_all)
+        logger.info("✅ 벡터 DB의 모든 문서 삭제 완료")
+
+
+    def _clear_all(self):
+        """문서를 하나씩 지우지 않고 docstore, 매핑, 인덱스를 한 번에 비웁니다. (writer 스레드)"""
+        index = self._writable_copy()
+        index.reset()
+        self.vector_db.index = index
+        self.vector_db.docstore._dict.clear()
+        self.vector_db.index_to_docstore_id.clear()
+        self.doc_index.clear()
+        self._delta = DeltaBuffer(index.d)
+        self._deleted = frozenset()
+        self._base_next_id = self.next_id
+        self._purge = []